@@ -8,6 +8,11 @@ from blueshift.api import(  symbol,
                             time_rules,
                        )
 
+from technicals.features import shared
+from technicals.history import HistoryCache
+from technicals.cup_handle import CupHandleDetector
+from technicals import timing
+
 def initialize(context):
     """
         A function to define things to do at the start of the strategy
@@ -30,6 +35,13 @@ def initialize(context):
     context.signals = dict((security,0) for security in context.securities)
     context.target_position = dict((security,0) for security in context.securities)
 
+    # last bars of every security, refreshed with only the new bars
+    context.history = HistoryCache(context.securities, ['open','high','low','close'],
+        context.params['indicator_lookback'], context.params['indicator_freq'])
+    # cup bottom, handle top and handle bottom kept up to date bar by bar
+    context.cups = dict((security, CupHandleDetector(context.params['indicator_lookback']))
+                        for security in context.securities)
+
     # set trading cost and slippage to zero
     set_commission(commission.PerShare(cost=0.0, min_trade_cost=0.0))
     set_slippage(slippage.FixedSlippage(0.00))
@@ -48,7 +60,9 @@ def before_trading_start(context, data):
     
 def stop_trading(context, data):
     context.trade = False
+    timing.dump()
 
+@timing.timed('run_strategy')
 def run_strategy(context, data):
     """
         A function to define core strategy steps
@@ -60,13 +74,16 @@ def run_strategy(context, data):
     generate_target_position(context, data)
     rebalance(context, data)
 
+@timing.timed('rebalance')
 def rebalance(context,data):
     """
         A function to rebalance - all execution logic goes here
     """
     for security in context.securities:
-        order_target_percent(security, context.target_position[security])
+        with timing.stage('order', security):
+            order_target_percent(security, context.target_position[security])
 
+@timing.timed('generate_target_position')
 def generate_target_position(context, data):
     """
         A function to define target portfolio
@@ -83,46 +100,29 @@ def generate_target_position(context, data):
             context.target_position[security] = 0
 
 
+@timing.timed('generate_signals')
 def generate_signals(context, data):
     """
         A function to define define the signal generation
     """
     try:
-        price_data = data.history(context.securities, ['open','high','low','close'],
-            context.params['indicator_lookback'], context.params['indicator_freq'])
+        with timing.stage('data.history'):
+            price_data = context.history.update(data)
     except:
+        timing.failure('data.history')
         return
 
-    for security in context.securities:
-        px = price_data.xs(security)
-        context.signals[security] = signal_function(px, context.params)
+    with timing.stage('signals'):
+        signals = shared(('cup_handle', tuple(context.securities), price_data.last_timestamp),
+                         lambda: update_cups(context, price_data))
+    for security, signal in zip(context.securities, signals):
+        context.signals[security] = signal
 
-def signal_function(px, params):
+def update_cups(context, price_data):
     """
-        The main trading logic goes here, called by generate_signals above
+        Feed the new bars of every security to its cup-and-handle detector
+        and collect the signals
     """
-    close = px.close.values
-    high = px.high.values
-    low = px.low.values
-    
-
-    cbb=close[-60]
-    cb = min(close)
-    cbindex = close.argmin()
-    close_1 = close[cbindex:]
-    
-    hs = max(close_1)
-    hs_index = close_1.argmax()
-
-    close_2 = close_1[hs_index:]
-    hb = min(close_2)
-
-    check_ratio = hs/cbb
-
-
-    
-    
-    if ( check_ratio>0.9 and close[-1]>hb and (hs-cb)/(hs-hb) > 3)  :
-        return 1
-    else:
-        return 0
\ No newline at end of file
+    return [context.cups[security].update(price_data.index_values,
+                                          price_data.array('close', security))
+            for security in context.securities]
@@ -19,6 +19,10 @@ from blueshift.api import(  symbol,
                             time_rules,
                        )
 
+from technicals.history import HistoryCache
+from technicals.cup_handle import CupHandleDetector
+from technicals import timing
+
 def initialize(context):
     """
         A function to define things to do at the start of the strategy
@@ -48,11 +52,18 @@ def initialize(context):
     context.signals = dict((security,0) for security in context.securities)
     context.target_position = dict((security,0) for security in context.securities)
 
+    # last bars of every security, refreshed with only the new bars
+    context.history = HistoryCache(context.securities, ['open','high','low','close'],
+        60, '1m')
+    # cup bottom, handle top and handle bottom kept up to date bar by bar
+    context.cups = dict((security, CupHandleDetector(60))
+                        for security in context.securities)
+
     # set trading cost and slippage to zero
     set_commission(commission.PerShare(cost=0.002, min_trade_cost=0.0))
     set_slippage(slippage.FixedSlippage(0.00))
     
-    freq = int(contfreqext.params['trade_freq'])
+    freq = int(context.params['trade_freq'])
     schedule_function(run_strategy, date_rules.every_day(),
                       time_rules.every_nth_minute(freq))
     
@@ -64,7 +75,9 @@ def before_trading_start(context, data):
     
 def stop_trading(context, data):
     context.trade = False
+    timing.dump()
 
+@timing.timed('run_strategy')
 def run_strategy(context, data):
     """
         A function to define core strategy steps
@@ -76,13 +89,16 @@ def run_strategy(context, data):
     generate_target_position(context, data)
     rebalance(context, data)
 
+@timing.timed('rebalance')
 def rebalance(context,data):
     '''
         A function to rebalance - all execution logic goes here
     '''
     for security in context.securities:
-        order_target_percent(security, context.target_position[security])
+        with timing.stage('order', security):
+            order_target_percent(security, context.target_position[security])
 
+@timing.timed('generate_target_position')
 def generate_target_position(context, data):
     """
         A function to define target portfolio
@@ -98,22 +114,25 @@ def generate_target_position(context, data):
         else:
             context.target_position[security] = 0
 
+@timing.timed('generate_signals')
 def generate_signals(context, data):
     """
         A function to define define the signal generation
     """
     try:
-        price_data = data.history(context.securities, ['open','high','low','close'],
-            60, '1m')
+        with timing.stage('data.history'):
+            price_data = context.history.update(data)
     except:
+        timing.failure('data.history')
         return
 
     for security in context.securities:
         px = price_data.xs(security)
-        context.signals[security] = signal_function(context, px, context.params,
-            context.signals[security])
+        with timing.stage('signal_function', security):
+            context.signals[security] = signal_function(context, px, context.params,
+                security)
 
-def signal_function(context, px, params, last_signal):
+def signal_function(context, px, params, security):
     """
         The main trading logic goes here, called by generate_signals above
     """
@@ -122,26 +141,16 @@ def signal_function(context, px, params, last_signal):
     low = px.low.values
     
 
-    cbb=close[-60]
-    cb = close.min()
-    cbindex = close.argmin()
-    close_1 = close[cbindex::]
-    
-    hs =close_1.max()
-    hs_index = close_1.argmax()
-
-    close_2 = close_1[hs_index::]
-    hb = close_2.min()
-
-    check_ratio=hs/cbb
+    # cup bottom, handle top and handle bottom only look at the new bars
+    cup = context.cups[security].update(px.index.values, close)
 
 
     
     
-    if ( check_ratio>0.9 and close[-1]>hb and (hs-cb)/(hs-hb) > 3)  :
+    if cup:
         return 1
     else : 
-        return 0
+        return 0
 
 
 
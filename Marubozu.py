@@ -8,6 +8,11 @@ from blueshift.api import(  symbol,
                             time_rules,
                        )
 
+from technicals.features import shared
+from technicals.history import HistoryCache
+from technicals.signals import marubozu_signals, OHLC
+from technicals import timing
+
 def initialize(context):
     """
         A function to define things to do at the start of the strategy
@@ -37,6 +42,10 @@ def initialize(context):
     context.signals = dict((security,0) for security in context.securities)
     context.target_position = dict((security,0) for security in context.securities)
 
+    # last bars of every security, refreshed with only the new bars
+    context.history = HistoryCache(context.securities, ['open','high','low','close'],
+        context.params['indicator_lookback'], context.params['indicator_freq'])
+
     # set trading cost and slippage to zero
     set_commission(commission.PerShare(cost=0.002, min_trade_cost=0.0))
     set_slippage(slippage.FixedSlippage(0.00))
@@ -53,7 +62,9 @@ def before_trading_start(context, data):
     
 def stop_trading(context, data):
     context.trade = False
+    timing.dump()
 
+@timing.timed('run_strategy')
 def run_strategy(context, data):
     """
         A function to define core strategy steps
@@ -65,13 +76,16 @@ def run_strategy(context, data):
     generate_target_position(context, data)
     rebalance(context, data)
 
+@timing.timed('rebalance')
 def rebalance(context,data):
     '''
         A function to rebalance - all execution logic goes here
     '''
     for security in context.securities:
-        order_target_percent(security, context.target_position[security])
+        with timing.stage('order', security):
+            order_target_percent(security, context.target_position[security])
 
+@timing.timed('generate_target_position')
 def generate_target_position(context, data):
     """
         A function to define target portfolio
@@ -87,36 +101,20 @@ def generate_target_position(context, data):
         else:
             context.target_position[security] = 0
 
+@timing.timed('generate_signals')
 def generate_signals(context, data):
     """
         A function to define define the signal generation
     """
     try:
-        price_data = data.history(context.securities, ['open','high','low','close'],
-            context.params['indicator_lookback'], context.params['indicator_freq'])
+        with timing.stage('data.history'):
+            price_data = context.history.update(data)
     except:
+        timing.failure('data.history')
         return
 
-    for security in context.securities:
-        px = price_data.xs(security)
-        context.signals[security] = signal_function(context, px, context.params,
-            context.signals[security])
-
-def signal_function(context, px, params, last_signal):
-    """
-        The main trading logic goes here, called by generate_signals above
-    """
-    close = px.close.values
-    high = px.high.values
-    low = px.low.values
-    open = px.open.values
-
-    if(len(close)<1):
-        return 0
-        
-    if (close[-1] > open[-1] and high[-1] == close[-1] and low[-1] == open[-1]):
-        return 1
-    elif (close[-1] < open[-1] and high[-1] == open[-1] and low[-1] == close[-1] ):
-        return -1
-    else:
-        return 0
\ No newline at end of file
+    with timing.stage('signals'):
+        signals = shared(('marubozu', tuple(context.securities), price_data.last_timestamp),
+                         lambda: marubozu_signals(price_data.tensor(OHLC)))
+    for security, signal in zip(context.securities, signals):
+        context.signals[security] = signal
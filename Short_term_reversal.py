@@ -12,7 +12,10 @@ from blueshift.api import(    symbol,
                             date_rules,
                             time_rules,
                        )
-import pandas as pd
+
+from technicals.history import price_tensor
+from technicals.signals import reversal_scores, top_k, basket_changes
+
 def initialize(context):
     """
         A function to define things to do at the start of the strategy
@@ -35,29 +38,22 @@ def rebalance(context,data):
         of schedule_function above.
     """
 
-    if(context.stocks):
-        for sell_stocks in context.stocks:
-            order_target_percent(sell_stocks,0)
-            # print("Sell", sell_stock)
-        context.stocks.clear()
-    
-    stock_data = data.history(context.long_portfolio, 'open', 30, "1d")
-    # print(stock_data)
-        # for asset in context.long_portfolio:
-        # print(asset)
+    stock_data = data.history(context.long_portfolio, ['open'], 30, "1d")
     # print(stock_data)
-        
-    
 
-    stock_data = stock_data.append(stock_data.max(), ignore_index=True)
-    diff_stock = (stock_data.iloc[-1] - stock_data.iloc[-2])/stock_data.iloc[-1]
-    stock_data = stock_data.append(diff_stock, ignore_index=True)
-    stock_data = stock_data.sort_values(by=stock_data.index[-1], axis=1, ascending=False)
-    context.stocks = stock_data.columns[:5].tolist()
-    # print(context.stocks)
-    for buy_stock in context.stocks:
+    # fall of each stock from its 30 day high, biggest fall first
+    scores = reversal_scores(price_tensor(stock_data, context.long_portfolio, ['open']))
+    basket = [context.long_portfolio[i] for i in top_k(scores, 5)]
+
+    # only names leaving or entering the basket are traded
+    leaving, entering = basket_changes(context.stocks, basket)
+    for sell_stock in leaving:
+        order_target_percent(sell_stock,0)
+        # print("Sell", sell_stock)
+    for buy_stock in entering:
         # print("Buy", buy_stock)
-        order_target_percent(buy_stock, 2.0/10)   
+        order_target_percent(buy_stock, 2.0/10)
+    context.stocks = basket
         
 
     
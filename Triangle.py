@@ -16,7 +16,13 @@ from blueshift.api import(    symbol,
 import numpy as np
 import pandas as pd
 
-from scipy.stats import linregress
+from technicals.triangles import pivot_arrays, fit_line
+from technicals import timing
+
+# candles on each side of a pivot
+NUM_BEFORE = 3
+NUM_AFTER = 3
+
 def initialize(context):
     """
         A function to define things to do at the start of the strategy
@@ -38,117 +44,46 @@ def initialize(context):
                     date_rules.every_day(),
                     time_rules.market_open(hours=2, minutes=30))
 
-def pivotId(df, candle, num_before, num_after):
-    if candle < num_before   or candle + num_after >= len(df):
-        return 0
-    
-    pivotIdLow=1
-    pivotIdHigh=1
-    for i in range( candle - num_before, candle + num_after):
-        if(df.low[candle]>df.low[i]):
-            pivotIdLow=0
-        if(df.high[candle]<df.high[i]):
-            pivotIdHigh=0
-    if pivotIdLow and pivotIdHigh:
-        return 3
-    elif pivotIdLow:
-        return 1
-    elif pivotIdHigh:
-        return 2
-    else:
-        return 0
-
-def pointPosition(x, df):
-    if x['Pivot'] == 1:
-        return x['low']-(0.01 * df.high.max())
-    elif x['Pivot'] == 2:
-        return x['high']+(0.01 * df.high.max())
-    else:
-        return np.nan
+def feasible_points(pivots, pick):
+    """
+        Bar ids (counted from 1) and prices of the latest pivot, the extreme
+        pivot (`pick` is np.argmax or np.argmin) and the extreme pivot after
+        it. Raises ValueError when there is no such pivot.
+    """
+    price = pivots['price']
+    extreme = int(pick(price))
+    later = extreme + 1 + int(pick(price[extreme + 1:]))
+    chosen = [len(pivots) - 1, extreme, later]
+    return pivots['index'][chosen] + 1, price[chosen]
 
+@timing.timed('rebalance')
 def rebalance(context,data):
     
-    stock_data = data.history(context.securities, ['close', 'open', 'high', 'low', 'volume'], 50, '1d' )
+    with timing.stage('data.history'):
+        stock_data = data.history(context.securities, ['close', 'open', 'high', 'low', 'volume'], 50, '1d' )
     for security in context.securities:
         try:
-            df = stock_data.xs(security) 
-            df['Id'] = np.arange(1, len(df)+1)       
-            NUM_BEFORE = 3
-            NUM_AFTER = 3
-            # pivotId(df, 4, NUM_BEFORE, NUM_AFTER)
-            df['Pivot'] = df.apply(lambda row: pivotId(df, int(row.Id)-1, NUM_BEFORE, NUM_AFTER), axis=1)
-            df['PointPosition'] = df.apply(lambda row: pointPosition(row, df), axis=1)
-            # pd.set_option("display.max_rows", None, "display.max_columns", None)
-
-            RECENT_HIGH_PIVOT_POINT = 0
-            RECENT_LOW_PIVOT_POINT = 0
-
-            FEASIBLE_HIGH_PIVOT_POINTS = np.array([])
-            FEASIBLE_LOW_PIVOT_POINTS = np.array([])
-            FEASIBLE_HIGH = np.array([])
-            FEASIBLE_LOW = np.array([])
-
-            for i in reversed(range(len(df))):
-                if df.Pivot[i] == 2 and RECENT_HIGH_PIVOT_POINT == 0:
-                    RECENT_HIGH_PIVOT_POINT = df.Id[i]
-                    FEASIBLE_HIGH = np.append(FEASIBLE_HIGH, df.high[i])
-                if df.Pivot[i] == 1 and RECENT_LOW_PIVOT_POINT == 0:
-                    RECENT_LOW_PIVOT_POINT = df.Id[i]
-                    FEASIBLE_LOW = np.append(FEASIBLE_LOW, df.low[i])
-                if RECENT_HIGH_PIVOT_POINT != 0 and RECENT_LOW_PIVOT_POINT != 0:
-                    break
-            
-            
-            FEASIBLE_HIGH_PIVOT_POINTS = np.append(FEASIBLE_HIGH_PIVOT_POINTS, RECENT_HIGH_PIVOT_POINT)
-            FEASIBLE_LOW_PIVOT_POINTS = np.append(FEASIBLE_LOW_PIVOT_POINTS, RECENT_LOW_PIVOT_POINT)
-
-            dfHigh=df[df['Pivot'] == 2]
-            dfLow=df[df['Pivot'] == 1]
-            # print(dfLow)
-            # prdfLow['PointPosition'] == dfLow.PointPosition.min()
-            MAX_HIGH_PIVOT_POINT = dfHigh.loc[dfHigh['PointPosition'] == dfHigh.PointPosition.max(), 'Id'].iloc[0]
-            MIN_LOW_PIVOT_POINT  = dfLow.loc[dfLow['PointPosition'] == dfLow.PointPosition.min(),  'Id'].iloc[0]
-
-            FEASIBLE_HIGH_PIVOT_POINTS = np.append(FEASIBLE_HIGH_PIVOT_POINTS, MAX_HIGH_PIVOT_POINT)
-            FEASIBLE_HIGH = np.append(FEASIBLE_HIGH, dfHigh.loc[dfHigh['PointPosition'] == dfHigh.PointPosition.max(), 'high'])
-            FEASIBLE_LOW_PIVOT_POINTS = np.append(FEASIBLE_LOW_PIVOT_POINTS, MIN_LOW_PIVOT_POINT)
-            FEASIBLE_LOW = np.append(FEASIBLE_LOW, dfLow.loc[dfLow['PointPosition'] == dfLow.PointPosition.min(), 'low'])
-
-            dfHigh = dfHigh[dfHigh['Id'] > MAX_HIGH_PIVOT_POINT]
-            dfLow = dfLow[dfLow['Id'] > MIN_LOW_PIVOT_POINT]
-
-            # if not dfHigh.loc[dfHigh['PointPosition'] == dfHigh.PointPosition.max(), 'Id'].empty:
-            FEASIBLE_HIGH_PIVOT_POINTS = np.append(FEASIBLE_HIGH_PIVOT_POINTS, dfHigh.loc[dfHigh['PointPosition'] == dfHigh.PointPosition.max(), 'Id'].iloc[0])
-            # print(FEASIBLE_HIGH_PIVOT_POINTS)
-            # if not dfHigh.loc[dfHigh['PointPosition'] == dfHigh.PointPosition.max(), 'high'].empty:
-            FEASIBLE_HIGH = np.append(FEASIBLE_HIGH, dfHigh.loc[dfHigh['PointPosition'] == dfHigh.PointPosition.max(), 'high'].iloc[0])
-
-            # if not dfLow.loc[dfLow['PointPosition'] == dfLow.PointPosition.min(), 'Id'].empty:
-            FEASIBLE_LOW_PIVOT_POINTS = np.append(FEASIBLE_LOW_PIVOT_POINTS, dfLow.loc[dfLow['PointPosition'] == dfLow.PointPosition.min(), 'Id'].iloc[0])
-
-            # if not dfLow.loc[dfLow['PointPosition'] == dfLow.PointPosition.min(), 'low'].empty:
-            FEASIBLE_LOW = np.append(FEASIBLE_LOW, dfLow.loc[dfLow['PointPosition'] == dfLow.PointPosition.min(), 'low'].iloc[0])
-
-            # if not FEASIBLE_LOW_PIVOT_POINTS.empty and not FEASIBLE_LOW.empty:
-            #     slmin, intercmin, rmin, pmin, semin = linregress(FEASIBLE_LOW_PIVOT_POINTS, FEASIBLE_LOW)
-            #     if(df['close'].iloc[-1] < slmin * df['close'].iloc[-1] + intercmin):
-            #         order_target_percent(context.long_portfolio[i], 0)
-            # if not FEASIBLE_HIGH_PIVOT_POINTS.empty and not FEASIBLE_HIGH.empty:
-            #     slmax, intercmax, rmax, pmax, semax = linregress(FEASIBLE_HIGH_PIVOT_POINTS, FEASIBLE_HIGH)
-            #     if(df['close'].iloc[-1] > slmax * df['close'].iloc[-1] + intercmax):
-            #         order_target_percent(context.long_portfolio[i], 1/(round(len(context.long_portfolio),2)))
-
-            slmin, intercmin, rmin, pmin, semin = linregress(FEASIBLE_LOW_PIVOT_POINTS, FEASIBLE_LOW)
-            slmax, intercmax, rmax, pmax, semax = linregress(FEASIBLE_HIGH_PIVOT_POINTS, FEASIBLE_HIGH)
-            
-            if(df['close'].iloc[-1] < slmin * df['close'].iloc[-1] + intercmin and context.flag == 1):
-                order_target_percent(security, 0)
-            elif(df['close'].iloc[-1] > slmax * df['close'].iloc[-1] + intercmax and context.flag == 0):
-                order_target_percent(security,0.13)
-                # set_stoploss(security, "PERCENT", 0.01)
+            with timing.stage('signal_function', security):
+                df = stock_data.xs(security) 
+                close = df.close.values
+                highs, lows = pivot_arrays(df.high.values, df.low.values, NUM_BEFORE, NUM_AFTER)
+
+                # upper line: latest pivot high, highest pivot high and the highest one after it
+                # lower line: latest pivot low, lowest pivot low and the lowest one after it
+                FEASIBLE_HIGH_PIVOT_POINTS, FEASIBLE_HIGH = feasible_points(highs, np.argmax)
+                FEASIBLE_LOW_PIVOT_POINTS, FEASIBLE_LOW = feasible_points(lows, np.argmin)
+
+                slmin, intercmin, rmin = fit_line(FEASIBLE_LOW_PIVOT_POINTS, FEASIBLE_LOW)
+                slmax, intercmax, rmax = fit_line(FEASIBLE_HIGH_PIVOT_POINTS, FEASIBLE_HIGH)
+
+            with timing.stage('order', security):
+                if(close[-1] < slmin * close[-1] + intercmin and context.flag == 1):
+                    order_target_percent(security, 0)
+                elif(close[-1] > slmax * close[-1] + intercmax and context.flag == 0):
+                    order_target_percent(security,0.13)
+                    # set_stoploss(security, "PERCENT", 0.01)
         except:
+            timing.failure('rebalance')
             print("Not Found")
-        
-
-
-            
\ No newline at end of file
+    # rebalances once a day, the others dump at stop_trading
+    timing.dump()
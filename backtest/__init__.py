@@ -0,0 +1,11 @@
+"""
+    Offline stand-in for the parts of Blueshift the strategies in this repo
+    use, so they can be run, profiled and benchmarked locally.
+
+    Run a strategy file unchanged with
+
+        python -m backtest combined_5.py --data path/to/minute/bars
+
+    or from Python with `backtest.engine.run_algorithm`. The strategy's
+    `from blueshift.api import ...` lines are served by `backtest.shim`.
+"""
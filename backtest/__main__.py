@@ -0,0 +1,74 @@
+"""
+    python -m backtest STRATEGY.py --data DIR [--capital X] [--start D] [--end D]
+                       [--processes N --shard-by securities|dates [--warmup S]]
+                       [--charges equity|futures] [--timings FILE]
+"""
+import argparse
+import time
+
+from backtest.engine import run_algorithm
+from backtest.finance.charges import INSTRUMENTS
+from backtest.finance.commission import IndianCharges
+from backtest.parallel import DATES, SECURITIES, run_sharded
+from technicals import timing
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m backtest',
+                                     description='Run a Blueshift strategy file offline.')
+    parser.add_argument('strategy', help='path of the strategy file')
+    parser.add_argument('--data', required=True,
+                        help='bar store (see backtest.store) or directory with one '
+                             '<SYMBOL>.csv of minute bars per symbol')
+    parser.add_argument('--capital', type=float, default=1000000.0)
+    parser.add_argument('--start', default=None, help='first session, YYYY-MM-DD')
+    parser.add_argument('--end', default=None, help='last session, YYYY-MM-DD')
+    parser.add_argument('--blotter', default=None, help='write the fills to this CSV file')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='run shards of the strategy in this many processes')
+    parser.add_argument('--shard-by', choices=(SECURITIES, DATES), default=SECURITIES,
+                        help='split the run by securities (sleeves) or by dates')
+    parser.add_argument('--warmup', type=int, default=1,
+                        help='sessions every block of dates runs before its own to '
+                             'build up the state of the strategy')
+    parser.add_argument('--charges', choices=sorted(INSTRUMENTS), default=None,
+                        help='pay NSE brokerage and statutory charges on every fill '
+                             'instead of the commission the strategy sets')
+    parser.add_argument('--timings', default=None,
+                        help='record the latency of the strategy stages and write them '
+                             'to this JSON file')
+    args = parser.parse_args(argv)
+    if args.timings and args.processes:
+        parser.error('--timings records a single process, leave out --processes')
+    if args.timings:
+        timing.enable(args.timings)
+    commission = IndianCharges(args.charges) if args.charges else None
+
+    started = time.time()
+    if args.processes:
+        result = run_sharded(args.strategy, args.data, by=args.shard_by,
+                             capital=args.capital, start=args.start, end=args.end,
+                             processes=args.processes, commission=commission,
+                             warmup=args.warmup)
+    else:
+        result = run_algorithm(args.strategy, args.data, args.capital, args.start,
+                               args.end, commission=commission)
+    elapsed = time.time() - started
+    if args.timings:
+        # the strategies dump at stop_trading, this adds the last session
+        timing.dump()
+        timing.disable()
+
+    equity = result.equity
+    final = equity.iloc[-1] if len(equity) else args.capital
+    print('sessions      : {}'.format(len(equity)))
+    print('fills         : {}'.format(len(result.fills)))
+    print('final value   : {:.2f}'.format(final))
+    print('total return  : {:.2%}'.format(final / args.capital - 1))
+    print('run time      : {:.1f}s'.format(elapsed))
+    if args.blotter:
+        result.blotter.to_csv(args.blotter, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+    The `blueshift.api` functions used by the strategies, routed to the
+    algorithm that is currently running (see `backtest.engine`).
+"""
+from backtest.rules import date_rules, time_rules
+
+_algorithm = None
+
+
+def set_algorithm(algorithm):
+    """
+        Make `algorithm` the target of the API calls below.
+    """
+    global _algorithm
+    _algorithm = algorithm
+
+
+def get_algorithm():
+    if _algorithm is None:
+        raise RuntimeError('no algorithm is running')
+    return _algorithm
+
+
+def symbol(ticker):
+    return get_algorithm().symbol(ticker)
+
+
+def symbols(*tickers):
+    return [symbol(t) for t in tickers]
+
+
+def get_datetime():
+    return get_algorithm().data.current_dt
+
+
+def schedule_function(func, date_rule=None, time_rule=None):
+    get_algorithm().schedule_function(func, date_rule, time_rule)
+
+
+def on_bar_close(func, assets, frequency='1m'):
+    """
+        Offline only: call `func(context, data, assets)` at the close of
+        every `frequency` bar (1m, 5m, 15m, 30m, 1h or 1d, aligned to the
+        session open) in which some of `assets` traded, with the ones that
+        did. Blueshift has no such call, so strategies fall back to
+        `schedule_function` when it cannot be imported.
+    """
+    get_algorithm().on_bar_close(func, assets, frequency)
+
+
+def set_commission(commission_model):
+    get_algorithm().set_commission(commission_model)
+
+
+def set_slippage(slippage_model):
+    get_algorithm().slippage = slippage_model
+
+
+def set_stoploss(asset, method, target, trailing=False, on_stoploss=None):
+    get_algorithm().set_stoploss(asset, method, target, trailing, on_stoploss)
+
+
+def order(asset, quantity):
+    return get_algorithm().order(asset, quantity)
+
+
+def order_value(asset, value):
+    return get_algorithm().order_value(asset, value)
+
+
+def order_percent(asset, percent):
+    return get_algorithm().order_percent(asset, percent)
+
+
+def order_target(asset, target):
+    return get_algorithm().order_target(asset, target)
+
+
+def order_target_value(asset, target):
+    return get_algorithm().order_target_value(asset, target)
+
+
+def order_target_percent(asset, percent):
+    return get_algorithm().order_target_percent(asset, percent)
+
+
+def cancel_order(order_id):
+    get_algorithm().cancel_order(order_id)
+
+
+def get_open_orders(asset=None):
+    return get_algorithm().get_open_orders(asset)
+
+
+def record(**kwargs):
+    get_algorithm().record(**kwargs)
+
+
+__all__ = ['symbol', 'symbols', 'get_datetime', 'schedule_function', 'on_bar_close',
+           'set_commission', 'set_slippage', 'set_stoploss', 'order',
+           'order_value', 'order_percent', 'order_target',
+           'order_target_value', 'order_target_percent', 'cancel_order',
+           'get_open_orders', 'record', 'date_rules', 'time_rules']
@@ -0,0 +1,32 @@
+"""
+    Assets as handed out by `symbol()`.
+"""
+
+
+class SymbolNotFound(ValueError):
+    """
+        Raised by `symbol()` for a ticker with no bars in the data.
+    """
+
+
+class Asset(object):
+    """
+        A tradable instrument. `sid` is its row in the bar arrays.
+    """
+    __slots__ = ('symbol', 'sid')
+
+    def __init__(self, symbol, sid):
+        self.symbol = symbol
+        self.sid = sid
+
+    def __repr__(self):
+        return 'Equity({})'.format(self.symbol)
+
+    def __eq__(self, other):
+        return isinstance(other, Asset) and other.symbol == self.symbol
+
+    def __lt__(self, other):
+        return self.symbol < other.symbol
+
+    def __hash__(self):
+        return hash(self.symbol)
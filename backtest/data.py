@@ -0,0 +1,237 @@
+"""
+    Minute bars on disk and the `data` object handed to strategies.
+
+    `MinuteBars` holds one (symbol x minute) float array per field on a
+    common minute timeline; symbols without a bar in some minute hold NaN
+    there. `DataPortal` answers `data.history` / `data.current` as of the
+    engine's clock, building daily bars from the minutes on the fly.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from technicals.history import HistoryWindow
+from technicals.marketdata import load_bars
+from technicals.timeframes import reduce_segments
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+MINUTE = '1m'
+DAILY = '1d'
+
+
+def parse_frequency(frequency):
+    """
+        Normalise a Blueshift frequency string to MINUTE or DAILY.
+    """
+    freq = str(frequency).strip().lower()
+    if freq in ('1m', '1min', 'minute', 'm'):
+        return MINUTE
+    if freq in ('1d', 'day', 'daily', 'd'):
+        return DAILY
+    raise ValueError('unsupported frequency {!r}'.format(frequency))
+
+
+class MinuteBars(object):
+    """
+        Minute OHLCV bars for a set of symbols on a common timeline.
+    """
+
+    def __init__(self, timestamps, symbols, fields):
+        self.timestamps = np.asarray(timestamps, dtype='datetime64[ns]')
+        self.symbols = list(symbols)
+        self.sids = dict((s, i) for i, s in enumerate(self.symbols))
+        self.fields = dict((f, np.asarray(v, dtype=float)) for f, v in fields.items())
+        for name, values in self.fields.items():
+            if values.shape != (len(self.symbols), len(self.timestamps)):
+                raise ValueError('field {} has shape {}, expected {}'.format(
+                    name, values.shape, (len(self.symbols), len(self.timestamps))))
+
+        days = self.timestamps.astype('datetime64[D]')
+        new_day = np.ones(len(days), dtype=bool)
+        new_day[1:] = days[1:] != days[:-1]
+        self.session_starts = np.flatnonzero(new_day)
+        self.session_ends = np.r_[self.session_starts[1:], len(days)].astype(np.int64)
+        self.session_dates = days[self.session_starts]
+        self.session_of_minute = np.repeat(np.arange(len(self.session_starts)),
+                                           self.session_ends - self.session_starts)
+        self._daily = {}
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @classmethod
+    def from_frames(cls, frames):
+        """
+            Build from a dict of symbol -> DataFrame indexed by timestamp
+            with (a subset of) open/high/low/close/volume columns.
+        """
+        symbols = sorted(frames)
+        index = pd.DatetimeIndex([])
+        for sym in symbols:
+            index = index.union(pd.DatetimeIndex(frames[sym].index))
+        fields = dict((f, np.full((len(symbols), len(index)), np.nan)) for f in FIELDS)
+        for i, sym in enumerate(symbols):
+            df = frames[sym]
+            df = df[~df.index.duplicated(keep='last')].sort_index()
+            pos = index.get_indexer(pd.DatetimeIndex(df.index))
+            for f in FIELDS:
+                if f in df.columns:
+                    fields[f][i, pos] = df[f].to_numpy(dtype=float)
+        return cls(index.values, symbols, fields)
+
+    @classmethod
+    def from_directory(cls, path, symbols=None):
+        """
+            Load one `<SYMBOL>.csv` file per symbol from `path`. The first
+            column is the bar timestamp, the others are OHLCV fields.
+        """
+        frames = {}
+        for name in sorted(os.listdir(path)):
+            sym, ext = os.path.splitext(name)
+            if ext.lower() != '.csv' or (symbols is not None and sym not in symbols):
+                continue
+            df = pd.read_csv(os.path.join(path, name), index_col=0, parse_dates=True)
+            df.columns = [c.strip().lower() for c in df.columns]
+            frames[sym] = df
+        return cls.from_frames(frames)
+
+    @classmethod
+    def from_cache(cls, symbols, start=None, end=None, interval='1m', cache=None):
+        """
+            Load `symbols` through the download cache of
+            `technicals.marketdata`, which the notebooks read from too;
+            only the dates it does not hold yet are downloaded.
+        """
+        return cls.from_frames(load_bars(symbols, interval, start, end, cache=cache))
+
+    def minute_window(self, sids, field, end, count):
+        """
+            `count` minutes of `field` ending at minute `end` (inclusive):
+            one read-only view per sid into the field array (no copy) and
+            the matching timestamps.
+        """
+        start = max(end + 1 - count, 0)
+        values = self.fields[field]
+        rows = []
+        for sid in sids:
+            row = values[sid, start:end + 1]
+            row.flags.writeable = False
+            rows.append(row)
+        return rows, self.timestamps[start:end + 1]
+
+    def daily(self, field):
+        """
+            Daily bars of every complete session, (symbols x sessions).
+        """
+        if field not in self._daily:
+            self._daily[field] = reduce_segments(self.fields[field],
+                                                 self.session_starts, field)
+        return self._daily[field]
+
+    def daily_window(self, sids, field, end, count):
+        """
+            `count` daily bars ending with the (partial) session that
+            contains minute `end`, one row per sid, and the session dates.
+        """
+        session = self.session_of_minute[end]
+        first = max(session + 1 - count, 0)
+        done = self.daily(field)[sids, first:session]
+        start = self.session_starts[session]
+        today = reduce_segments(self.fields[field][sids, start:end + 1], [0], field)
+        values = np.concatenate([done, today], axis=1)
+        return list(values), self.session_dates[first:session + 1]
+
+    def last_valid(self, sid, field, end):
+        """
+            Most recent non-NaN value of `field` at or before minute `end`.
+        """
+        values = self.fields[field][sid]
+        i = end
+        # bars are usually present, so walk back a block at a time
+        while i >= 0:
+            block = values[max(i - 63, 0):i + 1]
+            ok = np.flatnonzero(~np.isnan(block))
+            if len(ok):
+                return block[ok[-1]]
+            i -= 64
+        return np.nan
+
+
+class DataPortal(object):
+    """
+        The `data` argument of strategy callbacks.
+    """
+
+    def __init__(self, bars, assets):
+        self.bars = bars
+        self.assets = assets
+        self.now = -1
+
+    @property
+    def current_dt(self):
+        return pd.Timestamp(self.bars.timestamps[self.now])
+
+    def _window(self, sids, field, bar_count, frequency):
+        if frequency == MINUTE:
+            return self.bars.minute_window(sids, field, self.now, bar_count)
+        return self.bars.daily_window(sids, field, self.now, bar_count)
+
+    def history(self, assets, fields, bar_count, frequency):
+        """
+            Same shapes as Blueshift: a Series for one asset and one field,
+            a DataFrame with one column per field (or per asset) when only
+            one of them is a list, and a DataFrame indexed by
+            (asset, timestamp) when both are lists.
+        """
+        frequency = parse_frequency(frequency)
+        many_assets = not hasattr(assets, 'sid')
+        many_fields = not isinstance(fields, str)
+        asset_list = list(assets) if many_assets else [assets]
+        field_list = list(fields) if many_fields else [fields]
+        sids = [a.sid for a in asset_list]
+
+        rows = {}
+        index = None
+        for field in field_list:
+            rows[field], stamps = self._window(sids, field, bar_count, frequency)
+            index = pd.DatetimeIndex(stamps, copy=False)
+
+        if not many_assets and not many_fields:
+            return pd.Series(rows[field_list[0]][0], index=index,
+                             name=field_list[0], copy=False)
+        if not many_assets:
+            return pd.DataFrame(dict((f, rows[f][0]) for f in field_list),
+                                index=index, columns=field_list, copy=False)
+        if not many_fields:
+            return pd.DataFrame(np.column_stack(rows[field_list[0]]) if asset_list
+                                else None, index=index, columns=asset_list)
+        return HistoryWindow(asset_list, field_list, index, rows)
+
+    def current(self, assets, fields):
+        """
+            Latest value of each field, carrying the last trade forward
+            over minutes without a bar.
+        """
+        many_assets = not hasattr(assets, 'sid')
+        many_fields = not isinstance(fields, str)
+        asset_list = list(assets) if many_assets else [assets]
+        field_list = list(fields) if many_fields else [fields]
+        values = dict((f, [self.bars.last_valid(a.sid, f, self.now) for a in asset_list])
+                      for f in field_list)
+        if not many_assets and not many_fields:
+            return values[field_list[0]][0]
+        if not many_assets:
+            return pd.Series(dict((f, values[f][0]) for f in field_list))
+        if not many_fields:
+            return pd.Series(values[field_list[0]], index=asset_list)
+        return pd.DataFrame(values, index=asset_list, columns=field_list)
+
+    def can_trade(self, assets):
+        """
+            True for assets that have traded at least once so far.
+        """
+        if hasattr(assets, 'sid'):
+            return not np.isnan(self.bars.last_valid(assets.sid, 'close', self.now))
+        return pd.Series([self.can_trade(a) for a in assets], index=list(assets))
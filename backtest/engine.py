@@ -0,0 +1,618 @@
+"""
+    Minute resolution event loop that runs a strategy module offline.
+
+    The loop only wakes up at minutes where something is scheduled, so a
+    strategy trading every few minutes over a year of 1m bars costs one
+    Python call per scheduled run rather than one per bar per symbol.
+
+    Fill model: market orders fill at the open of the first bar of the asset
+    after the minute the order was placed, adjusted by the slippage model,
+    and pay the commission model on top.
+"""
+import importlib.util
+import itertools
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from backtest import api
+from backtest.assets import Asset, SymbolNotFound
+from backtest.data import DataPortal, MinuteBars
+from backtest.finance.commission import NoCommission
+from backtest.finance.slippage import NoSlippage
+from backtest.rules import DateRule, TimeRule
+from backtest.store import is_store, open_store
+from technicals.timeframes import bucket_bounds, parse_timeframe
+
+
+class ShardingError(RuntimeError):
+    """
+        Raised by a shard reading something only the whole book knows
+        (the portfolio, open orders, order ids).
+    """
+
+
+class ShardSecurities(list):
+    """
+        The securities of a shard: iterates over the names of the shard but
+        has the length of the whole list, so weights sized by
+        `len(context.securities)` are those of one run over all of them.
+    """
+
+    def __init__(self, shard, total):
+        list.__init__(self, shard)
+        self.total = total
+
+    def __len__(self):
+        return self.total
+
+
+class _Unavailable(object):
+    """
+        Stands in for `context.portfolio` in a shard.
+    """
+
+    def __init__(self, name):
+        object.__setattr__(self, '_name', name)
+
+    def __getattr__(self, attr):
+        raise ShardingError('a shard has no {}: orders are only filled when the '
+                            'shards are replayed together'.format(self._name))
+
+
+class Context(object):
+    """
+        Attribute bag passed to every strategy callback.
+
+        With a `universe` (a set of symbols) the strategy runs on a shard of
+        its securities: whatever list is assigned to `context.securities`
+        keeps only the assets in the universe (as `ShardSecurities`, with
+        the length of the whole list), so everything the strategy builds
+        from it afterwards covers the shard alone. Likewise `params`
+        overrides entries of the dict assigned to `context.params`.
+    """
+
+    def __init__(self, universe=None, params=None):
+        object.__setattr__(self, '_universe', universe)
+        object.__setattr__(self, '_params', params)
+        # position of every security in the whole list, orders the calls
+        # of the shards like those of one run
+        object.__setattr__(self, '_ranks', {})
+
+    def __setattr__(self, name, value):
+        if name == 'securities' and self._universe is not None:
+            value = list(value)
+            object.__setattr__(self, '_ranks',
+                               dict((a.symbol, k) for k, a in enumerate(value)))
+            value = ShardSecurities([a for a in value if a.symbol in self._universe],
+                                    len(value))
+        elif name == 'params' and self._params:
+            value = dict(value)
+            value.update(self._params)
+        object.__setattr__(self, name, value)
+
+    def __repr__(self):
+        names = [n for n in vars(self) if not n.startswith('_')]
+        return 'Context({})'.format(', '.join(sorted(names)))
+
+
+class Position(object):
+    """
+        Open position in one asset.
+    """
+    __slots__ = ('asset', 'quantity', 'cost_basis', 'last_sale_price')
+
+    def __init__(self, asset):
+        self.asset = asset
+        self.quantity = 0
+        self.cost_basis = 0.0
+        self.last_sale_price = np.nan
+
+    def __repr__(self):
+        return 'Position({}, quantity={}, cost_basis={:.4f})'.format(
+            self.asset.symbol, self.quantity, self.cost_basis)
+
+
+class Portfolio(object):
+    """
+        Cash and positions, valued at the last traded prices.
+    """
+
+    def __init__(self, capital):
+        self.starting_cash = capital
+        self.cash = capital
+        self.positions = {}
+        self.positions_value = 0.0
+        self.portfolio_value = capital
+
+    def __repr__(self):
+        return 'Portfolio(value={:.2f}, cash={:.2f}, positions={})'.format(
+            self.portfolio_value, self.cash, len(self.positions))
+
+
+class Order(object):
+    """
+        A market order waiting for the next bar of its asset.
+    """
+    __slots__ = ('id', 'asset', 'quantity', 'created')
+
+    def __init__(self, id, asset, quantity, created):
+        self.id = id
+        self.asset = asset
+        self.quantity = quantity
+        self.created = created
+
+    def __repr__(self):
+        return 'Order({}, {}, {})'.format(self.id, self.asset.symbol, self.quantity)
+
+
+class BacktestResult(object):
+    """
+        Output of a run: the fills, the end of day equity curve and any
+        values passed to `record()`.
+    """
+
+    def __init__(self, context, fills, equity, recorded, calls=None):
+        self.context = context
+        self.fills = fills
+        self.equity_values = equity
+        self.recorded_values = recorded
+        # order calls of a recording run, for `TradingAlgorithm.replay`
+        self.calls = calls
+
+    @property
+    def blotter(self):
+        columns = ['timestamp', 'symbol', 'quantity', 'price', 'commission']
+        return pd.DataFrame(self.fills, columns=columns)
+
+    @property
+    def equity(self):
+        dates, values = zip(*self.equity_values) if self.equity_values else ((), ())
+        return pd.Series(values, index=pd.DatetimeIndex(dates), name='portfolio_value',
+                         dtype=float)
+
+    @property
+    def recorded(self):
+        if not self.recorded_values:
+            return pd.DataFrame()
+        return pd.DataFrame(self.recorded_values).set_index('date')
+
+
+class TradingAlgorithm(object):
+    """
+        Runs the callbacks of one strategy module over a `MinuteBars` set.
+
+        A `recording` run (the shards of `backtest.parallel`) fills
+        nothing: every order call is kept in `calls` with the event it
+        was made in, and `replay` later places the calls of all the shards
+        against one book, at the events of one run over everything.
+
+        `warmup` sessions before `start` run the callbacks only for the
+        state they build up (histories, indicators): their orders are
+        dropped and they have no equity or recorded values.
+    """
+
+    def __init__(self, module, bars, capital=1000000.0, start=None, end=None,
+                 universe=None, params=None, commission=None, recording=False,
+                 warmup=0):
+        self.module = module
+        self.bars = bars
+        self.capital = capital
+        self.start = start
+        self.end = end
+
+        self.context = Context(None if universe is None else frozenset(universe),
+                               params)
+        self.portfolio = Portfolio(capital)
+        self.recording = recording
+        self.warmup = warmup
+        self.context.portfolio = _Unavailable('portfolio') if recording else self.portfolio
+        # a commission model given here wins over the strategy's own
+        self.commission = commission or NoCommission()
+        self._commission_fixed = commission is not None
+        self.slippage = NoSlippage()
+
+        self._assets = {}
+        self.data = DataPortal(bars, self._assets)
+        self._schedules = []
+        self._bar_closes = []
+        self._open_orders = {}
+        self._order_ids = itertools.count(1)
+        self._stops = {}
+        self._checked = -1
+        self._fills = []
+        self._equity = []
+        self._recorded = []
+        self._record_today = {}
+        self._calls = []
+        # (session, minute, key) of the callback running
+        self._event = None
+        self._warming = False
+
+    # --- api -----------------------------------------------------------
+
+    def symbol(self, ticker):
+        if ticker not in self._assets:
+            sid = self.bars.sids.get(ticker)
+            if sid is None:
+                raise SymbolNotFound('no data for symbol {}'.format(ticker))
+            self._assets[ticker] = Asset(ticker, sid)
+        return self._assets[ticker]
+
+    def set_commission(self, commission):
+        if not self._commission_fixed:
+            self.commission = commission
+
+    def schedule_function(self, func, date_rule=None, time_rule=None):
+        date_rule = date_rule if date_rule is not None else DateRule()
+        if time_rule is None or not isinstance(time_rule, TimeRule):
+            raise ValueError('schedule_function needs a time rule')
+        self._schedules.append((func, date_rule, time_rule))
+
+    def on_bar_close(self, func, assets, frequency='1m'):
+        minutes = parse_timeframe(frequency)
+        assets = [assets] if hasattr(assets, 'sid') else list(assets)
+        self._bar_closes.append((func, assets, minutes))
+
+    def _record(self, name, asset, *args):
+        """
+            Keep an order call of a recording run, True if it was kept (or
+            dropped, in a warm-up session).
+        """
+        if self._warming:
+            return True
+        if not self.recording:
+            return False
+        rank = self.context._ranks.get(asset.symbol, len(self.context._ranks))
+        self._calls.append(self._event + (rank, len(self._calls), name, asset.symbol, args))
+        return True
+
+    def set_stoploss(self, asset, method, target, trailing=False, on_stoploss=None):
+        if self.recording and on_stoploss is not None:
+            raise ShardingError('on_stoploss callbacks cannot be replayed, run this '
+                                'strategy without shards')
+        if self._record('set_stoploss', asset, method, target, trailing):
+            return
+        if trailing:
+            raise NotImplementedError('trailing stoploss is not supported offline')
+        method = str(method).upper()
+        if method not in ('PERCENT', 'PRICE', 'AMOUNT'):
+            raise ValueError('unknown stoploss method {}'.format(method))
+        self._stops[asset] = (method, float(target), on_stoploss)
+
+    def order(self, asset, quantity):
+        if self._record('order', asset, quantity):
+            return None
+        quantity = int(quantity)
+        if quantity == 0:
+            return None
+        order = Order(next(self._order_ids), asset, quantity, self.data.now)
+        self._open_orders[order.id] = order
+        return order.id
+
+    def _price(self, asset):
+        return self.bars.last_valid(asset.sid, 'close', self.data.now)
+
+    def _held(self, asset):
+        position = self.portfolio.positions.get(asset)
+        return position.quantity if position is not None else 0
+
+    def order_value(self, asset, value):
+        if self._record('order_value', asset, value):
+            return None
+        price = self._price(asset)
+        if not price > 0:
+            return None
+        return self.order(asset, int(value / price))
+
+    def order_percent(self, asset, percent):
+        if self._record('order_percent', asset, percent):
+            return None
+        return self.order_value(asset, percent * self._update_portfolio())
+
+    def order_target(self, asset, target):
+        if self._record('order_target', asset, target):
+            return None
+        # a new target replaces whatever was still pending for the asset
+        for order in self.get_open_orders(asset):
+            del self._open_orders[order.id]
+        return self.order(asset, int(target) - self._held(asset))
+
+    def order_target_value(self, asset, target):
+        if self._record('order_target_value', asset, target):
+            return None
+        price = self._price(asset)
+        if not price > 0:
+            return None
+        return self.order_target(asset, int(target / price))
+
+    def order_target_percent(self, asset, percent):
+        if self._record('order_target_percent', asset, percent):
+            return None
+        return self.order_target_value(asset, percent * self._update_portfolio())
+
+    def _unavailable(self, name):
+        if self.recording:
+            raise ShardingError('a shard has no {}: orders are only placed when the '
+                                'shards are replayed together'.format(name))
+
+    def cancel_order(self, order_id):
+        self._unavailable('cancel_order')
+        self._open_orders.pop(order_id, None)
+
+    def get_open_orders(self, asset=None):
+        self._unavailable('get_open_orders')
+        return [o for o in self._open_orders.values()
+                if asset is None or o.asset == asset]
+
+    def record(self, **kwargs):
+        self._record_today.update(kwargs)
+
+    # --- event loop ----------------------------------------------------
+
+    def _update_portfolio(self):
+        value = 0.0
+        now = self.data.now
+        for asset, position in self.portfolio.positions.items():
+            price = self.bars.last_valid(asset.sid, 'close', now) if now >= 0 else np.nan
+            if not np.isnan(price):
+                position.last_sale_price = price
+            value += position.quantity * position.last_sale_price
+        self.portfolio.positions_value = value
+        self.portfolio.portfolio_value = self.portfolio.cash + value
+        return self.portfolio.portfolio_value
+
+    def _fill(self, order, minute, price, commission):
+        quantity = order.quantity
+        portfolio = self.portfolio
+        portfolio.cash -= quantity * price + commission
+
+        position = portfolio.positions.get(order.asset)
+        if position is None:
+            position = portfolio.positions[order.asset] = Position(order.asset)
+        held = position.quantity
+        total = held + quantity
+        if total == 0:
+            del portfolio.positions[order.asset]
+        else:
+            if held == 0 or (held > 0) != (total > 0):
+                position.cost_basis = price
+            elif (held > 0) == (quantity > 0):
+                position.cost_basis = (position.cost_basis * held + price * quantity) / total
+            position.quantity = total
+            position.last_sale_price = price
+        self._fills.append((pd.Timestamp(self.bars.timestamps[minute]),
+                            order.asset.symbol, quantity, price, commission))
+
+    def _fill_orders(self, upto):
+        opens = self.bars.fields['open']
+        fills = []
+        for order in list(self._open_orders.values()):
+            if order.created >= upto:
+                continue
+            bars = opens[order.asset.sid, order.created + 1:upto + 1]
+            traded = np.flatnonzero(~np.isnan(bars))
+            if len(traded):
+                del self._open_orders[order.id]
+                minute = order.created + 1 + traded[0]
+                price = self.slippage.fill_price(bars[traded[0]], order.quantity)
+                fills.append((order, minute, price))
+        if not fills:
+            return
+        # fills of one step do not depend on each other, so their
+        # commissions can be priced together
+        if hasattr(self.commission, 'calculate_many'):
+            commissions = self.commission.calculate_many(
+                [price for _, _, price in fills], [order.quantity for order, _, _ in fills])
+            commissions = [float(c) for c in commissions]
+        else:
+            commissions = [self.commission.calculate(price, order.quantity)
+                           for order, _, price in fills]
+        for (order, minute, price), commission in zip(fills, commissions):
+            self._fill(order, minute, price, commission)
+
+    def _check_stops(self, upto):
+        start = self._checked + 1
+        self._checked = upto
+        if not self._stops or upto < start:
+            return False
+        triggered = False
+        for asset, (method, target, callback) in list(self._stops.items()):
+            position = self.portfolio.positions.get(asset)
+            if position is None or position.quantity == 0:
+                continue
+            long = position.quantity > 0
+            if method == 'PERCENT':
+                level = position.cost_basis * (1 - target if long else 1 + target)
+            elif method == 'AMOUNT':
+                level = position.cost_basis + (-target if long else target)
+            else:
+                level = target
+            prices = self.bars.fields['low' if long else 'high'][asset.sid, start:upto + 1]
+            hit = np.flatnonzero(prices <= level if long else prices >= level)
+            if len(hit):
+                del self._stops[asset]
+                for order in self.get_open_orders(asset):
+                    del self._open_orders[order.id]
+                order = Order(next(self._order_ids), asset, -position.quantity,
+                              start + hit[0])
+                self._open_orders[order.id] = order
+                triggered = True
+                if callback is not None:
+                    callback(self.context, asset)
+        return triggered
+
+    def _advance(self, minute):
+        """
+            Process fills and stops up to `minute` and move the clock there.
+        """
+        self._fill_orders(minute)
+        if self._check_stops(minute):
+            self._fill_orders(minute)
+        self.data.now = minute
+
+    def _sessions(self):
+        dates = self.bars.session_dates
+        keep = np.ones(len(dates), dtype=bool)
+        if self.start is not None:
+            keep &= dates >= np.datetime64(pd.Timestamp(self.start).date(), 'D')
+        if self.end is not None:
+            keep &= dates <= np.datetime64(pd.Timestamp(self.end).date(), 'D')
+        return np.flatnonzero(keep)
+
+    def _session_events(self, session, date_masks):
+        start = self.bars.session_starts[session]
+        length = self.bars.session_ends[session] - start
+        events = []
+        for k, (func, date_rule, time_rule) in enumerate(self._schedules):
+            if date_masks[k][session]:
+                for minute in time_rule.minutes(length):
+                    events.append((start + int(minute), k, func, ()))
+        for k, (func, assets, minutes) in enumerate(self._bar_closes, len(self._schedules)):
+            for minute, updated in self._bar_close_events(start, length, assets, minutes):
+                events.append((minute, k, func, (updated,)))
+        handle_data = getattr(self.module, 'handle_data', None)
+        if handle_data is not None:
+            events.extend((start + m, -1, handle_data, ()) for m in range(length))
+        events.sort(key=lambda e: (e[0], e[1]))
+        return events
+
+    def _bar_close_events(self, start, length, assets, minutes):
+        """
+            (minute, assets) of every bar of `minutes` (DAILY for the
+            session) that closes in the session and has a trade of at least
+            one of `assets`; the assets listed are the ones it has one of.
+            Bars are those of `bucket_bounds`, aligned to the session open
+            whatever minutes are missing, and fire at their last minute.
+        """
+        if not assets or length == 0:
+            return []
+        labels, _ = bucket_bounds(self.bars.timestamps[start:start + length], minutes)
+        starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+        ends = np.r_[starts[1:], length] - 1
+        closes = self.bars.fields['close'][[a.sid for a in assets], start:start + length]
+        traded = np.logical_or.reduceat(~np.isnan(closes), starts, axis=1)
+        out = []
+        for bar in np.flatnonzero(traded.any(axis=0)):
+            out.append((start + int(ends[bar]),
+                        [a for a, t in zip(assets, traded[:, bar]) if t]))
+        return out
+
+    def run(self):
+        """
+            Run the strategy over the selected sessions.
+        """
+        return self._run(self._call)
+
+    def replay(self, calls):
+        """
+            Initialize the strategy (for its commission, slippage and
+            events) and, instead of running its callbacks, place the
+            recorded `calls` of one or more recording runs at the events
+            they were made in; calls of the same event go in the order of
+            their securities in `context.securities`. The fills and equity
+            are those of one run making all of them. `analyze` is not
+            called.
+        """
+        pending = {}
+        for call in sorted(calls, key=lambda call: call[:5]):
+            pending.setdefault(call[:3], []).append(call[5:])
+
+        def place(func, args):
+            for name, ticker, call_args in pending.pop(self._event, ()):
+                getattr(self, name)(self.symbol(ticker), *call_args)
+
+        return self._run(place)
+
+    def _call(self, func, args):
+        func(self.context, self.data, *args)
+
+    def _run(self, handle):
+        api.set_algorithm(self)
+        try:
+            self.module.initialize(self.context)
+            date_masks = [rule.sessions(self.bars.session_dates)
+                          for _, rule, _ in self._schedules]
+            before = getattr(self.module, 'before_trading_start', None)
+            sessions = self._sessions()
+            first = sessions[0] if len(sessions) else 0
+            warm = np.arange(max(first - self.warmup, 0), first)
+            for session in np.r_[warm, sessions]:
+                self._warming = session < first
+                start = self.bars.session_starts[session]
+                self._advance(start - 1)
+                if before is not None:
+                    self._event = (int(session), int(start) - 1, -2)
+                    handle(before, ())
+                for minute, k, func, args in self._session_events(session, date_masks):
+                    self._advance(minute)
+                    self._event = (int(session), int(minute), k)
+                    handle(func, args)
+                self._event = None
+                self._advance(self.bars.session_ends[session] - 1)
+                if self._warming:
+                    self._record_today = {}
+                else:
+                    self._end_of_day(session)
+            self._warming = False
+            result = BacktestResult(self.context, self._fills, self._equity,
+                                    self._recorded, self._calls if self.recording else None)
+            analyze = getattr(self.module, 'analyze', None)
+            if analyze is not None and handle == self._call:
+                analyze(self.context, result)
+            return result
+        finally:
+            api.set_algorithm(None)
+
+    def _end_of_day(self, session):
+        date = pd.Timestamp(self.bars.session_dates[session])
+        self._equity.append((date, self._update_portfolio()))
+        if self._record_today:
+            row = dict(self._record_today)
+            row['date'] = date
+            self._recorded.append(row)
+            self._record_today = {}
+
+
+def load_strategy(path):
+    """
+        Import a strategy file with the `blueshift` imports served locally.
+    """
+    from backtest import shim
+    shim.install()
+    name = '_strategy_' + os.path.splitext(os.path.basename(path))[0].replace(' ', '_')
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    folder = os.path.dirname(os.path.abspath(path))
+    if folder not in sys.path:
+        # strategies import the shared modules next to them
+        sys.path.insert(0, folder)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_data(data):
+    """
+        `data` as a `MinuteBars`: a bar store directory or a directory of
+        per-symbol CSV files is loaded, a `MinuteBars` passes through.
+    """
+    if isinstance(data, str):
+        return open_store(data) if is_store(data) else MinuteBars.from_directory(data)
+    return data
+
+
+def run_algorithm(strategy, data, capital=1000000.0, start=None, end=None,
+                  universe=None, commission=None):
+    """
+        Backtest `strategy` (a module or the path of a strategy file) on
+        `data` (a `MinuteBars`, a bar store directory or a directory of
+        per-symbol CSV files), optionally on the `universe` shard of its
+        securities only. A `commission` model replaces the one the
+        strategy sets.
+    """
+    if isinstance(strategy, str):
+        strategy = load_strategy(strategy)
+    return TradingAlgorithm(strategy, load_data(data), capital, start, end,
+                            universe, commission=commission).run()
@@ -0,0 +1,4 @@
+"""
+    Commission and slippage models, imported by strategies as
+    `from blueshift.finance import commission, slippage`.
+"""
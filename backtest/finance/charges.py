@@ -0,0 +1,92 @@
+"""
+    Statutory charges on NSE equity and futures fills, per
+    `Slippage and Brokerage.xlsx`.
+
+    Every fill pays, on its turnover (price x quantity):
+
+        brokerage    0.03%, at most 20 per order
+        STT          on sells only, 0.025% (equity) or 0.01% (futures),
+                     rounded up to the rupee, from a turnover of 10,000
+        transaction  0.00345% (equity) or 0.002% (futures)
+        GST          18% of brokerage + transaction charges
+        SEBI fee     turnover / 10^6, from a turnover of 10,000
+        stamp duty   on buys only, 0.003% (equity) from a turnover of
+                     1,00,000, or 0.002% (futures) above 10,000
+
+    The schedule is one row of `CHARGE_TABLE` per (instrument, side), and
+    `charges` prices any number of fills with a handful of array
+    operations.
+"""
+import numpy as np
+
+EQUITY = 0
+FUTURES = 1
+INSTRUMENTS = {'equity': EQUITY, 'futures': FUTURES}
+
+BUY = 0
+SELL = 1
+
+CHARGE_TABLE = np.array([
+    # brokerage       STT                  transaction  GST    SEBI            stamp duty
+    # rate    cap     rate     min  round  rate         rate   rate  min       rate     min       incl
+    (0.0003, 20.0, 0.0,     0.0,     1, 0.0000345, 0.18, 1e-06, 10000.0, 0.00003, 100000.0, True),   # equity buy
+    (0.0003, 20.0, 0.00025, 10000.0, 1, 0.0000345, 0.18, 1e-06, 10000.0, 0.0,     0.0,      True),   # equity sell
+    (0.0003, 20.0, 0.0,     0.0,     1, 0.00002,   0.18, 1e-06, 10000.0, 0.00002, 10000.0,  False),  # futures buy
+    (0.0003, 20.0, 0.0001,  10000.0, 1, 0.00002,   0.18, 1e-06, 10000.0, 0.0,     0.0,      False),  # futures sell
+], dtype=[('brokerage_rate', float), ('brokerage_cap', float),
+          ('stt_rate', float), ('stt_min', float), ('stt_round', bool),
+          ('transaction_rate', float), ('gst_rate', float),
+          ('sebi_rate', float), ('sebi_min', float),
+          ('stamp_rate', float), ('stamp_min', float), ('stamp_inclusive', bool)])
+
+CHARGES_DTYPE = np.dtype([('brokerage', float), ('stt', float), ('transaction', float),
+                          ('gst', float), ('sebi', float), ('stamp', float),
+                          ('total', float)])
+
+
+def instrument_code(instrument):
+    """
+        EQUITY or FUTURES from a code or a name, element-wise for arrays.
+    """
+    if isinstance(instrument, str):
+        return INSTRUMENTS[instrument.lower()]
+    instrument = np.asarray(instrument)
+    if instrument.dtype.kind in 'US':
+        return np.vectorize(lambda name: INSTRUMENTS[name.lower()], otypes=[int])(instrument)
+    return instrument.astype(int)
+
+
+def charges(price, quantity, instrument=EQUITY):
+    """
+        Every charge of the fills (`price`, signed `quantity`, negative for
+        sells) as a `CHARGES_DTYPE` array. Arguments broadcast, so one
+        instrument can price a whole blotter.
+    """
+    price, quantity, code = np.broadcast_arrays(np.asarray(price, dtype=float),
+                                                np.asarray(quantity, dtype=float),
+                                                instrument_code(instrument))
+    turnover = price * np.abs(quantity)
+    rows = 2 * code + (quantity < 0)
+
+    def column(name):
+        return CHARGE_TABLE[name][rows]
+
+    out = np.empty(turnover.shape, dtype=CHARGES_DTYPE)
+    brokerage = np.minimum(column('brokerage_cap'), column('brokerage_rate') * turnover)
+    stt = column('stt_rate') * turnover
+    stt = np.where(column('stt_round'), np.ceil(stt), stt)
+    stt = np.where(turnover >= column('stt_min'), stt, 0.0)
+    transaction = column('transaction_rate') * turnover
+    gst = column('gst_rate') * (brokerage + transaction)
+    sebi = np.where(turnover >= column('sebi_min'), column('sebi_rate') * turnover, 0.0)
+    stamp_min = column('stamp_min')
+    stamp = np.where(column('stamp_inclusive'), turnover >= stamp_min, turnover > stamp_min)
+    stamp = np.where(stamp, column('stamp_rate') * turnover, 0.0)
+    out['brokerage'] = brokerage
+    out['stt'] = stt
+    out['transaction'] = transaction
+    out['gst'] = gst
+    out['sebi'] = sebi
+    out['stamp'] = stamp
+    out['total'] = brokerage + stt + transaction + gst + sebi + stamp
+    return out
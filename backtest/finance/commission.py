@@ -0,0 +1,69 @@
+"""
+    Commission models. `calculate(price, quantity)` returns the cost of a
+    fill in currency; `quantity` is signed (negative for sells). Models
+    with a `calculate_many(prices, quantities)` get all the fills of a
+    step of the backtest in one call.
+"""
+from backtest.finance.charges import EQUITY, charges
+
+
+class NoCommission(object):
+    """
+        Free trading.
+    """
+
+    def calculate(self, price, quantity):
+        return 0.0
+
+
+class PerShare(object):
+    """
+        `cost` per share traded, at least `min_trade_cost` per fill.
+    """
+
+    def __init__(self, cost=0.0, min_trade_cost=0.0):
+        self.cost = cost
+        self.min_trade_cost = min_trade_cost
+
+    def calculate(self, price, quantity):
+        return max(abs(quantity) * self.cost, self.min_trade_cost)
+
+
+class PerDollar(object):
+    """
+        `cost` as a fraction of the traded value.
+    """
+
+    def __init__(self, cost=0.0):
+        self.cost = cost
+
+    def calculate(self, price, quantity):
+        return abs(quantity) * price * self.cost
+
+
+class PerTrade(object):
+    """
+        A flat `cost` per fill.
+    """
+
+    def __init__(self, cost=0.0):
+        self.cost = cost
+
+    def calculate(self, price, quantity):
+        return self.cost
+
+
+class IndianCharges(object):
+    """
+        Brokerage and statutory charges on NSE fills of `instrument`
+        ('equity' or 'futures'), see `backtest.finance.charges`.
+    """
+
+    def __init__(self, instrument=EQUITY):
+        self.instrument = instrument
+
+    def calculate(self, price, quantity):
+        return float(charges(price, quantity, self.instrument)['total'])
+
+    def calculate_many(self, prices, quantities):
+        return charges(prices, quantities, self.instrument)['total']
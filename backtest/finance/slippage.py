@@ -0,0 +1,41 @@
+"""
+    Slippage models. `fill_price(price, quantity)` returns the price a
+    market order for signed `quantity` is filled at when the bar trades at
+    `price`.
+"""
+
+
+class NoSlippage(object):
+    """
+        Fill at the bar price.
+    """
+
+    def fill_price(self, price, quantity):
+        return price
+
+
+class FixedSlippage(object):
+    """
+        Pay half of a fixed bid/ask `spread` on every fill.
+    """
+
+    def __init__(self, spread=0.0):
+        self.spread = spread
+
+    def fill_price(self, price, quantity):
+        if quantity > 0:
+            return price + self.spread / 2.0
+        return price - self.spread / 2.0
+
+
+class FixedBasisPointsSlippage(object):
+    """
+        Move the fill price against the order by `basis_points`.
+    """
+
+    def __init__(self, basis_points=0.0):
+        self.basis_points = basis_points
+
+    def fill_price(self, price, quantity):
+        move = price * self.basis_points / 10000.0
+        return price + move if quantity > 0 else price - move
@@ -0,0 +1,242 @@
+"""
+    Run backtests in a pool of processes.
+
+    `run_jobs` runs independent backtests (other strategy files, date ranges
+    or shards of a universe) side by side, each in its own process with its
+    own context, and returns exactly what running them one after the other
+    would. `run_sharded` splits one strategy across the pool and merges the
+    shards into one result:
+
+    - by securities, each shard runs the strategy on its share of
+      `context.securities` (whose `len` stays that of the whole list, so
+      equal weights come out the same). Shards only compute signals: they
+      record their order calls with the event they were made in instead of
+      filling them. The merge replays the calls of all the shards, in the
+      order one run would have made them, against a single book, so
+      percent orders are sized by the whole portfolio and the blotter and
+      equity are those of one run over all the names. A shard reading the
+      portfolio or its open orders raises `ShardingError`. Signals have to
+      be computed per security: a strategy ranking its securities against
+      each other (Short_term_reversal.py) would only rank its shard.
+    - by dates, each shard records the calls of a contiguous block of
+      sessions, after running the `warmup` sessions before it to build up
+      the histories and indicators of the strategy (their orders are
+      dropped). The replay of all the blocks carries the positions from
+      one block into the next. The result is that of one run as long as
+      the state of the strategy at the start of a block only depends on
+      the bars of the `warmup` sessions before it: one session for the
+      minute strategies here, as many as the daily lookback for those on
+      daily bars (combined_5.py).
+
+    Workers open the data once per process; pass the path of a bar store
+    (see `backtest.store`) so that they share the memory map.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from backtest import api
+from backtest.engine import BacktestResult, TradingAlgorithm, load_data, load_strategy
+from technicals import features
+
+SECURITIES = 'securities'
+DATES = 'dates'
+
+_bars = None
+
+
+class Job(object):
+    """
+        One backtest: the strategy file, the capital, the first and last
+        session and the symbols of its shard (None for all of them).
+
+        `params` overrides entries of `context.params`, `constants` sets
+        module level names of the strategy (e.g. NUM_BEFORE), `scope`
+        names the feature parameters for `technicals.features` and
+        `commission` replaces the strategy's commission model. A
+        `recording` job keeps its order calls for `replay_shards` instead
+        of filling them, after `warmup` sessions before `start`.
+    """
+    __slots__ = ('strategy', 'capital', 'start', 'end', 'universe', 'params',
+                 'constants', 'scope', 'commission', 'recording', 'warmup')
+
+    def __init__(self, strategy, capital=1000000.0, start=None, end=None, universe=None,
+                 params=None, constants=None, scope=None, commission=None,
+                 recording=False, warmup=0):
+        self.strategy = strategy
+        self.capital = capital
+        self.start = start
+        self.end = end
+        self.universe = universe
+        self.params = params
+        self.constants = constants
+        self.scope = scope
+        self.commission = commission
+        self.recording = recording
+        self.warmup = warmup
+
+    def __repr__(self):
+        return 'Job({}, capital={}, start={}, end={}, universe={})'.format(
+            self.strategy, self.capital, self.start, self.end,
+            None if self.universe is None else len(self.universe))
+
+
+def _strategy_path(strategy):
+    if isinstance(strategy, str):
+        return strategy
+    return strategy.__file__
+
+
+def _init_worker(data):
+    global _bars
+    _bars = load_data(data)
+
+
+def _run_job(job):
+    """
+        Run `job` on the data of this process. Only the fills, equity and
+        recorded values come back, the context stays in the worker.
+    """
+    module = load_strategy(job.strategy)
+    for name, value in (job.constants or {}).items():
+        setattr(module, name, value)
+    features.set_scope(job.scope)
+    algorithm = TradingAlgorithm(module, _bars, job.capital, job.start, job.end,
+                                 job.universe, job.params, job.commission, job.recording,
+                                 job.warmup)
+    result = algorithm.run()
+    return BacktestResult(None, result.fills, result.equity_values,
+                          result.recorded_values, result.calls)
+
+
+def run_jobs(jobs, data, processes=None):
+    """
+        Run `jobs` on `data` in `processes` worker processes (all cores by
+        default; 1 runs them here, one after the other). Results come back
+        in the order of `jobs`.
+    """
+    jobs = list(jobs)
+    return map_tasks(_run_job, jobs, data, processes)
+
+
+def map_tasks(func, tasks, data, processes=None):
+    """
+        `[func(task) for task in tasks]` in a pool of processes that each
+        loaded `data`, or here when one process is enough.
+    """
+    processes = processes or os.cpu_count() or 1
+    processes = min(processes, len(tasks))
+    if processes <= 1:
+        _init_worker(data)
+        return [func(task) for task in tasks]
+    # fork shares bars already loaded in memory instead of pickling them
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    with ProcessPoolExecutor(processes, mp_context=context,
+                             initializer=_init_worker, initargs=(data,)) as pool:
+        return list(pool.map(func, tasks))
+
+
+def initialized_context(strategy, data):
+    """
+        The context of `strategy` right after its `initialize`.
+    """
+    module = load_strategy(_strategy_path(strategy))
+    algorithm = TradingAlgorithm(module, load_data(data))
+    api.set_algorithm(algorithm)
+    try:
+        module.initialize(algorithm.context)
+    finally:
+        api.set_algorithm(None)
+    return algorithm.context
+
+
+def strategy_securities(strategy, data):
+    """
+        Symbols the strategy puts in `context.securities` in `initialize`.
+    """
+    context = initialized_context(strategy, data)
+    return [a.symbol for a in getattr(context, 'securities', [])]
+
+
+def shard_securities(strategy, data, shards, capital=1000000.0, start=None, end=None):
+    """
+        Recording jobs running `strategy` on `shards` interleaved slices of
+        its securities.
+    """
+    symbols = strategy_securities(strategy, data)
+    if not symbols:
+        raise ValueError('{} sets no context.securities to shard'.format(strategy))
+    strategy = _strategy_path(strategy)
+    shards = max(min(shards, len(symbols)), 1)
+    return [Job(strategy, capital, start, end, symbols[k::shards], recording=True)
+            for k in range(shards)]
+
+
+def shard_dates(strategy, data, shards, capital=1000000.0, start=None, end=None,
+                warmup=1):
+    """
+        Recording jobs running `strategy` over `shards` contiguous blocks of
+        the sessions between `start` and `end`, each warmed up on (at most)
+        the `warmup` sessions before it.
+    """
+    bars = load_data(data)
+    sessions = TradingAlgorithm(None, bars, start=start, end=end)._sessions()
+    strategy = _strategy_path(strategy)
+    jobs = []
+    for block in np.array_split(sessions, max(min(shards, len(sessions)), 1)):
+        if len(block):
+            # no block warms up on sessions one run would not have seen
+            jobs.append(Job(strategy, capital, str(bars.session_dates[block[0]]),
+                            str(bars.session_dates[block[-1]]), recording=True,
+                            warmup=min(warmup, int(block[0] - sessions[0]))))
+    return jobs
+
+
+def replay_shards(strategy, data, results, capital=1000000.0, start=None, end=None,
+                  commission=None):
+    """
+        The fills and equity of one run of `strategy` making the order calls
+        recorded by all the shards in `results`.
+    """
+    calls = [call for result in results for call in result.calls]
+    module = load_strategy(_strategy_path(strategy))
+    return TradingAlgorithm(module, load_data(data), capital, start, end,
+                            commission=commission).replay(calls)
+
+
+def merge_results(results, replayed):
+    """
+        One `BacktestResult` out of the results of the shards of a run,
+        with the fills and equity of `replayed`, the replay of their
+        orders. Recorded values keep a `shard` column.
+    """
+    recorded = []
+    for k, result in enumerate(results):
+        recorded.extend(dict(row, shard=k) for row in result.recorded_values)
+    recorded.sort(key=lambda row: row['date'])
+    return BacktestResult(None, replayed.fills, replayed.equity_values, recorded)
+
+
+def run_sharded(strategy, data, shards=None, by=SECURITIES, capital=1000000.0,
+                start=None, end=None, processes=None, commission=None, warmup=1):
+    """
+        Split `strategy` into `shards` (one per process by default) by
+        securities or by dates (each block warmed up on `warmup`
+        sessions), run them in parallel and merge the results.
+    """
+    processes = processes or os.cpu_count() or 1
+    shards = shards or processes
+    if by == SECURITIES:
+        jobs = shard_securities(strategy, data, shards, capital, start, end)
+    elif by == DATES:
+        jobs = shard_dates(strategy, data, shards, capital, start, end, warmup)
+    else:
+        raise ValueError('unknown shard mode {!r}'.format(by))
+    for job in jobs:
+        job.commission = commission
+    results = run_jobs(jobs, data, processes)
+    replayed = replay_shards(strategy, data, results, capital, start, end, commission)
+    return merge_results(results, replayed)
@@ -0,0 +1,143 @@
+"""
+    Date and time rules for `schedule_function`.
+
+    A date rule picks trading sessions, a time rule picks minutes inside a
+    session. Times are counted in minutes from the session open and a rule
+    fires at the close of the bar ending at that time, so `market_open()`
+    fires after the first bar and `every_nth_minute(5)` after bars 5, 10, ...
+"""
+import numpy as np
+
+
+class DateRule(object):
+    """
+        Base class, selects every session.
+    """
+
+    def sessions(self, dates):
+        """
+            Boolean mask over `dates` (datetime64[D] session dates).
+        """
+        return np.ones(len(dates), dtype=bool)
+
+
+class _PeriodRule(DateRule):
+    def __init__(self, days_offset=0, from_end=False):
+        if days_offset < 0:
+            raise ValueError('days_offset must be >= 0')
+        self.days_offset = days_offset
+        self.from_end = from_end
+
+    def _period(self, dates):
+        raise NotImplementedError
+
+    def sessions(self, dates):
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        period = self._period(dates)
+        if len(dates) == 0:
+            return np.zeros(0, dtype=bool)
+        # position of each session within its period
+        starts = np.flatnonzero(np.r_[True, period[1:] != period[:-1]])
+        ends = np.r_[starts[1:], len(dates)]
+        lengths = ends - starts
+        first = np.repeat(starts, lengths)
+        pos = np.arange(len(dates)) - first
+        if self.from_end:
+            pos = np.repeat(lengths, lengths) - 1 - pos
+        return pos == self.days_offset
+
+
+class _MonthRule(_PeriodRule):
+    def _period(self, dates):
+        return dates.astype('datetime64[M]')
+
+
+class _WeekRule(_PeriodRule):
+    def _period(self, dates):
+        # 1970-01-01 was a Thursday, shift so that weeks start on Monday
+        return (dates.astype(np.int64) + 3) // 7
+
+
+class TimeRule(object):
+    """
+        Base class for time rules.
+    """
+
+    def minutes(self, session_length):
+        """
+            Sorted bar indices (0 = first bar) the rule fires on.
+        """
+        raise NotImplementedError
+
+
+class _Offset(TimeRule):
+    def __init__(self, hours=0, minutes=0, from_close=False):
+        self.offset = int(hours) * 60 + int(minutes)
+        self.from_close = from_close
+
+    def minutes(self, session_length):
+        if self.from_close:
+            bar = session_length - 1 - self.offset
+        else:
+            bar = max(self.offset - 1, 0)
+        if 0 <= bar < session_length:
+            return np.array([bar])
+        return np.empty(0, dtype=np.int64)
+
+
+class _Every(TimeRule):
+    def __init__(self, minutes):
+        if minutes < 1:
+            raise ValueError('interval must be at least one minute')
+        self.interval = int(minutes)
+
+    def minutes(self, session_length):
+        return np.arange(self.interval - 1, session_length, self.interval)
+
+
+class date_rules(object):
+    """
+        Factory of date rules, mirrors `blueshift.api.date_rules`.
+    """
+
+    @staticmethod
+    def every_day():
+        return DateRule()
+
+    @staticmethod
+    def month_start(days_offset=0):
+        return _MonthRule(days_offset)
+
+    @staticmethod
+    def month_end(days_offset=0):
+        return _MonthRule(days_offset, from_end=True)
+
+    @staticmethod
+    def week_start(days_offset=0):
+        return _WeekRule(days_offset)
+
+    @staticmethod
+    def week_end(days_offset=0):
+        return _WeekRule(days_offset, from_end=True)
+
+
+class time_rules(object):
+    """
+        Factory of time rules, mirrors `blueshift.api.time_rules`.
+    """
+
+    @staticmethod
+    def market_open(hours=0, minutes=0):
+        return _Offset(hours, minutes)
+
+    @staticmethod
+    def market_close(hours=0, minutes=0):
+        return _Offset(hours, minutes, from_close=True)
+
+    @staticmethod
+    def every_nth_minute(minutes=1):
+        return _Every(minutes)
+
+    @staticmethod
+    def every_nth_hour(hours=1):
+        return _Every(60 * hours)
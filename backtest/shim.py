@@ -0,0 +1,46 @@
+"""
+    Serve `blueshift.*` imports from this package, so strategy files written
+    for Blueshift import unchanged when run offline.
+"""
+import sys
+import types
+
+import backtest.api
+import backtest.finance
+import backtest.finance.commission
+import backtest.finance.slippage
+import technicals.indicators
+
+ALIASES = {
+    'blueshift.api': backtest.api,
+    'blueshift.finance': backtest.finance,
+    'blueshift.finance.commission': backtest.finance.commission,
+    'blueshift.finance.slippage': backtest.finance.slippage,
+    'blueshift.library.technicals.indicators': technicals.indicators,
+}
+
+
+def _package(name):
+    module = sys.modules.get(name)
+    if module is None or not getattr(module, '_backtest_shim', False):
+        module = types.ModuleType(name)
+        module.__path__ = []
+        module._backtest_shim = True
+        sys.modules[name] = module
+    return module
+
+
+def install():
+    """
+        Register the aliases in `sys.modules`, replacing any real Blueshift
+        modules that may have been imported before.
+    """
+    for name, module in ALIASES.items():
+        parts = name.split('.')
+        for i in range(1, len(parts)):
+            parent = '.'.join(parts[:i])
+            if parent not in ALIASES:
+                _package(parent)
+        sys.modules[name] = module
+        parent, _, child = name.rpartition('.')
+        setattr(sys.modules[parent], child, module)
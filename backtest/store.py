@@ -0,0 +1,77 @@
+"""
+    Memory-mapped columnar store of minute bars.
+
+    Layout of a store directory:
+
+        meta.json        symbols, fields and number of minutes
+        timestamps.npy   datetime64[ns] minute timeline
+        <field>.npy      float64 array (symbols x minutes), one per field
+
+    Each symbol's minutes are contiguous inside every field file, so a
+    history window of one symbol is a plain slice of the memory map: no
+    copy, and only the pages actually read are loaded.
+
+    Convert a directory of per-symbol CSV files once with
+
+        python -m backtest.store CSV_DIR STORE_DIR
+"""
+import json
+import os
+import sys
+
+import numpy as np
+
+from backtest.data import FIELDS, MinuteBars
+
+META = 'meta.json'
+TIMESTAMPS = 'timestamps.npy'
+
+
+def is_store(path):
+    return os.path.isfile(os.path.join(path, META))
+
+
+def write_store(path, bars):
+    """
+        Save a `MinuteBars` to `path` in the store layout.
+    """
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    np.save(os.path.join(path, TIMESTAMPS), bars.timestamps)
+    for field, values in bars.fields.items():
+        np.save(os.path.join(path, field + '.npy'),
+                np.ascontiguousarray(values, dtype=np.float64))
+    meta = {'symbols': bars.symbols,
+            'fields': sorted(bars.fields),
+            'minutes': len(bars.timestamps)}
+    with open(os.path.join(path, META), 'w') as fp:
+        json.dump(meta, fp)
+
+
+def open_store(path):
+    """
+        `MinuteBars` whose field arrays are read-only memory maps of the
+        files in `path`.
+    """
+    with open(os.path.join(path, META)) as fp:
+        meta = json.load(fp)
+    timestamps = np.load(os.path.join(path, TIMESTAMPS), mmap_mode='r')
+    fields = dict((f, np.load(os.path.join(path, f + '.npy'), mmap_mode='r'))
+                  for f in meta['fields'])
+    return MinuteBars(timestamps, meta['symbols'], fields)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print(__doc__)
+        return 1
+    bars = MinuteBars.from_directory(argv[0])
+    write_store(argv[1], bars)
+    print('{} symbols x {} minutes ({}) written to {}'.format(
+        len(bars.symbols), len(bars.timestamps), ', '.join(FIELDS), argv[1]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+    Parameter sweeps of a strategy file.
+
+    A combination is a dict of overrides: names defined at module level in
+    the strategy (NUM_BEFORE, DELTA, ...) are set on the module, anything
+    else replaces the entry of `context.params` with that name.
+
+    Combinations that only differ in how signals are traded (the
+    EXECUTION_PARAMS) compute the same signals, so they share a feature
+    scope: they run in the same worker process with `technicals.features`
+    sharing on, and only the first of them computes the signals the
+    strategy wraps in `shared(...)`. The cost of a sweep then follows the
+    number of distinct feature scopes rather than the number of
+    combinations.
+
+        python -m backtest.sweep combined_5.py --data STORE \\
+            --set buy_signal_threshold=0.25,0.5,0.75 --set leverage=1,2
+"""
+import argparse
+import ast
+import itertools
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from backtest.engine import load_strategy
+from backtest.parallel import Job, _run_job, initialized_context, map_tasks
+from technicals import features
+
+# parameters that change orders but not signals
+EXECUTION_PARAMS = ('buy_signal_threshold', 'sell_signal_threshold', 'leverage')
+
+
+def param_grid(grid):
+    """
+        Every combination of the values in `grid` (name -> list of values)
+        as a list of dicts.
+    """
+    names = list(grid)
+    return [dict(zip(names, values))
+            for values in itertools.product(*[grid[n] for n in names])]
+
+
+def feature_scope(combo, execution=EXECUTION_PARAMS):
+    """
+        The part of `combo` that can change the signals, as a hashable key.
+    """
+    return tuple(sorted((name, repr(value)) for name, value in combo.items()
+                        if name not in execution))
+
+
+def sweep_jobs(strategy, data, combos, capital=1000000.0, start=None, end=None,
+               execution=EXECUTION_PARAMS):
+    """
+        One `Job` per combination. Raises ValueError for names that are
+        neither module level names of the strategy nor keys of its
+        `context.params`.
+    """
+    module = load_strategy(strategy)
+    params = getattr(initialized_context(strategy, data), 'params', {})
+    jobs = []
+    for combo in combos:
+        constants = dict((n, v) for n, v in combo.items() if hasattr(module, n))
+        overrides = dict((n, v) for n, v in combo.items() if n not in constants)
+        unknown = [n for n in overrides if n not in params]
+        if unknown:
+            raise ValueError('{} has no parameter {}'.format(strategy, ', '.join(unknown)))
+        jobs.append(Job(strategy, capital, start, end, params=overrides,
+                        constants=constants, scope=feature_scope(combo, execution)))
+    return jobs
+
+
+def _run_group(jobs):
+    """
+        Run jobs of one feature scope one after the other, sharing features
+        in a cache of their own.
+    """
+    features.share()
+    try:
+        return [_run_job(job) for job in jobs]
+    finally:
+        features.unshare()
+
+
+def run_sweep(strategy, data, combos, capital=1000000.0, start=None, end=None,
+              processes=None, execution=EXECUTION_PARAMS):
+    """
+        Backtest `strategy` once per combination and return the results in
+        the order of `combos`.
+
+        Combinations are grouped by feature scope; a group is split over
+        several workers only when there are fewer groups than processes.
+    """
+    combos = list(combos)
+    jobs = sweep_jobs(strategy, data, combos, capital, start, end, execution)
+    groups = {}
+    for i, job in enumerate(jobs):
+        groups.setdefault(job.scope, []).append(i)
+
+    processes = processes or os.cpu_count() or 1
+    parts = max(1, -(-processes // max(len(groups), 1)))
+    tasks = []
+    for members in groups.values():
+        for chunk in np.array_split(members, min(parts, len(members))):
+            tasks.append([int(i) for i in chunk])
+
+    results = [None] * len(jobs)
+    done = map_tasks(_run_group, [[jobs[i] for i in task] for task in tasks], data,
+                     processes)
+    for task, task_results in zip(tasks, done):
+        for i, result in zip(task, task_results):
+            results[i] = result
+    return results
+
+
+def sweep_summary(combos, results, capital=1000000.0):
+    """
+        One row per combination: its values, the final portfolio value,
+        the total return and the number of fills.
+    """
+    rows = []
+    for combo, result in zip(combos, results):
+        final = result.equity_values[-1][1] if result.equity_values else capital
+        row = dict(combo)
+        row.update(final_value=final, total_return=final / capital - 1,
+                   fills=len(result.fills))
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def _parse_values(text):
+    values = []
+    for item in text.split(','):
+        try:
+            values.append(ast.literal_eval(item))
+        except (ValueError, SyntaxError):
+            values.append(item)
+    return values
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m backtest.sweep',
+                                     description='Backtest a grid of parameters.')
+    parser.add_argument('strategy', help='path of the strategy file')
+    parser.add_argument('--data', required=True, help='bar store or CSV directory')
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=V1,V2',
+                        help='values of one parameter or module constant')
+    parser.add_argument('--capital', type=float, default=1000000.0)
+    parser.add_argument('--start', default=None, help='first session, YYYY-MM-DD')
+    parser.add_argument('--end', default=None, help='last session, YYYY-MM-DD')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--out', default=None, help='write the summary to this CSV file')
+    args = parser.parse_args(argv)
+
+    grid = {}
+    for item in args.set:
+        name, _, values = item.partition('=')
+        grid[name.strip()] = _parse_values(values)
+    combos = param_grid(grid)
+
+    started = time.time()
+    results = run_sweep(args.strategy, args.data, combos, args.capital, args.start,
+                        args.end, args.processes)
+    summary = sweep_summary(combos, results, args.capital)
+    print(summary.sort_values('total_return', ascending=False).to_string(index=False))
+    print('{} combinations in {:.1f}s'.format(len(combos), time.time() - started))
+    if args.out:
+        summary.to_csv(args.out, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+    Benchmarks of the detectors and signal functions.
+
+    Every case in `benchmarks.cases` runs on the same deterministic
+    synthetic OHLC (`synthetic_ohlc`) at each number of bars and universe
+    width asked for. `measure` records:
+
+        seconds          median wall time of a call, after one warm-up call
+        best             fastest call
+        peak_bytes       peak of the memory traced by `tracemalloc` during a
+                         call (NumPy buffers included), above what was
+                         allocated before it
+        retained_blocks  memory blocks still allocated when the call has
+                         returned (its results and anything it caches)
+
+    Results are flat dicts keyed by `result_key`, stored as JSON so that a
+    later run can be compared with them (`compare`).
+
+        python -m benchmarks --save-baseline
+        ... change something ...
+        python -m benchmarks
+"""
+import gc
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+SIZES = (375, 10000, 1000000)
+WIDTHS = (1, 10)
+# combinations of bars x width above this are skipped
+MAX_CELLS = 2000000
+
+# a change counts as a regression when it is worse than the baseline by
+# more than the tolerance and by more than the noise floor
+TIME_TOLERANCE = 0.25
+TIME_FLOOR = 2e-5
+MEMORY_TOLERANCE = 0.1
+MEMORY_FLOOR = 65536
+
+
+def synthetic_ohlc(bars, width=1, seed=0):
+    """
+        (width x bars x 4) open, high, low, close array of minute bars: a
+        geometric random walk per security, the same for the same
+        arguments on every machine.
+    """
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0, 1e-3, size=(width, bars))
+    close = 100.0 * np.exp(np.cumsum(returns, axis=1))
+    open = np.empty_like(close)
+    open[:, 0] = 100.0
+    open[:, 1:] = close[:, :-1] * np.exp(rng.normal(0.0, 2e-4, size=(width, bars - 1)))
+    spread = np.abs(rng.normal(0.0, 5e-4, size=(2, width, bars)))
+    high = np.maximum(open, close) * (1.0 + spread[0])
+    low = np.minimum(open, close) * (1.0 - spread[1])
+    return np.stack([open, high, low, close], axis=-1)
+
+
+def measure(func, min_time=0.2, max_repeat=100):
+    """
+        Time and memory of calls of `func()`, see the module docstring.
+    """
+    func()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        start_bytes = tracemalloc.get_traced_memory()[0]
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1] - start_bytes
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    # leave out the snapshots themselves
+    own = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    retained = sum(stat.count_diff for stat in after.filter_traces(own).compare_to(
+        before.filter_traces(own), 'filename'))
+    del result
+
+    times = []
+    total = 0.0
+    while len(times) < max_repeat and (not times or total < min_time):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+        total += times[-1]
+    return {'seconds': float(np.median(times)), 'best': min(times), 'repeat': len(times),
+            'peak_bytes': int(peak), 'retained_blocks': int(retained)}
+
+
+def result_key(case, bars, width):
+    return '{}[{}x{}]'.format(case, bars, width)
+
+
+def run(cases, sizes=SIZES, widths=WIDTHS, max_cells=MAX_CELLS, min_time=0.2,
+        report=None, only=None):
+    """
+        Measure every case of `cases` (name -> setup function) at every
+        (bars, width) with at most `max_cells` bars in total, or only the
+        result keys in `only`. Returns {result_key: measurement};
+        `report(key, measurement)` is called as results come in.
+    """
+    results = {}
+    for bars in sizes:
+        for width in widths:
+            if bars * width > max_cells:
+                continue
+            names = [name for name in cases
+                     if only is None or result_key(name, bars, width) in only]
+            if not names:
+                continue
+            prices = synthetic_ohlc(bars, width)
+            for name in names:
+                setup = cases[name]
+                func = setup(prices)
+                measurement = measure(func, min_time)
+                measurement.update(case=name, bars=bars, width=width)
+                key = result_key(name, bars, width)
+                results[key] = measurement
+                if report is not None:
+                    report(key, measurement)
+                del func
+    return results
+
+
+def keep_best(results, again):
+    """
+        Update `results` with the better time and memory of a second run.
+    """
+    for key, measurement in again.items():
+        kept = results[key]
+        if measurement['best'] < kept['best']:
+            kept['seconds'] = measurement['seconds']
+            kept['best'] = measurement['best']
+        kept['peak_bytes'] = min(kept['peak_bytes'], measurement['peak_bytes'])
+    return results
+
+
+def compare(results, baseline, time_tolerance=TIME_TOLERANCE,
+            memory_tolerance=MEMORY_TOLERANCE):
+    """
+        {key: [reasons]} of the results that regressed against `baseline`
+        (a dict of earlier results). Keys missing from the baseline are
+        not compared.
+    """
+    regressions = {}
+    for key, now in results.items():
+        then = baseline.get(key)
+        if then is None:
+            continue
+        reasons = []
+        # the fastest call is the least disturbed by the rest of the machine
+        if (now['best'] > then['best'] * (1.0 + time_tolerance)
+                and now['best'] - then['best'] > TIME_FLOOR):
+            reasons.append('time {:.3g}s -> {:.3g}s'.format(then['best'], now['best']))
+        if (now['peak_bytes'] > then['peak_bytes'] * (1.0 + memory_tolerance)
+                and now['peak_bytes'] - then['peak_bytes'] > MEMORY_FLOOR):
+            reasons.append('peak memory {} -> {} bytes'.format(then['peak_bytes'],
+                                                               now['peak_bytes']))
+        if reasons:
+            regressions[key] = reasons
+    return regressions
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_results(path, results):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=1, sort_keys=True)
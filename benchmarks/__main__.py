@@ -0,0 +1,92 @@
+"""
+    Run the benchmarks and compare them with a baseline.
+"""
+import argparse
+import os
+import sys
+
+import benchmarks
+from benchmarks.cases import CASES
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def _ints(text):
+    return tuple(int(float(v)) for v in text.split(','))
+
+
+def _report(key, measurement):
+    print('{:<42} {:>12.6f}s {:>12.6f}s {:>14,d} {:>10,d}'.format(
+        key, measurement['seconds'], measurement['best'], measurement['peak_bytes'],
+        measurement['retained_blocks']))
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Benchmark the detectors and signals.')
+    parser.add_argument('--cases', default=None,
+                        help='comma separated cases (default: all of {})'.format(
+                            ', '.join(CASES)))
+    parser.add_argument('--sizes', type=_ints, default=benchmarks.SIZES,
+                        help='numbers of bars, e.g. 375,1e4,1e6')
+    parser.add_argument('--widths', type=_ints, default=benchmarks.WIDTHS,
+                        help='numbers of securities')
+    parser.add_argument('--max-cells', type=int, default=benchmarks.MAX_CELLS,
+                        help='skip sizes with more bars x securities than this')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='repeat each call for at least this many seconds')
+    parser.add_argument('--baseline', default=BASELINE, help='baseline JSON file')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--out', default=None, help='also write the results to this file')
+    parser.add_argument('--tolerance', type=float, default=benchmarks.TIME_TOLERANCE,
+                        help='allowed relative slowdown')
+    args = parser.parse_args(argv)
+
+    cases = CASES
+    if args.cases:
+        names = [name.strip() for name in args.cases.split(',')]
+        unknown = [name for name in names if name not in CASES]
+        if unknown:
+            parser.error('unknown cases: {}'.format(', '.join(unknown)))
+        cases = dict((name, CASES[name]) for name in names)
+
+    print('{:<42} {:>13} {:>13} {:>14} {:>10}'.format('case[bars x width]', 'median',
+                                                      'best', 'peak bytes', 'blocks'))
+    results = benchmarks.run(cases, args.sizes, args.widths, args.max_cells, args.min_time,
+                             report=_report)
+    if args.save_baseline:
+        if args.out:
+            benchmarks.save_results(args.out, results)
+        baseline = (benchmarks.load_results(args.baseline)
+                    if os.path.exists(args.baseline) else {})
+        baseline.update(results)
+        benchmarks.save_results(args.baseline, baseline)
+        print('baseline written to {}'.format(args.baseline))
+        return 0
+    regressions = {}
+    if os.path.exists(args.baseline):
+        baseline = benchmarks.load_results(args.baseline)
+        regressions = benchmarks.compare(results, baseline, args.tolerance)
+    else:
+        print('no baseline at {}, run with --save-baseline first'.format(args.baseline))
+    if regressions:
+        # measure the suspects once more before blaming the change
+        print('measuring {} regressed cases again'.format(len(regressions)))
+        again = benchmarks.run(cases, args.sizes, args.widths, args.max_cells, args.min_time,
+                               report=_report, only=set(regressions))
+        benchmarks.keep_best(results, again)
+        regressions = benchmarks.compare(results, baseline, args.tolerance)
+    if args.out:
+        benchmarks.save_results(args.out, results)
+    for key, reasons in sorted(regressions.items()):
+        print('REGRESSION {}: {}'.format(key, '; '.join(reasons)))
+    if regressions or not os.path.exists(args.baseline):
+        return 1 if regressions else 0
+    print('no regressions against {}'.format(args.baseline))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+    The benchmarked functions.
+
+    Each case is a setup function taking the (width x bars x 4) OHLC array
+    of `synthetic_ohlc` and returning the call to time. Anything that is
+    not part of the hot path (pivots fed to the level clustering, the
+    window handed to a signal function) is prepared in the setup.
+
+    Per-security functions are called once per security, like the
+    strategies' `generate_signals` loops; universe functions take the
+    whole array at once.
+"""
+import os
+
+import numpy as np
+
+from technicals.cup_handle import CupHandleDetector
+from technicals.double_bottom import double_bottom_signal, double_bottom_signals
+from technicals.indicators import adx_series, bbands_series, rsi_series
+from technicals.levels import cluster_levels
+from technicals.pivots import PIVOT_DTYPE, PIVOT_LOW, PIVOT_HIGH, pivot_ids
+from technicals.signals import (cup_handle_signals, marubozu_signals, reversal_scores,
+                                top_k)
+from technicals.smoothing import causal_savgol
+from technicals.triangles import fit_line, pivot_arrays, scan_triangles
+
+OPEN, HIGH, LOW, CLOSE = range(4)
+NUM_BEFORE = NUM_AFTER = 3
+# window of the live strategies (one session of minute bars)
+WINDOW = 375
+TRIANGLE_WINDOWS = (50, 100, 375)
+
+
+def _per_security(prices, func, *fields):
+    series = [[prices[k, :, f] for f in fields] for k in range(len(prices))]
+
+    def call():
+        return [func(*args) for args in series]
+    return call
+
+
+def pivots(prices):
+    """
+        `pivotId` of every candle.
+    """
+    return _per_security(prices, lambda high, low: pivot_ids(high, low, NUM_BEFORE, NUM_AFTER),
+                         HIGH, LOW)
+
+
+def levels(prices):
+    """
+        `assign_strength_remove_noise` on every pivot of the series.
+    """
+    pivot_sets = []
+    for k in range(len(prices)):
+        high, low = prices[k, :, HIGH], prices[k, :, LOW]
+        ids = pivot_ids(high, low, NUM_BEFORE, NUM_AFTER)
+        index = np.flatnonzero((ids == PIVOT_LOW) | (ids == PIVOT_HIGH))
+        found = np.empty(len(index), dtype=PIVOT_DTYPE)
+        found['index'] = index
+        found['price'] = np.where(ids[index] == PIVOT_HIGH, high[index], low[index])
+        # the notebooks' threshold: 1% of the average price
+        pivot_sets.append((found, 0.01 * float(prices[k, :, CLOSE].mean())))
+
+    def call():
+        return [cluster_levels(found, s) for found, s in pivot_sets]
+    return call
+
+
+def cup_handle_stream(prices):
+    """
+        The cup-and-handle `signal_function` fed every bar of the series.
+    """
+    stamps = np.arange(prices.shape[1])
+
+    def call():
+        out = []
+        for k in range(len(prices)):
+            detector = CupHandleDetector(WINDOW)
+            out.append(detector.update(stamps, prices[k, :, CLOSE]))
+        return out
+    return call
+
+
+def cup_handle_universe(prices):
+    """
+        The cup-and-handle rule of the whole universe on the window.
+    """
+    return lambda: cup_handle_signals(prices)
+
+
+def marubozu_universe(prices):
+    return lambda: marubozu_signals(prices)
+
+
+def reversal_basket(prices):
+    """
+        `Short_term_reversal.rebalance`: scores and the basket of the 10
+        biggest falls.
+    """
+    return lambda: top_k(reversal_scores(prices, ('open', 'high', 'low', 'close')), 10)
+
+
+def double_bottom_window(prices):
+    """
+        `double_bottom_raj.signal_function` with PAIR_ENTRY on the whole
+        series as window.
+    """
+    return _per_security(prices, double_bottom_signal, LOW)
+
+
+def double_bottom_history(prices):
+    """
+        The double-bottom signal of the last `WINDOW` lows at every bar.
+    """
+    return _per_security(prices, lambda low: double_bottom_signals(low, WINDOW), LOW)
+
+
+def triangle_rebalance(prices):
+    """
+        The per-security work of `Triangle.rebalance`: pivots, the three
+        feasible points of each line and the two fits.
+    """
+    feasible_points = _triangle_strategy().feasible_points
+
+    def lines(high, low):
+        highs, lows = pivot_arrays(high, low, NUM_BEFORE, NUM_AFTER)
+        try:
+            upper = feasible_points(highs, np.argmax)
+            lower = feasible_points(lows, np.argmin)
+        except ValueError:
+            return None
+        return fit_line(*upper), fit_line(*lower)
+    return _per_security(prices, lines, HIGH, LOW)
+
+
+def triangle_scan(prices):
+    """
+        Upper and lower trendlines of every bar and window length.
+    """
+    def scan(high, low):
+        highs, lows = pivot_arrays(high, low, NUM_BEFORE, NUM_AFTER)
+        return scan_triangles(highs, lows, TRIANGLE_WINDOWS)
+    return _per_security(prices, scan, HIGH, LOW)
+
+
+def indicators(prices):
+    """
+        RSI, Bollinger bands and ADX of the whole series.
+    """
+    def call(high, low, close):
+        return (rsi_series(close, 14), bbands_series(close, 20),
+                adx_series(high, low, close, 14))
+    return _per_security(prices, call, HIGH, LOW, CLOSE)
+
+
+def smoothing(prices):
+    """
+        The causal Savitzky-Golay smoothing of `combined_5.py`.
+    """
+    return _per_security(prices, lambda close: causal_savgol(close, 11, 3), CLOSE)
+
+
+_strategies = {}
+
+
+def _triangle_strategy():
+    if 'Triangle' not in _strategies:
+        from backtest.engine import load_strategy
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        _strategies['Triangle'] = load_strategy(os.path.join(root, 'Triangle.py'))
+    return _strategies['Triangle']
+
+
+CASES = {
+    'pivots': pivots,
+    'levels': levels,
+    'cup_handle_stream': cup_handle_stream,
+    'cup_handle_universe': cup_handle_universe,
+    'marubozu_universe': marubozu_universe,
+    'reversal_basket': reversal_basket,
+    'double_bottom_window': double_bottom_window,
+    'double_bottom_history': double_bottom_history,
+    'triangle_rebalance': triangle_rebalance,
+    'triangle_scan': triangle_scan,
+    'indicators': indicators,
+    'smoothing': smoothing,
+}
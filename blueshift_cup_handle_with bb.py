@@ -1,4 +1,3 @@
-from blueshift.library.technicals.indicators import bollinger_band, ema
 from blueshift.finance import commission, slippage
 from blueshift.api import(  symbol,
                             order_target_percent,
@@ -9,12 +8,18 @@ from blueshift.api import(  symbol,
                             time_rules,
                        )
 
+from technicals.history import HistoryCache
+from technicals.cup_handle import CupHandleDetector
+from technicals.indicators import BollingerBands
+from technicals.universe import universe_tickers
+from technicals import timing
+
 def initialize(context):
     """
         A function to define things to do at the start of the strategy
     """
     # universe selection
-    context.securities = [symbol('TATAPOWER'),symbol('NTPC'),symbol('POWERGRID'),symbol('GAIL'),symbol('IOC'),symbol('RELIANCE'),symbol('BPCL'),symbol('ONGC'),symbol('ADANIGREEN'),symbol('ADANITRANS')]
+    context.securities = [symbol(ticker) for ticker in universe_tickers('NIFTY ENERGY')]
 
     # define strategy parameters
     context.params = {'indicator_lookback':375,
@@ -31,6 +36,16 @@ def initialize(context):
     context.signals = dict((security,0) for security in context.securities)
     context.target_position = dict((security,0) for security in context.securities)
 
+    # last bars of every security, refreshed with only the new bars
+    context.history = HistoryCache(context.securities, ['open','high','low','close'],
+        context.params['indicator_lookback'], context.params['indicator_freq'])
+    # cup bottom, handle top and handle bottom kept up to date bar by bar
+    context.cups = dict((security, CupHandleDetector(context.params['indicator_lookback']))
+                        for security in context.securities)
+    # bands over the last BBands_period closes, updated with the new bars
+    context.bands = dict((security, BollingerBands(context.params['BBands_period']))
+                         for security in context.securities)
+
     # set trading cost and slippage to zero
     set_commission(commission.PerShare(cost=0.0, min_trade_cost=0.0))
     set_slippage(slippage.FixedSlippage(0.00))
@@ -49,7 +64,9 @@ def before_trading_start(context, data):
     
 def stop_trading(context, data):
     context.trade = False
+    timing.dump()
 
+@timing.timed('run_strategy')
 def run_strategy(context, data):
     """
         A function to define core strategy steps
@@ -61,13 +78,16 @@ def run_strategy(context, data):
     generate_target_position(context, data)
     rebalance(context, data)
 
+@timing.timed('rebalance')
 def rebalance(context,data):
     """
         A function to rebalance - all execution logic goes here
     """
     for security in context.securities:
-        order_target_percent(security, context.target_position[security])
+        with timing.stage('order', security):
+            order_target_percent(security, context.target_position[security])
 
+@timing.timed('generate_target_position')
 def generate_target_position(context, data):
     """
         A function to define target portfolio
@@ -84,21 +104,24 @@ def generate_target_position(context, data):
             context.target_position[security] = 0
 
 
+@timing.timed('generate_signals')
 def generate_signals(context, data):
     """
         A function to define define the signal generation
     """
     try:
-        price_data = data.history(context.securities, ['open','high','low','close'],
-            context.params['indicator_lookback'], context.params['indicator_freq'])
+        with timing.stage('data.history'):
+            price_data = context.history.update(data)
     except:
+        timing.failure('data.history')
         return
 
     for security in context.securities:
         px = price_data.xs(security)
-        context.signals[security] = signal_function(px, context.params)
+        with timing.stage('signal_function', security):
+            context.signals[security] = signal_function(context, px, context.params, security)
 
-def signal_function(px, params):
+def signal_function(context, px, params, security):
     """
         The main trading logic goes here, called by generate_signals above
     """
@@ -106,20 +129,10 @@ def signal_function(px, params):
     high = px.high.values
     low = px.low.values
     
-    cbb=close[-60]
-    cb = min(close)
-    cbindex = close.argmin()
-    close_1 = close[cbindex:]
-    
-    hs = max(close_1)
-    hs_index = close_1.argmax()
-
-    close_2 = close_1[hs_index:]
-    hb = min(close_2)
-
-    check_ratio = hs/cbb
+    # cup bottom, handle top and handle bottom only look at the new bars
+    cup = context.cups[security].update(px.index.values, close)
 
-    upper, mid, lower = bollinger_band(px, params['BBands_period'])
+    upper, mid, lower = context.bands[security].update(px.index.values, close)
     
     if upper - lower == 0:
         return 0
@@ -128,7 +141,7 @@ def signal_function(px, params):
     last_px = close[-1]
     dist_to_upper = 100*(upper - last_px)/(upper - lower)
 
-    if (check_ratio>0.9 and close[-1]>hb and (hs-cb)/(hs-hb) > 3):
+    if cup:
         return 1
     elif dist_to_upper > 95:
         return -1
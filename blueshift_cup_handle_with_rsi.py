@@ -1,4 +1,3 @@
-from blueshift.library.technicals.indicators import rsi, ema
 
 from blueshift.finance import commission, slippage
 from blueshift.api import(  symbol,
@@ -10,6 +9,11 @@ from blueshift.api import(  symbol,
                             time_rules,
                        )
 
+from technicals.history import HistoryCache
+from technicals.cup_handle import CupHandleDetector
+from technicals.indicators import RSI, EMA
+from technicals import timing
+
 def initialize(context):
     """
         A function to define things to do at the start of the strategy
@@ -32,6 +36,18 @@ def initialize(context):
     # variables to track signals and target portfolio
     context.signals = dict((security,0) for security in context.securities)
     context.target_position = dict((security,0) for security in context.securities)
+
+    # last bars of every security, refreshed with only the new bars
+    context.history = HistoryCache(context.securities, ['open','high','low','close'],
+        context.params['indicator_lookback'], context.params['indicator_freq'])
+    # cup bottom, handle top and handle bottom kept up to date bar by bar
+    context.cups = dict((security, CupHandleDetector(context.params['indicator_lookback']))
+                        for security in context.securities)
+    # Wilder RSI and the two EMAs, carried over from bar to bar
+    context.indicators = dict((security, (RSI(context.params['RSI_period']),
+                                          EMA(context.params['SMA_period_short']),
+                                          EMA(context.params['SMA_period_long'])))
+                              for security in context.securities)
     context.flag = dict((security,0) for security in context.securities)
 
     # set trading cost and slippage to zero
@@ -52,7 +68,9 @@ def before_trading_start(context, data):
     
 def stop_trading(context, data):
     context.trade = False
+    timing.dump()
 
+@timing.timed('run_strategy')
 def run_strategy(context, data):
     """
         A function to define core strategy steps
@@ -64,13 +82,16 @@ def run_strategy(context, data):
     generate_target_position(context, data)
     rebalance(context, data)
 
+@timing.timed('rebalance')
 def rebalance(context,data):
     """
         A function to rebalance - all execution logic goes here
     """
     for security in context.securities:
-        order_target_percent(security, context.target_position[security])
+        with timing.stage('order', security):
+            order_target_percent(security, context.target_position[security])
 
+@timing.timed('generate_target_position')
 def generate_target_position(context, data):
     """
         A function to define target portfolio
@@ -87,19 +108,22 @@ def generate_target_position(context, data):
             context.target_position[security] = 0
 
 
+@timing.timed('generate_signals')
 def generate_signals(context, data):
     """
         A function to define define the signal generation
     """
     try:
-        price_data = data.history(context.securities, ['open','high','low','close'],
-            context.params['indicator_lookback'], context.params['indicator_freq'])
+        with timing.stage('data.history'):
+            price_data = context.history.update(data)
     except:
+        timing.failure('data.history')
         return
 
     for security in context.securities:
         px = price_data.xs(security)
-        context.signals[security] = signal_function(context, px, context.params, security)
+        with timing.stage('signal_function', security):
+            context.signals[security] = signal_function(context, px, context.params, security)
 
 def signal_function(context, px, params, security):
     """
@@ -109,24 +133,15 @@ def signal_function(context, px, params, security):
     high = px.high.values
     low = px.low.values
     
-    ind1 = rsi(px, params['RSI_period'])
-    ind2 = ema(px, params['SMA_period_short'])
-    ind3 = ema(px, params['SMA_period_long'])
-
-    cbb=close[-60]
-    cb = min(close)
-    cbindex = close.argmin()
-    close_1 = close[cbindex:]
-    
-    hs = max(close_1)
-    hs_index = close_1.argmax()
-
-    close_2 = close_1[hs_index:]
-    hb = min(close_2)
+    rsi, ema_short, ema_long = context.indicators[security]
+    ind1 = rsi.update(px.index.values, close)
+    ind2 = ema_short.update(px.index.values, close)
+    ind3 = ema_long.update(px.index.values, close)
 
-    check_ratio = hs/cbb
+    # cup bottom, handle top and handle bottom only look at the new bars
+    cup = context.cups[security].update(px.index.values, close)
 
-    if ( check_ratio>0.9 and close[-1]>hb and context.flag[security]==0 and (hs-cb)/(hs-hb) > 3):
+    if cup and context.flag[security]==0:
         context.flag[security] = 1
         return 1
     elif ind1 > 60 and ind2-ind3 > 0 and context.flag[security]==1:
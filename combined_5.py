@@ -1,4 +1,3 @@
-from scipy.signal import savgol_filter
 from blueshift.finance import commission, slippage
 from blueshift.api import(  symbol,
                             order_target_percent,
@@ -8,10 +7,27 @@ from blueshift.api import(  symbol,
                             date_rules,
                             time_rules,
                        )
+try:
+    from blueshift.api import on_bar_close
+except ImportError:
+    # only the offline harness has bar close events, poll on Blueshift
+    on_bar_close = None
 import numpy as np
-import copy
 import pandas as pd
 
+from technicals.features import SignalMemo, shared
+from technicals.timeframes import BarAggregator
+from technicals.pivots import PivotTracker
+from technicals.smoothing import CausalSavgol
+from technicals.levels import LevelIndex
+from technicals.candles import candle_patterns, BULLISH_REVERSAL
+from technicals import timing
+
+NUM_BEFORE = 3
+NUM_AFTER = 3
+# bars kept clear of both ends of the window before a pivot is confirmed
+PIVOT_MARGIN = 6
+
 def initialize(context):
     """
         A function to define things to do at the start of the strategy
@@ -33,20 +49,41 @@ def initialize(context):
     # variables to track signals and target portfolio
     context.signals = dict((security,0) for security in context.securities)
     context.target_position = dict((security,0) for security in context.securities)
-    context.pivots = dict((security, []) for security in context.securities)
+
+    # bars of every security at the indicator frequency, built from the
+    # minutes that arrived since the previous call
+    context.history = BarAggregator(context.securities,
+        {context.params['indicator_freq']: context.params['indicator_lookback']},
+        ['high', 'low', 'open', 'close'])
+
+    # signals of the last daily bars, recomputed when a bar (the forming
+    # one included) changes rather than every run_strategy call
+    context.memo = SignalMemo()
+
+    context.pivots = dict((security, PivotTracker(NUM_BEFORE, NUM_AFTER,
+                                                  context.params['indicator_lookback'],
+                                                  margin=PIVOT_MARGIN))
+                          for security in context.securities)
+    # causal Savitzky-Golay smoothing of the closes, one new value per bar
+    context.smoothers = {}
     context.support_pivots = dict((security, []) for security in context.securities)
     context.resistance_pivots = dict((security, []) for security in context.securities)
     context.new_support = dict((security, []) for security in context.securities)
     context.new_resistance = dict((security, []) for security in context.securities)
-    context.new_pivots = dict((security, []) for security in context.securities)
+    # confirmed pivots of every security by price, clustered into levels
+    context.new_pivots = dict((security, LevelIndex()) for security in context.securities)
 
     # set trading cost and slippage to zero
     set_commission(commission.PerShare(cost=0.0, min_trade_cost=0.0))
     set_slippage(slippage.FixedSlippage(0.00))
     
     freq = int(context.params['trade_freq'])
-    schedule_function(run_strategy, date_rules.every_day(),
-                      time_rules.every_nth_minute(freq))
+    if on_bar_close is not None:
+        # run when a trade_freq bar closes, for the securities that traded in it
+        on_bar_close(run_strategy, context.securities, '{}m'.format(freq))
+    else:
+        schedule_function(run_strategy, date_rules.every_day(),
+                          time_rules.every_nth_minute(freq))
     
     schedule_function(stop_trading, date_rules.every_day(),
                       time_rules.market_close(minutes=30))
@@ -58,33 +95,40 @@ def before_trading_start(context, data):
     
 def stop_trading(context, data):
     context.trade = False
+    timing.dump()
 
-def run_strategy(context, data):
+@timing.timed('run_strategy')
+def run_strategy(context, data, securities=None):
     """
-        A function to define core strategy steps
+        A function to define core strategy steps, for `securities` (all
+        of them by default)
     """
     if not context.trade:
         return
-    
-    generate_signals(context, data)
-    generate_target_position(context, data)
-    rebalance(context, data)
+    securities = context.securities if securities is None else securities
+
+    generate_signals(context, data, securities)
+    generate_target_position(context, data, securities)
+    rebalance(context, data, securities)
 
-def rebalance(context,data):
+@timing.timed('rebalance')
+def rebalance(context, data, securities):
     """
         A function to rebalance - all execution logic goes here
     """
-    for security in context.securities:
-        order_target_percent(security, context.target_position[security])
+    for security in securities:
+        with timing.stage('order', security):
+            order_target_percent(security, context.target_position[security])
 
-def generate_target_position(context, data):
+@timing.timed('generate_target_position')
+def generate_target_position(context, data, securities):
     """
         A function to define target portfolio
     """
     num_secs = len(context.securities)
     weight = round(1.0/num_secs,2)*context.params['leverage']
 
-    for security in context.securities:
+    for security in securities:
         if context.signals[security] > context.params['buy_signal_threshold']:
             context.target_position[security] = weight
         elif context.signals[security] < context.params['sell_signal_threshold']:
@@ -92,175 +136,34 @@ def generate_target_position(context, data):
         else:
             context.target_position[security] = 0
 
-def pivotId(high, low, candle, num_before, num_after):
-
-    if candle-num_before < 0 or candle+num_after >= len(high):
-        return 0
-    
-    pivotIdLow=1
-    pivotIdHigh=1
-    for i in range(candle-num_before, candle+num_after):
-        if(low[candle]>low[i]):
-            pivotIdLow=0
-        if(high[candle]<high[i]):
-            pivotIdHigh=0
-    if pivotIdLow and pivotIdHigh:
-        return 3
-    elif pivotIdLow:
-        return 1
-    elif pivotIdHigh:
-        return 2
-    else:
-        return 0
-
-def assign_strength_remove_noise(high, low, lis, s):
-
-    updatedLis = []
-    newLis = copy.deepcopy(lis)
-    lisSorted = copy.deepcopy(lis)
-    lisSorted.sort(key=lambda a: a[1])
-
-    counter = 0
-    for i in lisSorted:
-        counter = counter + 1
-    len2 = counter
-
-    blacklisted = []
-    blacklisted.append(0)
-
-    for i in range(len2):
-        if not(lisSorted[i][0] in blacklisted):
-            for cnt in range(0, len2-i):
-                if(abs(lisSorted[i][1]-lisSorted[i+cnt][1]) > s):
-                    break
-
-            max = i
-            if cnt>1:
-                for j in range(1, cnt):
-                    if (lisSorted[i+j][0] >= lisSorted[max][0]):
-                        blacklisted.append(lisSorted[max][0])
-                        max = i+j
-            
-            updatedLis.append((lisSorted[max][0],lisSorted[max][1],cnt))
-    updatedLis.sort(key=lambda a: a[0])
-    return updatedLis
-
-def morning_star(high, low, open, close):
-
-    if (len(close)<3):
-        return 0
-
-    pres_close= close[-1]
-    pres_open= open[-1]
-    pres_high= high[-1]
-    pres_low= low[-1]
-
-    prev_close= close[-2]
-    prev_open= open[-2]
-    prev_high= high[-2]
-    prev_low= low[-2]
-
-    b_prev_close= close[-3]
-    b_prev_open= open[-3]
-    b_prev_high= high[-3]
-    b_prev_low= low[-3]
-    
-    diff_last = close[-1] - open[-1]
-    diff_second_last = close[-2] - open[-2] 
-
-    return (max(prev_open, prev_close) < b_prev_close < b_prev_open 
-    and pres_close > pres_open > max(prev_open, prev_close))
-
-def piercing_pattern(high, low, open, close):
-
-    if (len(close)<2):
-        return 0
-
-    pres_close= close[-1]
-    pres_open= open[-1]
-    pres_high= high[-1]
-    pres_low= low[-1]
-
-    prev_close= close[-2]
-    prev_open= open[-2]
-    prev_high= high[-2]
-    prev_low= low[-2]
-
-
-    if (prev_close < prev_open and pres_open < prev_low
-     and prev_open > pres_close > prev_close + ((prev_open - prev_close) / 2)) :
-        return 1
-
-    else:
-        return 0
-
-def bullish_engulfing(high, low, open, close):
-
-    if (len(close)<2):
-        return 0
-
-    pres_close= close[-1]
-    pres_open= open[-1]
-    pres_high= high[-1]
-    pres_low= low[-1]
-
-    prev_close= close[-2]
-    prev_open= open[-2]
-    prev_high= high[-2]
-    prev_low= low[-2]
-
-
-    if (pres_open >= prev_close > prev_open and pres_open > pres_close and prev_open >= pres_close 
-    and pres_open - pres_close > prev_close - prev_open) :
-        return 1
-    else:
-        return 0
-
-def bullish_harami(high, low, open, close):
-
-    if (len(close)<2):
-        return 0
-
-    pres_close= close[-1]
-    pres_open= open[-1]
-    pres_high= high[-1]
-    pres_low= low[-1]
-
-    prev_close= close[-2]
-    prev_open= open[-2]
-    prev_high= high[-2]
-    prev_low= low[-2]
-
-
-    if (prev_open > prev_close and prev_close <= pres_open < pres_close <= prev_open 
-    and pres_close - pres_open < prev_open - prev_close) :
-        return 1
-    else:
-        return 0
-
-def generate_signals(context, data):
+@timing.timed('generate_signals')
+def generate_signals(context, data, securities):
     """
         A function to define define the signal generation
     """
     try:
-        price_data = data.history(context.securities, ['high', 'low', 'open', 'close'],
-            context.params['indicator_lookback'],
-            context.params['indicator_freq'])
+        with timing.stage('data.history'):
+            price_data = context.history.update(data).window(
+                context.params['indicator_lookback'], context.params['indicator_freq'])
     except:
+        timing.failure('data.history')
         return
 
-    for security in context.securities:
-        px = price_data.xs(security)
-        context.signals[security] = signal_function(context, px, context.params, security)
+    for security in securities:
+        with timing.stage('signal_function', security):
+            # today's bar is still forming: its values are part of the key
+            last_bar = price_data.last_bar(security)
+            context.signals[security] = context.memo.get(
+                security, price_data.last_timestamp, last_bar, context.params,
+                lambda: shared(('combined_5', security, price_data.last_timestamp, last_bar),
+                               lambda: signal_function(context, price_data.xs(security),
+                                                       context.params, security)))
 
 
 def signal_function(context, px, params, security):
     """
         The main trading logic goes here, called by generate_signals above
     # """
-    NUM_BEFORE = 3
-    NUM_AFTER = 3
-
     # pivot = context.pivots[security]
     # support_pivots = context.support_pivots[security]
     # resistance_pivots = context.resistance_pivots[security]
@@ -275,20 +178,31 @@ def signal_function(context, px, params, security):
     if month_diff == 0:
         month_diff = 1
     smooth = int(2*month_diff + 3)
-    close = savgol_filter(close, smooth , 3)
-
-    for i in range(6, len(px) - 6):
-        if pivotId(close, close, i, NUM_BEFORE, NUM_AFTER) == 1:
-            context.pivots[security].append((i,close[i]))
-        elif pivotId(close,close, i, NUM_BEFORE, NUM_AFTER) == 2:
-            context.pivots[security].append((i,close[i]))
-
-    context.new_pivots[security] =  assign_strength_remove_noise(close, close, context.pivots[security], s)
+    smoother = context.smoothers.get(security)
+    if smoother is None or smoother.window != smooth:
+        smoother = context.smoothers[security] = CausalSavgol(
+            smooth, 3, params['indicator_lookback'])
+    smoother.update(px.index.values, close)
+    close = smoother.values[-len(close):]
+
+    # only the bars that arrived since the last call are checked for pivots
+    tracker = context.pivots[security]
+    added = tracker.update(px.index.values, close, close)
+
+    # the pivots sorted by price: confirmed ones go in, old ones leave with
+    # the lookback, and clustering them needs no sort
+    pivots = context.new_pivots[security]
+    pivots.extend(tracker.as_array(last=added))
+    pivots.expire(tracker.bars_seen - tracker.lookback)
+
+    # reversal candles on the latest bar (morning star, piercing, engulfing, harami)
+    reversal = candle_patterns(open, high, low, close, tail=1,
+                               patterns=BULLISH_REVERSAL)[-1]
+    if not reversal:
+        return 0
 
-    for pivot in context.new_pivots[security]:
-        idx, price, strength = pivot
-        if(abs(close[-1] - price) < s/3 and strength>=2):
-            if(morning_star(high, low, open, close) or piercing_pattern(high, low, open, close)
-            or bullish_engulfing(high, low, open, close) or bullish_harami(high, low, open, close)):
-                return 1
+    levels = pivots.cluster(s)
+    near = np.abs(close[-1] - levels['price']) < s/3
+    if np.any(near & (levels['strength'] >= 2)):
+        return 1
     return 0
\ No newline at end of file
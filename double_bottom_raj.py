@@ -7,7 +7,20 @@ from blueshift.api import(  symbol,
                             date_rules,
                             time_rules,
                         )
-import numpy as np
+
+from technicals.features import shared
+from technicals.history import HistoryCache
+from technicals.double_bottom import bottom_entry_signal, double_bottom_signal
+from technicals import timing
+
+# ticks left and right of a local minimum searched for the low
+DELTA = 10
+# percentage distance between average lows
+Y_DELTA = 0.12
+# False: the original entry, the last close equal to the bar position of
+# a suspected bottom. True: enter while the later bottom of a double
+# bottom (average lows within Y_DELTA) is within DELTA bars of the last bar
+PAIR_ENTRY = False
 
 def initialize(context):
     """
@@ -31,6 +44,10 @@ def initialize(context):
     context.signals = dict((security,0) for security in context.securities)
     context.target_position = dict((security,0) for security in context.securities)
 
+    # last bars of every security, refreshed with only the new bars
+    context.history = HistoryCache(context.securities, ['open','high','low','close'],
+        context.params['indicator_lookback'], context.params['indicator_freq'])
+
     # set trading cost and slippage to zero
     set_commission(commission.PerShare(cost=0.0, min_trade_cost=0.0))
     set_slippage(slippage.FixedSlippage(0.00))
@@ -49,7 +66,9 @@ def before_trading_start(context, data):
     
 def stop_trading(context, data):
     context.trade = False
+    timing.dump()
 
+@timing.timed('run_strategy')
 def run_strategy(context, data):
     """
         A function to define core strategy steps
@@ -61,13 +80,16 @@ def run_strategy(context, data):
     generate_target_position(context, data)
     rebalance(context, data)
 
+@timing.timed('rebalance')
 def rebalance(context,data):
     """
         A function to rebalance - all execution logic goes here
     """
     for security in context.securities:
-        order_target_percent(security, context.target_position[security])
+        with timing.stage('order', security):
+            order_target_percent(security, context.target_position[security])
 
+@timing.timed('generate_target_position')
 def generate_target_position(context, data):
     """
         A function to define target portfolio
@@ -84,19 +106,24 @@ def generate_target_position(context, data):
             context.target_position[security] = 0
  
 
+@timing.timed('generate_signals')
 def generate_signals(context, data):
     """
         A function to define define the signal generation
     """
     try:
-        price_data = data.history(context.securities, ['open','high','low','close'],
-            context.params['indicator_lookback'], context.params['indicator_freq'])
+        with timing.stage('data.history'):
+            price_data = context.history.update(data)
     except:
+        timing.failure('data.history')
         return
 
     for security in context.securities:
         px = price_data.xs(security)
-        context.signals[security] = signal_function(context, px, context.params, security)
+        with timing.stage('signal_function', security):
+            context.signals[security] = shared(
+                ('double_bottom', security, price_data.last_timestamp),
+                lambda: signal_function(context, px, context.params, security))
 
 
 def signal_function(context, px, params, security):
@@ -104,82 +131,12 @@ def signal_function(context, px, params, security):
         The main trading logic goes here, called by generate_signals above
     """
     low  = px.low.values
-    close  = px.close.values
-
-    x_data = np.linspace(1, len(low), len(low))
-    y_data = low
     if(len(low)<2):
         return 0
 
-    # x values for the polynomial fit, 200 points
-    x = np.linspace(1, len(low), len(low))
-
-    # polynomial fit of degree xx
-    pol = np.polyfit(x_data, y_data, 17)
-    y_pol = np.polyval(pol, x)
-
-    data = y_pol
-
-    #           ___ detection of local minimums and maximums ___
-    min_max = np.diff(np.sign(np.diff(data))).nonzero()[0] + 1          # local min & max
-    l_min = (np.diff(np.sign(np.diff(data))) > 0).nonzero()[0] + 1      # local min
-    l_max = (np.diff(np.sign(np.diff(data))) < 0).nonzero()[0] + 1      # local max
-    # +1 due to the fact that diff reduces the original index number
-    
-    #extend the suspected x range:
-    delta = 10  # how many ticks to the left and to the right from local minimum on x axis
-
-    dict_i = dict()
-    dict_x = dict()
-
-    df_len = len(low)                    # number of rows in dataset
-
-    for element in l_min:                            # x coordinates of suspected minimums
-        l_bound = element - delta                    # lower bound (left)
-        u_bound = element + delta                    # upper bound (right)
-        x_range = range(l_bound, u_bound + 1)        # range of x positions where we SUSPECT to find a low
-        dict_x[element] = x_range                    # just helpful dictionary that holds suspected x ranges for further visualization strips
-
-        y_loc_list = list()
-        for x_element in x_range:
-            if x_element > 0 and x_element < df_len:                # need to stay within the dataframe
-                #y_loc_list.append(ticker_df.Low.iloc[x_element])   # list of suspected y values that can be a minimum
-                y_loc_list.append(low[x_element])
-        
-        dict_i[element] = y_loc_list
-
-    y_delta = 0.12                               # percentage distance between average lows
-    threshold = min(low) * 1.15      # setting threshold higher than the global low
-
-    y_dict = dict()
-    mini = list()
-    suspected_bottoms = list()
-                                              #   BUG somewhere here
-    for key in dict_i.keys():                     # for suspected minimum x position  
-        mn = sum(dict_i[key])/len(dict_i[key])    # this is averaging out the price around that suspected minimum
-                                                  # if the range of days is too high the average will not make much sense
-        
-        price_min = min(dict_i[key])    
-        mini.append(price_min)                    # lowest value for price around suspected 
-    
-        l_y = mn * (1.0 - y_delta)                #these values are trying to get an U shape, but it is kinda useless 
-        u_y = mn * (1.0 + y_delta)
-        y_dict[key] = [l_y, u_y, mn, price_min]
-    
-    # tops = []
-    
-    for key_i in y_dict.keys():    
-        for key_j in y_dict.keys():    
-            if (key_i != key_j) and (y_dict[key_i][3] < threshold):
-                suspected_bottoms.append(key_i)
-                # tops.append()
-    
-    flag = 0
-    for bot in suspected_bottoms:
-        if(close[-1] == bot):
-            flag = 1
-    
-    if(flag):
-        return 1
-    else:
-        return 0
\ No newline at end of file
+    # degree 17 fit of the lows and local minima of the fit near the
+    # lowest low
+    if PAIR_ENTRY:
+        # pairs of them with average lows within Y_DELTA
+        return double_bottom_signal(low, DELTA, Y_DELTA)
+    return bottom_entry_signal(low, px.close.values[-1], DELTA)
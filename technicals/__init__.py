@@ -0,0 +1,7 @@
+"""
+    Shared, array based building blocks for the pattern strategies.
+
+    Every function in this package works on plain NumPy arrays so that the
+    same code can be called from a Blueshift strategy (on the values of a
+    `data.history` slice) and from the research notebooks (on full history).
+"""
@@ -0,0 +1,165 @@
+"""
+    Candlestick patterns over whole OHLC arrays.
+
+    Each pattern function takes open/high/low/close arrays and returns a
+    boolean mask with one entry per bar, True where the pattern completes on
+    that bar. Bars without enough history for the pattern are False. Time
+    runs along the last axis, so (securities x bars) arrays evaluate a whole
+    universe in one call.
+
+    `candle_patterns` evaluates all of them at once and packs the result into
+    one integer per bar (one bit per pattern). Pass `tail=1` to only look at
+    the latest bar in live trading; research code can leave `tail` out and
+    get every bar of the history.
+"""
+import numpy as np
+
+MORNING_STAR = 1 << 0
+PIERCING_PATTERN = 1 << 1
+BULLISH_ENGULFING = 1 << 2
+BULLISH_HARAMI = 1 << 3
+BEARISH_ENGULFING = 1 << 4
+BULLISH_MARUBOZU = 1 << 5
+BEARISH_MARUBOZU = 1 << 6
+
+# the reversal patterns combined_5 looks for near a support level
+BULLISH_REVERSAL = MORNING_STAR | PIERCING_PATTERN | BULLISH_ENGULFING | BULLISH_HARAMI
+
+
+def _shift(x, periods):
+    """
+        x delayed by `periods` bars, NaN where there is no earlier bar.
+    """
+    n = x.shape[-1]
+    out = np.full(x.shape, np.nan)
+    if periods < n:
+        out[..., periods:] = x[..., :n - periods]
+    return out
+
+
+def _as_arrays(*arrays):
+    return [np.asarray(x, dtype=float) for x in arrays]
+
+
+def morning_star(open, high, low, close):
+    """
+        Bearish candle, a second candle whose body sits below the first
+        close, then a bullish candle opening above the second body.
+    """
+    open, high, low, close = _as_arrays(open, high, low, close)
+    prev_top = np.maximum(_shift(open, 1), _shift(close, 1))
+    b_prev_open = _shift(open, 2)
+    b_prev_close = _shift(close, 2)
+    return ((prev_top < b_prev_close) & (b_prev_close < b_prev_open)
+            & (close > open) & (open > prev_top))
+
+
+def piercing_pattern(open, high, low, close):
+    """
+        Bearish candle followed by a gap down open that closes above the
+        middle of the previous body.
+    """
+    open, high, low, close = _as_arrays(open, high, low, close)
+    prev_open = _shift(open, 1)
+    prev_close = _shift(close, 1)
+    prev_low = _shift(low, 1)
+    return ((prev_close < prev_open) & (open < prev_low)
+            & (prev_open > close)
+            & (close > prev_close + (prev_open - prev_close) / 2))
+
+
+def bullish_engulfing(open, high, low, close):
+    """
+        The engulfing rule used by combined_5: a bullish candle followed by
+        a larger bearish body that covers it.
+    """
+    open, high, low, close = _as_arrays(open, high, low, close)
+    prev_open = _shift(open, 1)
+    prev_close = _shift(close, 1)
+    return ((open >= prev_close) & (prev_close > prev_open)
+            & (open > close) & (prev_open >= close)
+            & (open - close > prev_close - prev_open))
+
+
+def bearish_engulfing(open, high, low, close):
+    """
+        `BearishEngulfing` from the talib detector notebook. It is the same
+        test as `bullish_engulfing` above; both names are kept so callers
+        can keep asking for the pattern they had.
+    """
+    return bullish_engulfing(open, high, low, close)
+
+
+def bullish_harami(open, high, low, close):
+    """
+        Bearish candle followed by a smaller bullish body inside it.
+    """
+    open, high, low, close = _as_arrays(open, high, low, close)
+    prev_open = _shift(open, 1)
+    prev_close = _shift(close, 1)
+    return ((prev_open > prev_close) & (prev_close <= open)
+            & (open < close) & (close <= prev_open)
+            & (close - open < prev_open - prev_close))
+
+
+def bullish_marubozu(open, high, low, close):
+    """
+        Bullish candle without wicks (opens at the low, closes at the high).
+    """
+    open, high, low, close = _as_arrays(open, high, low, close)
+    return (close > open) & (high == close) & (low == open)
+
+
+def bearish_marubozu(open, high, low, close):
+    """
+        Bearish candle without wicks (opens at the high, closes at the low).
+    """
+    open, high, low, close = _as_arrays(open, high, low, close)
+    return (close < open) & (high == open) & (low == close)
+
+
+PATTERNS = {
+    MORNING_STAR: morning_star,
+    PIERCING_PATTERN: piercing_pattern,
+    BULLISH_ENGULFING: bullish_engulfing,
+    BULLISH_HARAMI: bullish_harami,
+    BEARISH_ENGULFING: bearish_engulfing,
+    BULLISH_MARUBOZU: bullish_marubozu,
+    BEARISH_MARUBOZU: bearish_marubozu,
+}
+
+# bars of history (besides the current one) the patterns look at
+LOOKBACK = 2
+
+
+def candle_patterns(open, high, low, close, tail=None, patterns=None):
+    """
+        Bitmask of the patterns matched on each bar.
+
+        `patterns` is a bitwise OR of the pattern constants (all by default).
+        With `tail` only the last `tail` bars are evaluated and returned,
+        which is all live trading needs.
+    """
+    open, high, low, close = _as_arrays(open, high, low, close)
+    if tail is not None:
+        start = max(close.shape[-1] - tail - LOOKBACK, 0)
+        open, high, low, close = (open[..., start:], high[..., start:],
+                                  low[..., start:], close[..., start:])
+
+    if patterns is None:
+        patterns = sum(PATTERNS)
+    bits = np.zeros(close.shape, dtype=np.uint16)
+    for bit, func in PATTERNS.items():
+        if patterns & bit:
+            bits |= func(open, high, low, close).astype(np.uint16) * bit
+
+    if tail is not None:
+        bits = bits[..., max(bits.shape[-1] - tail, 0):]
+    return bits
+
+
+def has_pattern(bits, patterns):
+    """
+        Boolean mask of the bars in `bits` matching any of `patterns`.
+    """
+    return (np.asarray(bits) & patterns) != 0
@@ -0,0 +1,131 @@
+"""
+    Streaming cup-and-handle detector.
+
+    The cup-handle strategies look at the last `window` closes and take
+
+        cb  the lowest close (cup bottom, first one on ties)
+        hs  the highest close from the cup bottom on (handle top)
+        hb  the lowest close from the handle top on (handle bottom)
+        cbb the close `base_lag` bars ago
+
+    and signal when hs / cbb > 0.9, the last close is above hb and the cup
+    is more than three times as deep as the handle, (hs - cb) / (hs - hb) > 3.
+
+    `CupHandleDetector` keeps cb, hs and hb up to date with one monotonic
+    deque each. The start of the window, the cup bottom and the handle top
+    only ever move forward, so every bar is pushed and evicted at most once
+    per deque: amortised O(1) per bar instead of four passes over the
+    window per call.
+"""
+from collections import deque
+
+import numpy as np
+
+
+class CupHandleDetector(object):
+    """
+        Cup-and-handle rule over the last `window` closes of one security,
+        fed bar by bar.
+
+        A window with a missing (NaN) close never signals, like the full
+        recomputation, where the NaN poisons the min/max.
+    """
+
+    def __init__(self, window, base_lag=60, min_ratio=0.9, min_depth=3):
+        self.window = int(window)
+        self.base_lag = int(base_lag)
+        self.min_ratio = min_ratio
+        self.min_depth = min_depth
+        self.last_timestamp = None
+        self.reset()
+
+    def reset(self):
+        self.bars_seen = 0
+        self._recent = deque(maxlen=self.base_lag)
+        self._missing = deque()
+        # (index, close) candidates, see the module docstring
+        self._bottom = deque()
+        self._top = deque()
+        self._handle = deque()
+
+    def push(self, close):
+        """
+            Add the next bar and return the signal (1 or 0) on it.
+        """
+        t = self.bars_seen
+        self.bars_seen += 1
+        start = t - self.window + 1
+        self._recent.append(close)
+
+        if close != close:
+            self._missing.append(t)
+        else:
+            bottom, top, handle = self._bottom, self._top, self._handle
+            while bottom and bottom[-1][1] > close:
+                bottom.pop()
+            bottom.append((t, close))
+            while top and top[-1][1] < close:
+                top.pop()
+            top.append((t, close))
+            while handle and handle[-1][1] > close:
+                handle.pop()
+            handle.append((t, close))
+
+        while self._missing and self._missing[0] < start:
+            self._missing.popleft()
+        while self._bottom and self._bottom[0][0] < start:
+            self._bottom.popleft()
+        if self._bottom:
+            while self._top[0][0] < self._bottom[0][0]:
+                self._top.popleft()
+            while self._handle[0][0] < self._top[0][0]:
+                self._handle.popleft()
+        return self.signal()
+
+    def levels(self):
+        """
+            (cb, hs, hb) of the current window, NaNs while it has a missing
+            close.
+        """
+        if self._missing or not self._bottom:
+            return np.nan, np.nan, np.nan
+        return self._bottom[0][1], self._top[0][1], self._handle[0][1]
+
+    def signal(self):
+        """
+            1 if the rule holds on the latest bar, else 0.
+        """
+        if self._missing or not self._bottom or len(self._recent) < self.base_lag:
+            return 0
+        base = self._recent[0]
+        cb, hs, hb = self._bottom[0][1], self._top[0][1], self._handle[0][1]
+        if base == 0:
+            return 0
+        # hs >= last > hb whenever the second test passes, so no 0 / 0
+        if (hs / base > self.min_ratio and self._recent[-1] > hb
+                and (hs - cb) / (hs - hb) > self.min_depth):
+            return 1
+        return 0
+
+    def update(self, timestamps, closes):
+        """
+            Consume a window of bars (oldest first), pushing only those
+            newer than the last one seen, and return the latest signal.
+            Bars already seen are assumed final.
+        """
+        closes = np.asarray(closes, dtype=float)
+        n = len(closes)
+        if n == 0:
+            return self.signal()
+        timestamps = np.asarray(timestamps)
+        if self.last_timestamp is None:
+            first = 0
+        else:
+            first = int(np.searchsorted(timestamps, self.last_timestamp, side='right'))
+            if first == 0:
+                # no overlap with what was seen: start over on this window
+                self.reset()
+        self.last_timestamp = timestamps[-1]
+        for close in closes[first:].tolist():
+            self.push(close)
+        return self.signal()
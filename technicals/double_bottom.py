@@ -0,0 +1,172 @@
+"""
+    Double-bottom detection on a window of lows.
+
+    The lows are smoothed with a least squares polynomial (degree 17 by
+    default). Local minima of the smoothed curve are candidate bottoms and
+    each one gets the mean and the minimum of the raw lows within `delta`
+    bars of it. A candidate whose minimum is within 15% of the lowest low
+    of the window is a bottom. Two bottoms form a double bottom when the
+    mean of the later one is within `y_delta` (a fraction) of the mean of
+    the earlier one.
+
+    `bottom_entry_signal` is the entry rule of `double_bottom_raj.py`:
+    with at least two local minima in the fit, it fires when the last
+    close equals the bar position of a bottom. `double_bottom_signal` is
+    the rule the pairs describe, firing while the later bottom of a
+    double bottom is still forming; the strategy uses it on request.
+
+    The fit is the projection of the window on a Legendre basis over
+    [-1, 1]. Its pseudo-inverse is computed once per (window length,
+    degree) and cached, so a fit costs two small matrix products instead
+    of an ill-conditioned `np.polyfit` over 1..n.
+"""
+import functools
+
+import numpy as np
+from numpy.polynomial import legendre
+from scipy.ndimage import minimum_filter1d
+
+DEGREE = 17
+# lows of a bottom at most this much above the lowest low of the window
+THRESHOLD = 1.15
+
+
+@functools.lru_cache(maxsize=None)
+def fit_operators(n, degree=DEGREE):
+    """
+        (basis, pinv) for windows of `n` bars: the least squares fit of
+        `y` is `basis @ (pinv @ y)`. Both are read-only.
+    """
+    degree = min(int(degree), n - 1)
+    basis = legendre.legvander(np.linspace(-1.0, 1.0, n), degree)
+    pinv = np.linalg.pinv(basis)
+    basis.flags.writeable = False
+    pinv.flags.writeable = False
+    return basis, pinv
+
+
+def smooth_lows(low, degree=DEGREE):
+    """
+        Polynomial fit of `low` along the last axis.
+    """
+    low = np.asarray(low, dtype=float)
+    basis, pinv = fit_operators(low.shape[-1], degree)
+    return (low @ pinv.T) @ basis.T
+
+
+def _bottoms(low, delta, degree):
+    """
+        Candidate bottoms along the last axis: mask of the local minima of
+        the fit, mask of those that qualify as bottoms, and the mean of
+        the lows around every bar.
+    """
+    n = low.shape[-1]
+    curve = smooth_lows(low, degree)
+    minima = np.zeros(low.shape, dtype=bool)
+    minima[..., 1:-1] = np.diff(np.sign(np.diff(curve, axis=-1)), axis=-1) > 0
+
+    # lows within delta bars of every bar, leaving out the first bar
+    positions = np.arange(n)
+    first = np.maximum(positions - delta, 1)
+    last = np.minimum(positions + delta, n - 1)
+    inner = low.copy()
+    inner[..., 0] = 0.0
+    total = np.concatenate([np.zeros(low.shape[:-1] + (1,)), np.cumsum(inner, axis=-1)],
+                           axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (total[..., last + 1] - total[..., first]) / (last - first + 1)
+    inner[..., 0] = np.inf
+    lowest = minimum_filter1d(inner, 2 * delta + 1, axis=-1, mode='constant', cval=np.inf)
+
+    # NaN for a window with a missing low, which then has no bottoms
+    threshold = low.min(axis=-1, keepdims=True) * THRESHOLD
+    return minima, minima & (lowest < threshold), mean
+
+
+def bottom_entry_signal(low, close, delta=10, degree=DEGREE):
+    """
+        1 when the fit of `low` has two local minima or more and `close`
+        equals the bar position of one that qualifies as a bottom, else 0.
+    """
+    low = np.asarray(low, dtype=float)
+    if len(low) < 3:
+        return 0
+    minima, bottoms, _ = _bottoms(low, delta, degree)
+    if np.count_nonzero(minima) < 2:
+        return 0
+    return int(bool(np.any(np.flatnonzero(bottoms) == close)))
+
+
+def double_bottom_pairs(low, delta=10, y_delta=0.12, degree=DEGREE):
+    """
+        (earlier, later) bar indices of every double bottom in the window
+        `low`, sorted by the later bottom, found with a sweep over the
+        bottoms sorted by mean.
+    """
+    low = np.asarray(low, dtype=float)
+    if len(low) < 3:
+        return []
+    _, bottoms, mean = _bottoms(low, delta, degree)
+    index = np.flatnonzero(bottoms)
+    means = mean[index]
+    order = np.argsort(means, kind='stable')
+    ranked = means[order]
+    starts = np.searchsorted(ranked, means * (1.0 - y_delta), side='left')
+    ends = np.searchsorted(ranked, means * (1.0 + y_delta), side='right')
+    pairs = []
+    for i, start, end in zip(index.tolist(), starts.tolist(), ends.tolist()):
+        pairs.extend((i, j) for j in index[order[start:end]].tolist() if j > i)
+    return sorted(pairs, key=lambda pair: (pair[1], pair[0]))
+
+
+def double_bottom_signal(low, delta=10, y_delta=0.12, degree=DEGREE):
+    """
+        1 when the later bottom of a double bottom is within `delta` bars
+        of the last bar, i.e. still forming, else 0.
+    """
+    n = len(low)
+    for _, later in double_bottom_pairs(low, delta, y_delta, degree):
+        if later >= n - 1 - delta:
+            return 1
+    return 0
+
+
+def double_bottom_signals(low, window, delta=10, y_delta=0.12, degree=DEGREE,
+                          chunk=2048):
+    """
+        `double_bottom_signal` of the last `window` lows at every bar of
+        the series `low` (of the bars so far while there are fewer),
+        computed for all full windows at once, `chunk` windows at a time.
+    """
+    low = np.asarray(low, dtype=float)
+    window = int(window)
+    out = np.zeros(len(low), dtype=int)
+    for t in range(min(window - 1, len(low))):
+        out[t] = double_bottom_signal(low[:t + 1], delta, y_delta, degree)
+    if len(low) < window or window < 3:
+        for t in range(window - 1, len(low)):
+            out[t] = double_bottom_signal(low[t - window + 1:t + 1], delta, y_delta, degree)
+        return out
+
+    windows = np.lib.stride_tricks.sliding_window_view(low, window)
+    recent = np.arange(window) >= window - 1 - delta
+    for start in range(0, len(windows), chunk):
+        block = windows[start:start + chunk]
+        _, bottoms, mean = _bottoms(block, delta, degree)
+        rows, index = np.nonzero(bottoms)
+        if len(rows) == 0:
+            continue
+        # bottoms of each window side by side, padded with NaN means
+        counts = np.bincount(rows, minlength=len(block))
+        rank = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        means = np.full((len(block), counts.max()), np.nan)
+        where = np.full((len(block), counts.max()), -1)
+        means[rows, rank] = mean[rows, index]
+        where[rows, rank] = index
+        earlier, later = means[:, :, None], means[:, None, :]
+        paired = ((where[:, None, :] > where[:, :, None])
+                  & (later >= earlier * (1.0 - y_delta))
+                  & (later <= earlier * (1.0 + y_delta))
+                  & recent[np.maximum(where, 0)][:, None, :])
+        out[window - 1 + start:window - 1 + start + len(block)] = paired.any(axis=(1, 2))
+    return out
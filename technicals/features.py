@@ -0,0 +1,169 @@
+"""
+    Features shared between runs of the same strategy.
+
+    A parameter sweep runs one strategy many times over the same bars and
+    most combinations only change how signals are traded (thresholds,
+    leverage), not the signals themselves. Strategies wrap their signal
+    computation in `shared(key, compute)`, keyed by what identifies the
+    input: security, last bar timestamp and, when that bar may still be
+    forming (daily bars), its values. The sweep runner enables sharing and
+    sets a scope naming the parameters that do change the features, so
+    every combination in the same scope reuses what the first one computed.
+
+    The cache of a sweep is not bounded: it holds one entry per rebalance
+    of the run (about 19000 a year for a strategy trading every 5 minutes
+    on all its securities at once, 94000 for one keyed per minute). An
+    evicting cache would be worse than none, since combinations replay the
+    run in the same order and the oldest entries are always the next ones
+    needed; and a computation feeding a stateful detector (CupHandle's
+    `update_cups`) must either run for every bar or for none of them.
+
+    Sharing is off unless a sweep turns it on, and then `shared` just calls
+    `compute`.
+
+    Within one run, `SignalMemo` skips recomputing a signal whose input has
+    not changed since the last call: strategies scheduled every few minutes
+    on daily bars see the same closed bars all day and only the forming
+    bar moves. Its entries are keyed by (security, last bar timestamp,
+    params) and remember the values of that last bar, so a forming bar
+    that has changed is a miss and the memo never returns a stale signal.
+"""
+from collections import OrderedDict
+
+_cache = None
+_scope = None
+
+
+class FeatureCache(object):
+    """
+        Mapping of feature keys to values, with at most `maxsize` entries
+        (least recently used dropped first) or as many as needed for None.
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self._values = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def get(self, key, compute):
+        try:
+            value = self._values[key]
+        except KeyError:
+            self.misses += 1
+            value = self._values[key] = compute()
+            if self.maxsize is not None and len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+            return value
+        self.hits += 1
+        self._values.move_to_end(key)
+        return value
+
+    def clear(self):
+        self._values.clear()
+
+
+def share(maxsize=None, scope=None):
+    """
+        Turn sharing on in this process with a fresh cache.
+    """
+    global _cache, _scope
+    _cache = FeatureCache(maxsize)
+    _scope = scope
+    return _cache
+
+
+def unshare():
+    global _cache, _scope
+    _cache = None
+    _scope = None
+
+
+def set_scope(scope):
+    """
+        Name the feature parameters of the run about to start; values are
+        only shared between runs with equal scopes.
+    """
+    global _scope
+    _scope = scope
+
+
+def shared(key, compute):
+    """
+        `compute()`, or the value computed for `key` in an earlier run with
+        the same scope when sharing is on.
+    """
+    if _cache is None:
+        return compute()
+    return _cache.get((_scope, key), compute)
+
+
+def params_key(params):
+    """
+        A hashable key for a params dict, equal for equal params; values
+        that cannot be hashed are keyed by their repr.
+    """
+    items = []
+    for name, value in sorted(params.items()):
+        try:
+            hash(value)
+        except TypeError:
+            value = repr(value)
+        items.append((name, value))
+    return tuple(items)
+
+
+class SignalMemo(object):
+    """
+        Signals by (security, last bar timestamp, params), with the last
+        bar they were computed from; at most `maxsize` entries, least
+        recently used dropped first.
+
+        A miss calls `compute`, so the memo is only as exact as it is: a
+        computation keeping running state must redo the forming bar when
+        it changes (as `StreamingIndicator.update` does), not skip it.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._values = OrderedDict()
+        self._params = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def _params_key(self, params):
+        # the same dict is passed on every call, rebuild the key only when
+        # its contents change
+        cached = self._params
+        if cached is None or cached[0] is not params or cached[1] != params:
+            cached = self._params = (params, dict(params), params_key(params))
+        return cached[2]
+
+    def get(self, security, timestamp, last_bar, params, compute):
+        """
+            The signal computed for the same security, last bar (timestamp
+            and values) and params, or `compute()` stored for next time.
+        """
+        key = (security, timestamp, self._params_key(params))
+        entry = self._values.get(key)
+        if entry is not None and entry[0] == last_bar:
+            self.hits += 1
+            self._values.move_to_end(key)
+            return entry[1]
+        self.misses += 1
+        value = compute()
+        self._values[key] = (last_bar, value)
+        self._values.move_to_end(key)
+        if len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+        return value
+
+    def clear(self):
+        self._values.clear()
+        self._params = None
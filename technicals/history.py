@@ -0,0 +1,263 @@
+"""
+    Cheaper `data.history` windows for the strategies.
+
+    `HistoryCache` sits in front of `data.history`: after the first call it
+    only asks for the bars that arrived since the previous one and keeps
+    the last `bar_count` bars per security in a preallocated buffer.
+    Windows come back as `HistoryWindow` objects, which answer
+    `price_data.xs(security)` like the DataFrame Blueshift returns without
+    copying the bars, and as one (security x time x field) array via
+    `tensor()` for the batched signals in `technicals.signals`.
+"""
+import numpy as np
+import pandas as pd
+
+
+class HistoryWindow(object):
+    """
+        Multi-asset, multi-field history that only builds pandas on demand.
+
+        It holds one array per (field, asset), usually a view into a bar
+        store or a `HistoryCache` buffer, and behaves like the DataFrame
+        `data.history` returns for a list of assets and a list of fields:
+        `xs(asset)` returns that asset's DataFrame on top of the same arrays,
+        while any other DataFrame operation builds (once) the
+        (asset, timestamp) indexed frame Blueshift returns.
+    """
+
+    def __init__(self, assets, fields, index, rows, tensor=None):
+        self.assets = assets
+        self.fields = fields
+        self.index_values = index
+        self._rows = rows
+        self._tensor = tensor
+        self._positions = dict((a, i) for i, a in enumerate(assets))
+        self._frame = None
+
+    def array(self, field, asset):
+        """
+            The bars of one field of one asset as a NumPy array.
+        """
+        return self._rows[field][self._positions[asset]]
+
+    def last_bar(self, asset):
+        """
+            The values of every field in the latest bar of one asset, as a
+            tuple (empty for an empty window).
+        """
+        if not len(self.index_values):
+            return ()
+        i = self._positions[asset]
+        return tuple(float(self._rows[f][i][-1]) for f in self.fields)
+
+    @property
+    def last_timestamp(self):
+        """
+            Timestamp of the latest bar, None for an empty window.
+        """
+        return self.index_values[-1] if len(self.index_values) else None
+
+    def tensor(self, fields=None):
+        """
+            The bars as one (asset x time x field) array, fields in the
+            order of `fields` (all of them by default).
+        """
+        fields = self.fields if fields is None else list(fields)
+        if self._tensor is not None and fields == list(self.fields):
+            return self._tensor
+        shape = (len(self.assets), len(self.index_values))
+        return np.stack([np.reshape(np.asarray(self._rows[f], dtype=float), shape)
+                         for f in fields], axis=-1)
+
+    def xs(self, key, *args, **kwargs):
+        if not args and not kwargs and key in self._positions:
+            i = self._positions[key]
+            return pd.DataFrame(dict((f, self._rows[f][i]) for f in self.fields),
+                                index=self.index_values, columns=self.fields,
+                                copy=False)
+        return self.to_frame().xs(key, *args, **kwargs)
+
+    def to_frame(self):
+        """
+            The (asset, timestamp) indexed DataFrame.
+        """
+        if self._frame is None:
+            # levels and codes directly, factorising the labels is slow
+            n = len(self.index_values)
+            k = len(self.assets)
+            multi = pd.MultiIndex(levels=[pd.Index(self.assets, dtype=object),
+                                          self.index_values],
+                                  codes=[np.repeat(np.arange(k), n),
+                                         np.tile(np.arange(n), k)],
+                                  verify_integrity=False)
+            data = dict((f, np.concatenate(self._rows[f]) if k else np.empty(0))
+                        for f in self.fields)
+            self._frame = pd.DataFrame(data, index=multi, columns=self.fields)
+        return self._frame
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.to_frame(), name)
+
+    def __getitem__(self, key):
+        return self.to_frame()[key]
+
+    def __len__(self):
+        return len(self.assets) * len(self.index_values)
+
+    def __iter__(self):
+        return iter(self.to_frame())
+
+    def __repr__(self):
+        return repr(self.to_frame())
+
+
+def _window_arrays(window, assets, fields):
+    """
+        (timestamps, {field: [array per asset]}) of a `data.history`
+        result for a list of assets and a list of fields.
+    """
+    if isinstance(window, HistoryWindow):
+        return (np.asarray(window.index_values, dtype='datetime64[ns]'),
+                dict((f, [window.array(f, a) for a in assets]) for f in fields))
+    rows = {}
+    index = None
+    for field in fields:
+        table = window[field].unstack(level=0)
+        if index is None:
+            index = table.index
+        table = table.reindex(index=index, columns=assets)
+        rows[field] = list(table.to_numpy(dtype=float).T)
+    if index is None:
+        index = pd.DatetimeIndex([])
+    return np.asarray(pd.DatetimeIndex(index).values, dtype='datetime64[ns]'), rows
+
+
+def price_tensor(window, assets, fields):
+    """
+        A `data.history` result for a list of assets and a list of fields
+        as an (asset x time x field) array.
+    """
+    if isinstance(window, HistoryWindow):
+        return window.tensor(fields)
+    stamps, rows = _window_arrays(window, assets, fields)
+    shape = (len(assets), len(stamps))
+    return np.stack([np.reshape(np.asarray(rows[f], dtype=float), shape)
+                     for f in fields], axis=-1)
+
+
+class HistoryCache(object):
+    """
+        The last `bar_count` bars of `fields` for `assets` at one frequency,
+        refreshed with only the bars that are new since the previous call.
+
+        Bars live in one (asset x time x field) buffer twice the window
+        long, so most updates just write the new bars after the old ones and
+        the window is a view into the buffer. The first call, and any call that finds no overlap with
+        the cached bars, fetches the whole window.
+    """
+
+    def __init__(self, assets, fields, bar_count, frequency):
+        self.assets = list(assets)
+        self.fields = list(fields)
+        self.bar_count = int(bar_count)
+        self.frequency = frequency
+        size = 2 * self.bar_count
+        self._buffer = np.full((len(self.assets), size, len(self.fields)), np.nan)
+        self._stamps = np.empty(size, dtype='datetime64[ns]')
+        self._end = 0
+        self._count = 0
+        # bars to ask for next time: the ones expected to be new plus the
+        # last cached bar, which may have changed (today's daily bar)
+        self._step = self.bar_count
+        self.fetches = 0
+        self.bars_fetched = 0
+
+    def __len__(self):
+        return self._count
+
+    def reset(self):
+        self._end = 0
+        self._count = 0
+        self._step = self.bar_count
+
+    def _fetch(self, data, count):
+        window = data.history(self.assets, self.fields, count, self.frequency)
+        self.fetches += 1
+        stamps, rows = _window_arrays(window, self.assets, self.fields)
+        self.bars_fetched += len(stamps)
+        return stamps, rows
+
+    def _write(self, stamps, rows, first):
+        """
+            Copy fetched bars `first:` to the end of the buffer, keeping
+            the cached window contiguous.
+        """
+        new = len(stamps) - first
+        if new <= 0:
+            return
+        size = len(self._stamps)
+        if self._end + new > size:
+            keep = min(self._count, self.bar_count - new)
+            lo = self._end - keep
+            self._stamps[:keep] = self._stamps[lo:self._end]
+            self._buffer[:, :keep] = self._buffer[:, lo:self._end]
+            self._end = keep
+            self._count = keep
+        end = self._end + new
+        self._stamps[self._end:end] = stamps[first:]
+        shape = (len(self.assets), len(stamps))
+        for k, field in enumerate(self.fields):
+            values = np.reshape(np.asarray(rows[field], dtype=float), shape)
+            self._buffer[:, self._end:end, k] = values[:, first:]
+        self._end = end
+        self._count = min(self._count + new, self.bar_count)
+
+    def update(self, data):
+        """
+            Bring the cache up to date with `data` and return the window as
+            a `HistoryWindow`. Its arrays are read-only views into the
+            cache, valid until the next call.
+        """
+        cached = self._count > 0
+        count = min(self._step, self.bar_count) if cached else self.bar_count
+        stamps, rows = self._fetch(data, count)
+        if cached:
+            last = self._stamps[self._end - 1]
+            first = int(np.searchsorted(stamps, last))
+            if first < len(stamps) and stamps[first] != last:
+                # a gap: more bars arrived than were asked for, ask for
+                # twice as many until the answer reaches the cached bars
+                if count < self.bar_count:
+                    self._step = 2 * count
+                    return self.update(data)
+                self.reset()
+                cached = False
+        if not cached:
+            self._write(stamps, rows, 0)
+            # the next call only expects the bar after the last one
+            new = 1
+        elif first == len(stamps):
+            # nothing at or after the cached bars, keep them
+            new = 0
+        else:
+            # refresh the last cached bar, then append the rest
+            for k, field in enumerate(self.fields):
+                for i, row in enumerate(rows[field]):
+                    self._buffer[i, self._end - 1, k] = row[first]
+            new = len(stamps) - first - 1
+            self._write(stamps, rows, first + 1)
+        self._step = max(new + 1, 2)
+        return self.window()
+
+    def window(self):
+        """
+            The cached bars as a `HistoryWindow`, without fetching.
+        """
+        lo = self._end - self._count
+        index = pd.DatetimeIndex(self._stamps[lo:self._end], copy=False)
+        tensor = self._buffer[:, lo:self._end]
+        tensor.flags.writeable = False
+        rows = dict((f, list(tensor[:, :, k])) for k, f in enumerate(self.fields))
+        return HistoryWindow(self.assets, self.fields, index, rows, tensor)
@@ -0,0 +1,600 @@
+"""
+    Technical indicators, full series and bar by bar.
+
+    Three flavours of the same TA-Lib definitions (the ones behind
+    `blueshift.library.technicals.indicators`):
+
+    - `*_series` functions compute the whole output array of an input
+      series at once, with the same NaN warm-up as TA-Lib. The recursions
+      (EMA, Wilder smoothing) run as linear filters, so they match TA-Lib
+      to rounding.
+    - `rsi`, `ema`, `sma`, `bollinger_band`, `adx` and `fibonacci_support`
+      take the `data.history` DataFrame of one security and return the
+      latest value, like the Blueshift functions. The offline harness
+      serves `blueshift.library.technicals.indicators` from here.
+    - `EMA`, `RSI`, `BollingerBands` and `ADX` keep running state and
+      update in O(1) per bar. They follow TA-Lib's arithmetic step by step,
+      so after n bars they equal the last value of the TA-Lib function on
+      those n bars. Blueshift recomputes on the current window only, which
+      reseeds the recursion at the window start; the two converge as the
+      seed decays (for BBands, a pure rolling window, they agree from the
+      start). EMA, RSI and ADX skip bars with a missing (NaN) input; the
+      bands are NaN while one is in their window, like the window
+      computation.
+"""
+import bisect
+import functools
+from collections import deque
+
+import numpy as np
+from scipy.signal import lfilter
+
+# TA-Lib treats values this close to zero as zero
+EPSILON = 0.00000001
+# bars between fresh sums in BollingerBands
+RESUM_EVERY = 4096
+
+
+def _check_period(period):
+    period = int(period)
+    if period < 2:
+        raise ValueError('period must be at least 2, got {}'.format(period))
+    return period
+
+
+def _array(x):
+    return np.asarray(x, dtype=float)
+
+
+def _recurse(x, decay, first, gain=1.0):
+    """
+        y[t] = decay * y[t-1] + gain * x[t], starting from y[-1] = first.
+    """
+    if len(x) == 0:
+        return np.empty(0)
+    return lfilter([gain], [1.0, -decay], x, zi=[decay * first])[0]
+
+
+def _skip_leading_nans(inputs=1):
+    """
+        Run a series function from the first bar where none of its `inputs`
+        leading arguments is NaN and pad the output with NaNs, like the
+        TA-Lib Python wrapper does.
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            arrays = [_array(a) for a in args[:inputs]]
+            missing = np.zeros(len(arrays[0]), dtype=bool)
+            for a in arrays:
+                missing |= np.isnan(a)
+            begin = int(np.argmin(missing)) if not missing.all() else len(missing)
+            result = func(*([a[begin:] for a in arrays] + list(args[inputs:])), **kwargs)
+            if begin == 0:
+                return result
+
+            def pad(values):
+                out = np.full(len(missing), np.nan)
+                out[begin:] = values
+                return out
+            if isinstance(result, tuple):
+                return tuple(pad(r) for r in result)
+            return pad(result)
+        return wrapper
+    return decorate
+
+
+# --- full series -------------------------------------------------------
+
+@_skip_leading_nans()
+def sma_series(x, period):
+    """
+        Simple moving average, NaN for the first period-1 bars.
+    """
+    period = _check_period(period)
+    x = _array(x)
+    out = np.full(len(x), np.nan)
+    if len(x) >= period:
+        total = np.concatenate([[0.0], np.cumsum(x)])
+        out[period - 1:] = (total[period:] - total[:-period]) / period
+    return out
+
+
+@_skip_leading_nans()
+def ema_series(x, period):
+    """
+        Exponential moving average with k = 2 / (period + 1), seeded with
+        the simple average of the first `period` bars.
+    """
+    period = _check_period(period)
+    x = _array(x)
+    out = np.full(len(x), np.nan)
+    if len(x) >= period:
+        k = 2.0 / (period + 1)
+        seed = x[:period].sum() / period
+        out[period - 1] = seed
+        out[period:] = _recurse(x[period:], 1.0 - k, seed, k)
+    return out
+
+
+@_skip_leading_nans()
+def bbands_series(x, period, nbdev=2.0):
+    """
+        Bollinger bands (upper, middle, lower): the simple moving average
+        plus and minus `nbdev` population standard deviations.
+    """
+    period = _check_period(period)
+    x = _array(x)
+    mid = sma_series(x, period)
+    upper = np.full(len(x), np.nan)
+    lower = np.full(len(x), np.nan)
+    if len(x) >= period:
+        # the variance does not depend on the level, centre the data to
+        # keep the running sums small
+        y = x - x[0]
+        total = np.concatenate([[0.0], np.cumsum(y)])
+        total2 = np.concatenate([[0.0], np.cumsum(y * y)])
+        mean = (total[period:] - total[:-period]) / period
+        var = (total2[period:] - total2[:-period]) / period - mean * mean
+        std = np.where(var < EPSILON, 0.0, np.sqrt(np.maximum(var, 0.0)))
+        upper[period - 1:] = mid[period - 1:] + nbdev * std
+        lower[period - 1:] = mid[period - 1:] - nbdev * std
+    return upper, mid, lower
+
+
+def _wilder_ratio(up, down):
+    """
+        100 * up / (up + down), 0 where the sum is zero.
+    """
+    total = up + down
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = 100.0 * (up / total)
+    out[np.abs(total) < EPSILON] = 0.0
+    return out
+
+
+@_skip_leading_nans()
+def rsi_series(x, period):
+    """
+        Relative strength index with Wilder smoothing, NaN for the first
+        `period` bars.
+    """
+    period = _check_period(period)
+    x = _array(x)
+    out = np.full(len(x), np.nan)
+    if len(x) > period:
+        change = np.diff(x)
+        gain = np.where(change < 0, 0.0, change)
+        loss = np.where(change < 0, -change, 0.0)
+        decay = (period - 1.0) / period
+        gains = _recurse(gain[period:], decay, gain[:period].sum() / period, 1.0 / period)
+        losses = _recurse(loss[period:], decay, loss[:period].sum() / period, 1.0 / period)
+        gains = np.concatenate([[gain[:period].sum() / period], gains])
+        losses = np.concatenate([[loss[:period].sum() / period], losses])
+        out[period:] = _wilder_ratio(gains, losses)
+    return out
+
+
+def _directional_movement(high, low, close):
+    """
+        +DM, -DM and true range of every bar after the first.
+    """
+    up = high[1:] - high[:-1]
+    down = low[:-1] - low[1:]
+    minus = np.where((down > 0) & (up < down), down, 0.0)
+    plus = np.where((up > 0) & (up > down), up, 0.0)
+    prev = close[:-1]
+    true_range = np.maximum(high[1:] - low[1:],
+                            np.maximum(np.abs(high[1:] - prev), np.abs(low[1:] - prev)))
+    return plus, minus, true_range
+
+
+@_skip_leading_nans(3)
+def adx_series(high, low, close, period):
+    """
+        Average directional index, NaN for the first 2 * period - 1 bars.
+    """
+    period = _check_period(period)
+    high, low, close = _array(high), _array(low), _array(close)
+    out = np.full(len(close), np.nan)
+    if len(close) < 2 * period:
+        return out
+
+    plus, minus, true_range = _directional_movement(high, low, close)
+    decay = 1.0 - 1.0 / period
+    # Wilder sums: period-1 bars to start, then sum - sum / period + new
+    smoothed = [_recurse(v[period - 1:], decay, v[:period - 1].sum())
+                for v in (plus, minus, true_range)]
+    plus_s, minus_s, tr_s = smoothed
+    with np.errstate(divide='ignore', invalid='ignore'):
+        plus_di = 100.0 * (plus_s / tr_s)
+        minus_di = 100.0 * (minus_s / tr_s)
+        di_sum = minus_di + plus_di
+        dx = 100.0 * (np.abs(minus_di - plus_di) / di_sum)
+    valid = (np.abs(tr_s) >= EPSILON) & (np.abs(di_sum) >= EPSILON)
+    # smoothed[i] belongs to bar period + i
+    first = np.where(valid[:period], dx[:period], 0.0).sum() / period
+    rest = dx[period:]
+    if valid[period:].all():
+        adx = _recurse(rest, decay, first, 1.0 / period)
+    else:
+        # bars without a DX keep the previous ADX, which is not a filter
+        adx = np.empty(len(rest))
+        value = first
+        for i, ok in enumerate(valid[period:]):
+            if ok:
+                value = (value * (period - 1) + rest[i]) / period
+            adx[i] = value
+    out[2 * period - 1] = first
+    out[2 * period:] = adx
+    return out
+
+
+# --- Blueshift library API ------------------------------------------------
+
+def _field(px, name):
+    if hasattr(px, name):
+        return _array(getattr(px, name))
+    return _array(px)
+
+
+def sma(px, lookback):
+    """
+        Latest simple moving average of the close.
+    """
+    close = _field(px, 'close')
+    return sma_series(close[-int(lookback):], lookback)[-1]
+
+
+def ema(px, lookback):
+    """
+        Latest exponential moving average of the close.
+    """
+    return ema_series(_field(px, 'close'), lookback)[-1]
+
+
+def rsi(px, lookback):
+    """
+        Latest RSI of the close.
+    """
+    return rsi_series(_field(px, 'close'), lookback)[-1]
+
+
+def bollinger_band(px, lookback):
+    """
+        Latest (upper, middle, lower) Bollinger bands of the close, two
+        standard deviations wide.
+    """
+    close = _field(px, 'close')
+    upper, mid, lower = bbands_series(close[-int(lookback):], lookback)
+    return upper[-1], mid[-1], lower[-1]
+
+
+def adx(px, lookback):
+    """
+        Latest ADX.
+    """
+    return adx_series(_field(px, 'high'), _field(px, 'low'), _field(px, 'close'),
+                      lookback)[-1]
+
+
+def fibonacci_support(px):
+    """
+        Distance in percent from the last price down to the Fibonacci
+        retracement level below it and up to the level above it, over the
+        range of the earlier prices. -1 when there is no level on that side.
+    """
+    px = _array(px)
+    last_price = px[-1]
+    low, high = px[:-1].min(), px[:-1].max()
+    levels = [low + level * (high - low) for level in (0, 0.236, 0.382, 0.5, 0.618, 1)]
+
+    if last_price < levels[0]:
+        return -1, round(100.0 * (levels[0] / last_price - 1), 2)
+    if last_price > levels[-1]:
+        return round(100.0 * (last_price / levels[-1] - 1), 2), -1
+    idx = max(bisect.bisect_left(levels, last_price) - 1, 0)
+    return (round(100.0 * (last_price / levels[idx] - 1), 2),
+            round(100.0 * (levels[idx + 1] / last_price - 1), 2))
+
+
+# --- bar by bar ------------------------------------------------------------
+
+class StreamingIndicator(object):
+    """
+        Base of the running indicators: `push` one bar at a time, or
+        `update` with a whole `data.history` window to push only the bars
+        newer than the last one seen.
+
+        The last bar of a window may still be forming (today's daily bar),
+        so `update` keeps the state from before it and, when the next
+        window holds a bar with the same timestamp, pushes that bar again
+        on top of the saved state instead of skipping it. Saving is O(1):
+        `_state` copies the scalars only, and a subclass keeping a buffer
+        saves what undoes one push on it (`_restore` is only ever called
+        to take back the single push made after `_state`).
+    """
+    inputs = ('close',)
+
+    def __init__(self):
+        self.last_timestamp = None
+        self._before_last = None
+        self.reset()
+
+    def reset(self):
+        self.bars_seen = 0
+
+    def push(self, *values):
+        raise NotImplementedError
+
+    @property
+    def value(self):
+        raise NotImplementedError
+
+    def _state(self):
+        return dict((name, value) for name, value in vars(self).items()
+                    if name not in ('last_timestamp', '_before_last'))
+
+    def _restore(self, state):
+        vars(self).update(state)
+
+    def update(self, timestamps, *columns):
+        """
+            Push the bars of a window (oldest first, one array per input)
+            that were not seen yet, replacing the last bar seen if the
+            window has it again, and return the latest value. A window
+            that does not overlap the bars seen so far starts over.
+        """
+        timestamps = np.asarray(timestamps)
+        if len(timestamps) == 0:
+            return self.value
+        if self.last_timestamp is None:
+            first = 0
+        else:
+            first = int(np.searchsorted(timestamps, self.last_timestamp, side='left'))
+            if first < len(timestamps) and timestamps[first] == self.last_timestamp:
+                # the last bar seen may have changed: push it again
+                self._restore(self._before_last)
+            elif first == 0:
+                self.reset()
+            elif first == len(timestamps):
+                # nothing as recent as the bars seen
+                return self.value
+        self.last_timestamp = timestamps[-1]
+        columns = [_array(c)[first:].tolist() for c in columns]
+        rows = list(zip(*columns))
+        for values in rows[:-1]:
+            self.push(*values)
+        if rows:
+            self._before_last = self._state()
+            self.push(*rows[-1])
+        return self.value
+
+
+class EMA(StreamingIndicator):
+    """
+        Running `ema_series`.
+    """
+
+    def __init__(self, period):
+        self.period = _check_period(period)
+        self.k = 2.0 / (self.period + 1)
+        StreamingIndicator.__init__(self)
+
+    def reset(self):
+        StreamingIndicator.reset(self)
+        self._total = 0.0
+        self._value = np.nan
+
+    def push(self, x):
+        if x != x:
+            return self._value
+        self.bars_seen += 1
+        if self.bars_seen < self.period:
+            self._total += x
+        elif self.bars_seen == self.period:
+            self._total += x
+            self._value = self._total / self.period
+        else:
+            self._value = (x - self._value) * self.k + self._value
+        return self._value
+
+    @property
+    def value(self):
+        return self._value
+
+
+class RSI(StreamingIndicator):
+    """
+        Running `rsi_series`.
+    """
+
+    def __init__(self, period):
+        self.period = _check_period(period)
+        StreamingIndicator.__init__(self)
+
+    def reset(self):
+        StreamingIndicator.reset(self)
+        self._prev = None
+        self._gain = 0.0
+        self._loss = 0.0
+        self._value = np.nan
+
+    def push(self, x):
+        if x != x:
+            return self._value
+        self.bars_seen += 1
+        if self._prev is None:
+            self._prev = x
+            return self._value
+        change = x - self._prev
+        self._prev = x
+        n = self.period
+        if self.bars_seen <= n + 1:
+            if change < 0:
+                self._loss -= change
+            else:
+                self._gain += change
+            if self.bars_seen < n + 1:
+                return self._value
+            self._loss /= n
+            self._gain /= n
+        else:
+            self._loss *= n - 1
+            self._gain *= n - 1
+            if change < 0:
+                self._loss -= change
+            else:
+                self._gain += change
+            self._loss /= n
+            self._gain /= n
+        total = self._gain + self._loss
+        self._value = 100.0 * (self._gain / total) if abs(total) >= EPSILON else 0.0
+        return self._value
+
+    @property
+    def value(self):
+        return self._value
+
+
+class BollingerBands(StreamingIndicator):
+    """
+        Running `bbands_series` with running sums of the last `period`
+        values and of their squares.
+    """
+
+    def __init__(self, period, nbdev=2.0):
+        self.period = _check_period(period)
+        self.nbdev = nbdev
+        StreamingIndicator.__init__(self)
+
+    def reset(self):
+        StreamingIndicator.reset(self)
+        self._window = deque()
+        self._total = 0.0
+        self._total2 = 0.0
+        self._missing = 0
+        self._value = (np.nan, np.nan, np.nan)
+
+    def _state(self):
+        state = StreamingIndicator._state(self)
+        # a push appends to the window and, once it is full, drops the
+        # first value
+        window = self._window
+        state['_dropped'] = (window[0],) if len(window) == self.period - 1 else ()
+        return state
+
+    def _restore(self, state):
+        state = dict(state)
+        dropped = state.pop('_dropped')
+        StreamingIndicator._restore(self, state)
+        self._window.pop()
+        self._window.extendleft(dropped)
+
+    def push(self, x):
+        self.bars_seen += 1
+        window = self._window
+        window.append(x)
+        if x != x:
+            # kept out of the sums, the bands are NaN until it leaves
+            self._missing += 1
+        else:
+            self._total += x
+            self._total2 += x * x
+        if len(window) < self.period:
+            return self._value
+        mean = self._total / self.period
+        var = self._total2 / self.period - mean * mean
+        std = np.sqrt(var) if var >= EPSILON else 0.0
+        if self._missing:
+            mean = std = np.nan
+        old = window.popleft()
+        if old != old:
+            self._missing -= 1
+        elif self.bars_seen % RESUM_EVERY:
+            self._total -= old
+            self._total2 -= old * old
+        if not self.bars_seen % RESUM_EVERY:
+            # start the sums afresh now and then so that rounding errors
+            # do not pile up over a long stream
+            self._total = float(sum(v for v in window if v == v))
+            self._total2 = float(sum(v * v for v in window if v == v))
+        self._value = (mean + self.nbdev * std, mean, mean - self.nbdev * std)
+        return self._value
+
+    @property
+    def value(self):
+        return self._value
+
+
+class ADX(StreamingIndicator):
+    """
+        Running `adx_series`.
+    """
+    inputs = ('high', 'low', 'close')
+
+    def __init__(self, period):
+        self.period = _check_period(period)
+        StreamingIndicator.__init__(self)
+
+    def reset(self):
+        StreamingIndicator.reset(self)
+        self._prev = None
+        self._plus = 0.0
+        self._minus = 0.0
+        self._tr = 0.0
+        self._dx_total = 0.0
+        self._value = np.nan
+
+    def _dx(self):
+        if abs(self._tr) < EPSILON:
+            return None
+        minus_di = 100.0 * (self._minus / self._tr)
+        plus_di = 100.0 * (self._plus / self._tr)
+        total = minus_di + plus_di
+        if abs(total) < EPSILON:
+            return None
+        return 100.0 * (abs(minus_di - plus_di) / total)
+
+    def push(self, high, low, close):
+        if high != high or low != low or close != close:
+            return self._value
+        self.bars_seen += 1
+        if self._prev is None:
+            self._prev = (high, low, close)
+            return self._value
+        prev_high, prev_low, prev_close = self._prev
+        self._prev = (high, low, close)
+        up = high - prev_high
+        down = prev_low - low
+        true_range = max(high - low, abs(high - prev_close), abs(low - prev_close))
+
+        n = self.period
+        if self.bars_seen > n:
+            self._minus -= self._minus / n
+            self._plus -= self._plus / n
+        if down > 0 and up < down:
+            self._minus += down
+        elif up > 0 and up > down:
+            self._plus += up
+        if self.bars_seen > n:
+            self._tr = self._tr - self._tr / n + true_range
+        else:
+            self._tr += true_range
+            return self._value
+
+        dx = self._dx()
+        if self.bars_seen < 2 * n:
+            if dx is not None:
+                self._dx_total += dx
+        elif self.bars_seen == 2 * n:
+            if dx is not None:
+                self._dx_total += dx
+            self._value = self._dx_total / n
+        elif dx is not None:
+            self._value = (self._value * (n - 1) + dx) / n
+        return self._value
+
+    @property
+    def value(self):
+        return self._value
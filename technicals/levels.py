@@ -0,0 +1,351 @@
+"""
+    Support/resistance levels from pivot points.
+
+    Pivots are passed around as structured arrays of `PIVOT_DTYPE`
+    (index, price) and levels come back as `LEVEL_DTYPE`
+    (index, price, strength), so they can be built from years of history
+    and still be iterated like the old lists of tuples.
+
+    `LevelIndex` keeps levels sorted by price, so "which levels are within
+    tol of this price" and "is this price far from every level" are binary
+    searches rather than scans of all levels. Levels can be added one at a
+    time as pivots are confirmed and expired by age (their `index`, the
+    bar they were found at), and a `LevelIndex` of pivots clusters them
+    into levels without sorting them again.
+"""
+import bisect
+import heapq
+import math
+
+import numpy as np
+
+from technicals.pivots import PIVOT_DTYPE
+
+LEVEL_DTYPE = np.dtype([('index', np.int64), ('price', np.float64),
+                        ('strength', np.int64)])
+
+
+def _level_dtype(index):
+    """
+        `LEVEL_DTYPE` for bar numbers, the same fields with the dtype of
+        `index` for other labels (e.g. timestamps).
+    """
+    index = np.asarray(index)
+    if len(index) == 0 or index.dtype.kind in 'iubf':
+        return LEVEL_DTYPE
+    return np.dtype([('index', index.dtype), ('price', np.float64),
+                     ('strength', np.int64)])
+
+
+def as_pivot_array(pivots):
+    """
+        Convert a list of (index, price) tuples to a `PIVOT_DTYPE` array.
+    """
+    if isinstance(pivots, np.ndarray) and pivots.dtype == PIVOT_DTYPE:
+        return pivots
+    return np.array([(int(i), float(p)) for i, p in pivots], dtype=PIVOT_DTYPE)
+
+
+def cluster_levels(pivots, s):
+    """
+        Merge pivots whose prices are within `s` of each other into levels.
+
+        Same result as the old `assign_strength_remove_noise`: pivots are
+        walked in order of price, each one that has not been superseded
+        starts a cluster of the following pivots within `s`, the cluster is
+        represented by its most recent pivot and the strength is the number
+        of pivots in the cluster. The output is sorted by index.
+
+        Costs one sort, a binary search per pivot and a linear sweep, instead
+        of the nested loop over a growing blacklist.
+    """
+    pivots = as_pivot_array(pivots)
+    order = np.argsort(pivots['price'], kind='stable')
+    levels = _cluster_sorted(pivots['price'][order], pivots['index'][order], s)
+    return levels[np.argsort(levels['index'], kind='stable')]
+
+
+def _cluster_sorted(price, index, s):
+    """
+        `cluster_levels` of pivots already sorted by price (ties oldest
+        first), in the order of the pivots starting the clusters.
+    """
+    n = len(price)
+    if n == 0:
+        return np.empty(0, dtype=_level_dtype(index))
+    pos = np.arange(n)
+
+    # first pivot that is more than `s` above each one
+    end = np.maximum(np.searchsorted(price, price + s, side='right'), pos)
+    while True:
+        # price + s can round either way, settle on the exact comparison
+        back = (end > pos) & (price[end - 1] - price[pos] > s)
+        ahead = (end < n) & ~(price[np.minimum(end, n - 1)] - price[pos] > s)
+        if not (back.any() or ahead.any()):
+            break
+        end = end - back + ahead
+
+    # the old loop stopped one short when the cluster ran to the last pivot
+    strength = np.where(end < n, end - pos, n - 1 - pos)
+    stop = (pos + np.maximum(strength, 1)).tolist()
+
+    # within a cluster the representative moves to every later pivot with an
+    # index at least as large, so follow the "next greater or equal" chain
+    nge = _next_greater_equal(index)
+
+    # the original blacklisted index values, seeded with 0
+    blacklisted = set([0])
+    values = index.tolist()
+    starts = []
+    chosen = []
+    for i in range(n):
+        if values[i] in blacklisted:
+            continue
+        k = i
+        while nge[k] < stop[i]:
+            blacklisted.add(values[k])
+            k = nge[k]
+        starts.append(i)
+        chosen.append(k)
+
+    starts = np.asarray(starts, dtype=np.int64)
+    chosen = np.asarray(chosen, dtype=np.int64)
+    levels = np.empty(len(starts), dtype=_level_dtype(index))
+    levels['index'] = index[chosen]
+    levels['price'] = price[chosen]
+    levels['strength'] = strength[starts]
+    return levels
+
+
+def _next_greater_equal(values):
+    """
+        Position of the next element >= each element, len(values) if none.
+    """
+    values = values.tolist()
+    n = len(values)
+    out = [n] * n
+    stack = []
+    for k, v in enumerate(values):
+        while stack and values[stack[-1]] <= v:
+            out[stack.pop()] = k
+        stack.append(k)
+    return out
+
+
+class LevelIndex(object):
+    """
+        Levels sorted by price, with the bar (or label) each was found at
+        and its strength.
+
+        Levels are kept in blocks of at most 2 * `LOAD` sorted
+        (price, seq, index, strength) tuples, with the last tuple of every
+        block in `_maxes`. An insert bisects `_maxes` and then one block,
+        so it moves at most a block of entries instead of all of them;
+        `seq` numbers the inserts and keeps levels of equal price in the
+        order they came. A heap of (index, seq) gives the oldest levels to
+        `expire`. Levels with a NaN price sort after all the others and are
+        never near any price.
+    """
+    LOAD = 256
+
+    def __init__(self, levels=None):
+        self._blocks = []
+        self._maxes = []
+        self._nan = []
+        self._ages = []
+        self._seq = 0
+        self._len = 0
+        self._array = None
+        if levels is not None:
+            self.extend(levels)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return iter(self.as_array())
+
+    def _entries(self):
+        for block in self._blocks:
+            for entry in block:
+                yield entry
+        for entry in self._nan:
+            yield entry
+
+    @staticmethod
+    def _to_array(entries):
+        index = [e[2] for e in entries]
+        levels = np.empty(len(entries), dtype=_level_dtype(index))
+        levels['index'] = index
+        levels['price'] = [e[0] for e in entries]
+        levels['strength'] = [e[3] for e in entries]
+        return levels
+
+    def as_array(self):
+        """
+            The levels sorted by price (read-only, rebuilt after a change).
+        """
+        if self._array is None:
+            self._array = self._to_array(list(self._entries()))
+            self._array.flags.writeable = False
+        return self._array
+
+    def _insert(self, entry):
+        blocks, maxes = self._blocks, self._maxes
+        if not blocks:
+            blocks.append([entry])
+            maxes.append(entry)
+            return
+        k = bisect.bisect_left(maxes, entry)
+        if k == len(blocks):
+            k -= 1
+            blocks[k].append(entry)
+            maxes[k] = entry
+        else:
+            bisect.insort(blocks[k], entry)
+        if len(blocks[k]) > 2 * self.LOAD:
+            half = blocks[k][self.LOAD:]
+            del blocks[k][self.LOAD:]
+            blocks.insert(k + 1, half)
+            maxes[k] = blocks[k][-1]
+            maxes.insert(k + 1, half[-1])
+
+    def _remove(self, price, seq):
+        if price != price:
+            self._nan = [e for e in self._nan if e[1] != seq]
+            return
+        blocks, maxes = self._blocks, self._maxes
+        key = (price, seq)
+        k = bisect.bisect_left(maxes, key)
+        block = blocks[k]
+        del block[bisect.bisect_left(block, key)]
+        if not block:
+            del blocks[k]
+            del maxes[k]
+            return
+        maxes[k] = block[-1]
+        if len(block) < self.LOAD // 2 and k + 1 < len(blocks):
+            # fold a small block into the next one, split again if too big
+            block.extend(blocks.pop(k + 1))
+            del maxes[k + 1]
+            maxes[k] = block[-1]
+            if len(block) > 2 * self.LOAD:
+                half = block[self.LOAD:]
+                del block[self.LOAD:]
+                blocks.insert(k + 1, half)
+                maxes[k] = block[-1]
+                maxes.insert(k + 1, half[-1])
+
+    def add(self, index, price, strength=1):
+        """
+            Insert one level, after any level with the same price. `index`
+            is the bar number the level was found at, or any other label
+            ordered like the bars (e.g. a timestamp).
+        """
+        price = float(price)
+        entry = (price, self._seq, index, int(strength))
+        self._seq += 1
+        if price != price:
+            self._nan.append(entry)
+        else:
+            self._insert(entry)
+        heapq.heappush(self._ages, (index, entry[1], price))
+        self._len += 1
+        self._array = None
+
+    def extend(self, levels):
+        """
+            Insert many levels (`LEVEL_DTYPE`, or (index, price) pivots
+            with strength 1), in their order.
+        """
+        if not (isinstance(levels, np.ndarray) and levels.dtype.names == LEVEL_DTYPE.names):
+            pivots = as_pivot_array(levels)
+            levels = np.empty(len(pivots), dtype=LEVEL_DTYPE)
+            levels['index'] = pivots['index']
+            levels['price'] = pivots['price']
+            levels['strength'] = 1
+        for index, price, strength in zip(levels['index'].tolist(), levels['price'].tolist(),
+                                          levels['strength'].tolist()):
+            self.add(index, price, strength)
+
+    def expire(self, before):
+        """
+            Drop the levels found before bar `before`; returns how many.
+        """
+        ages = self._ages
+        dropped = 0
+        while ages and ages[0][0] < before:
+            _, seq, price = heapq.heappop(ages)
+            self._remove(price, seq)
+            dropped += 1
+        if dropped:
+            self._len -= dropped
+            self._array = None
+        return dropped
+
+    def _span(self, price, tol):
+        """
+            The entries with abs(price - level) < tol, by price.
+        """
+        # candidates within tol plus a few ulps, price - tol can round
+        # either way; the exact test decides the levels at the edges
+        price, tol = float(price), float(tol)
+        margin = 4 * math.ulp(abs(price) + tol)
+        lo, hi = (price - tol - margin,), price + tol + margin
+        blocks = self._blocks
+        found = []
+        k = bisect.bisect_left(self._maxes, lo)
+        if k == len(blocks):
+            return found
+        at = bisect.bisect_left(blocks[k], lo)
+        for block in blocks[k:]:
+            for entry in block[at:] if at else block:
+                if entry[0] > hi:
+                    return found
+                if abs(price - entry[0]) < tol:
+                    found.append(entry)
+            at = 0
+        return found
+
+    def within(self, price, tol, min_strength=1):
+        """
+            The levels with abs(price - level) < tol and at least
+            `min_strength`, sorted by price.
+        """
+        return self._to_array([e for e in self._span(price, tol) if e[3] >= min_strength])
+
+    def is_far(self, price, tol):
+        """
+            True when no level is within tol of `price`.
+        """
+        return len(self._span(price, tol)) == 0
+
+    def nearest(self, price):
+        """
+            The level closest to `price`, None when there are none.
+        """
+        blocks = self._blocks
+        if not blocks:
+            return None
+        key = (float(price),)
+        k = bisect.bisect_left(self._maxes, key)
+        if k == len(blocks):
+            candidates = [blocks[-1][-1]]
+        else:
+            at = bisect.bisect_left(blocks[k], key)
+            candidates = [blocks[k][at]]
+            if at:
+                candidates.insert(0, blocks[k][at - 1])
+            elif k:
+                candidates.insert(0, blocks[k - 1][-1])
+        candidates = self._to_array(candidates)
+        return candidates[int(np.argmin(np.abs(candidates['price'] - price)))]
+
+    def cluster(self, s):
+        """
+            `cluster_levels(pivots, s)` of the levels held, taken as pivots,
+            without sorting them again; levels come in the order of the
+            lowest price of their cluster.
+        """
+        levels = self.as_array()
+        return _cluster_sorted(levels['price'], levels['index'], s)
@@ -0,0 +1,262 @@
+"""
+    Local cache of downloaded bars.
+
+    Every (symbol, interval) has a directory of Parquet files, one per
+    date range it covers, named `<first day>-<day after the last>.parquet`.
+    A request for a date range fetches only the parts no file covers
+    (from Yahoo through `yfinance` by default), then merges the new bars
+    with the files they overlap or touch into a single file, so a symbol
+    that is always asked for the same years ends up as one file read in
+    one go. Today's bars may still change, so requests stop at yesterday
+    unless they ask for today, whose bars are then fetched every time and
+    never stored; a notebook rerun the same day sees the same data and
+    needs no network once the range is cached.
+
+    `download` is a drop-in for `yf.download` / `yf.Ticker(...).history`
+    in the notebooks (Title-case columns), `load_bars` gives the harness
+    lower-case frames for `MinuteBars.from_frames`. Both read through the
+    same cache, in `$TECHNICALS_DATA_CACHE` or `.data_cache` next to the
+    repository.
+"""
+import datetime
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.environ.get('TECHNICALS_DATA_CACHE') or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.data_cache')
+
+COLUMNS = ('open', 'high', 'low', 'close', 'adj_close', 'volume', 'dividends', 'splits')
+YAHOO_COLUMNS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close',
+                 'adj_close': 'Adj Close', 'volume': 'Volume', 'dividends': 'Dividends',
+                 'splits': 'Stock Splits'}
+
+_SEGMENT = re.compile(r'^(\d{8})-(\d{8})\.parquet$')
+_PERIOD = re.compile(r'^(\d+)(d|wk|mo|y)$')
+# the first day yfinance's period='max' goes back to
+EARLIEST = np.datetime64('1950-01-01')
+
+
+def _day(value):
+    return np.datetime64(pd.Timestamp(value).date(), 'D')
+
+
+def _today():
+    return np.datetime64(datetime.date.today(), 'D')
+
+
+def date_range(start=None, end=None, period=None):
+    """
+        [first, last) days of a request given like to `yf.download`: `end`
+        is exclusive and defaults to tomorrow, `period` ('10y', '6mo',
+        '5d', 'max') counts back from `end` when there is no `start`.
+    """
+    end = _day(end) if end is not None else _today() + 1
+    if start is not None:
+        return _day(start), end
+    if period is None or period == 'max':
+        return EARLIEST, end
+    match = _PERIOD.match(str(period))
+    if match is None:
+        raise ValueError('unsupported period {!r}'.format(period))
+    n, unit = int(match.group(1)), match.group(2)
+    offset = {'d': pd.DateOffset(days=n), 'wk': pd.DateOffset(weeks=n),
+              'mo': pd.DateOffset(months=n), 'y': pd.DateOffset(years=n)}[unit]
+    return _day(pd.Timestamp(end) - offset), end
+
+
+def normalize(frame):
+    """
+        Bars with the cache's lower-case columns, float values and a
+        sorted, unique, timezone-naive index (exchange local time).
+    """
+    frame = frame.copy()
+    if isinstance(frame.columns, pd.MultiIndex):
+        # yf.download of one symbol: (field, ticker) columns
+        frame.columns = frame.columns.get_level_values(0)
+    frame.columns = [str(c).strip().lower().replace(' ', '_') for c in frame.columns]
+    frame = frame.rename(columns={'stock_splits': 'splits'})
+    frame = frame[[c for c in COLUMNS if c in frame.columns]].astype(float)
+    index = pd.DatetimeIndex(frame.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    frame.index = index.rename('timestamp')
+    frame = frame[~frame.index.duplicated(keep='last')]
+    return frame.sort_index()
+
+
+def yahoo_fetch(symbol, interval, start, end):
+    """
+        Unadjusted bars of `symbol` in [start, end) from Yahoo, with the
+        adjusted close, dividends and splits.
+    """
+    import yfinance
+    frame = yfinance.Ticker(symbol).history(interval=interval, start=str(start),
+                                            end=str(end), auto_adjust=False, actions=True)
+    return normalize(frame)
+
+
+def _concat(frames):
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame(columns=list(COLUMNS), dtype=float,
+                            index=pd.DatetimeIndex([], name='timestamp'))
+    if len(frames) == 1:
+        return frames[0]
+    return normalize(pd.concat(frames))
+
+
+class BarCache(object):
+    """
+        Bars of (symbol, interval) by date range, kept in `root` and
+        fetched with `fetch(symbol, interval, start, end)` when missing.
+        `fetches` counts the calls made to `fetch`.
+    """
+
+    def __init__(self, root=ROOT, fetch=yahoo_fetch):
+        self.root = root
+        self.fetch = fetch
+        self.fetches = 0
+
+    def _directory(self, symbol, interval):
+        return os.path.join(self.root, interval, symbol.replace(os.sep, '_'))
+
+    def segments(self, symbol, interval):
+        """
+            (first, last, path) of the cached files, sorted by first day.
+        """
+        folder = self._directory(symbol, interval)
+        if not os.path.isdir(folder):
+            return []
+        out = []
+        for name in os.listdir(folder):
+            match = _SEGMENT.match(name)
+            if match:
+                first, last = (np.datetime64('{}-{}-{}'.format(d[:4], d[4:6], d[6:]), 'D')
+                               for d in match.groups())
+                out.append((first, last, os.path.join(folder, name)))
+        return sorted(out)
+
+    def _write(self, symbol, interval, first, last, frame):
+        folder = self._directory(symbol, interval)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        name = '{}-{}.parquet'.format(str(first).replace('-', ''), str(last).replace('-', ''))
+        path = os.path.join(folder, name)
+        partial = path + '.partial'
+        frame.to_parquet(partial, compression='zstd')
+        os.replace(partial, path)
+        return path
+
+    def gaps(self, segments, first, last):
+        """
+            The parts of [first, last) no segment covers.
+        """
+        out = []
+        cursor = first
+        for seg_first, seg_last, _ in segments:
+            if seg_last <= cursor or seg_first >= last:
+                continue
+            if seg_first > cursor:
+                out.append((cursor, seg_first))
+            cursor = max(cursor, seg_last)
+        if cursor < last:
+            out.append((cursor, last))
+        return out
+
+    def get(self, symbol, interval, start=None, end=None, period=None, today=False):
+        """
+            Normalized bars of `symbol` in [start, end), see `date_range`,
+            and up to yesterday unless `today`.
+        """
+        first, last = date_range(start, end, period)
+        if not today:
+            last = min(last, _today())
+        # ranges up to today are complete, today's bars may still change
+        complete = min(last, _today())
+        segments = self.segments(symbol, interval)
+        gaps = self.gaps(segments, first, last)
+        fresh = [self._fetch(symbol, interval, a, b) for a, b in gaps]
+
+        loaded = {}
+        if any(a < complete for a, _ in gaps):
+            # one file for the requested range and every file it touches
+            touching = [s for s in segments if s[1] >= first and s[0] <= complete]
+            merged_first = min([first] + [s[0] for s in touching])
+            merged_last = max([complete] + [s[1] for s in touching])
+            merged = _concat([pd.read_parquet(path) for _, _, path in touching] + fresh)
+            merged = merged[merged.index < pd.Timestamp(merged_last)]
+            path = self._write(symbol, interval, merged_first, merged_last, merged)
+            for _, _, old in touching:
+                if old != path:
+                    os.remove(old)
+            segments = [s for s in segments if s not in touching]
+            segments.append((merged_first, merged_last, path))
+            loaded[path] = merged
+            # only today's bars are not in the file
+            fresh = [f[f.index >= pd.Timestamp(merged_last)] for f in fresh]
+
+        parts = [loaded[path] if path in loaded else pd.read_parquet(path)
+                 for seg_first, seg_last, path in sorted(segments)
+                 if seg_last > first and seg_first < last]
+        out = _concat(parts + fresh)
+        index = out.index
+        return out[(index >= pd.Timestamp(first)) & (index < pd.Timestamp(last))]
+
+    def _fetch(self, symbol, interval, first, last):
+        self.fetches += 1
+        return normalize(self.fetch(symbol, interval, first, last))
+
+
+_caches = {}
+
+
+def bar_cache(root=None):
+    """
+        The `BarCache` of `root` (the default cache when None), shared by
+        all callers in the process.
+    """
+    root = root or ROOT
+    if root not in _caches:
+        _caches[root] = BarCache(root)
+    return _caches[root]
+
+
+def download(symbol, start=None, end=None, period=None, interval='1d', auto_adjust=True,
+             today=False, cache=None):
+    """
+        Bars of `symbol` like `yf.Ticker(symbol).history(...)`: Title-case
+        columns, prices adjusted for splits and dividends unless
+        `auto_adjust` is False, in which case they come as traded together
+        with 'Adj Close' (like `yf.download` and `web.get_data_yahoo`).
+    """
+    cache = cache or bar_cache()
+    frame = cache.get(symbol, interval, start, end, period, today)
+    if auto_adjust and 'adj_close' in frame.columns:
+        frame = frame.copy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = frame['adj_close'] / frame['close']
+        for field in ('open', 'high', 'low'):
+            if field in frame.columns:
+                frame[field] = frame[field] * ratio
+        frame['close'] = frame['adj_close']
+        frame = frame.drop(columns='adj_close')
+    frame = frame.rename(columns=YAHOO_COLUMNS)
+    frame.index = frame.index.rename('Date' if interval.endswith(('d', 'wk', 'mo'))
+                                     else 'Datetime')
+    return frame
+
+
+def load_bars(symbols, interval='1m', start=None, end=None, period=None, today=False,
+              cache=None):
+    """
+        {symbol: bars} with the cache's lower-case columns, e.g. for
+        `MinuteBars.from_frames` (which uses open/high/low/close/volume).
+    """
+    cache = cache or bar_cache()
+    if isinstance(symbols, str):
+        symbols = [symbols]
+    return dict((symbol, cache.get(symbol, interval, start, end, period, today))
+                for symbol in symbols)
@@ -0,0 +1,228 @@
+"""
+    Whole-series pivot detection.
+
+    `pivot_ids` returns the same codes as the per-candle `pivotId` helpers
+    that used to live in the strategies and notebooks:
+
+        0 - not a pivot (or too close to either end of the series)
+        1 - pivot low  : low[candle] <= every low in the window
+        2 - pivot high : high[candle] >= every high in the window
+        3 - both
+
+    The window of a candle is `[candle - num_before, candle + num_after)`,
+    i.e. it includes the candle itself and stops one bar short of
+    `candle + num_after`, exactly like the original loop. Candles with
+    `candle - num_before < 0` or `candle + num_after >= len(high)` are 0.
+"""
+import itertools
+from collections import deque
+
+import numpy as np
+
+PIVOT_NONE = 0
+PIVOT_LOW = 1
+PIVOT_HIGH = 2
+PIVOT_BOTH = 3
+
+# (bar index, price) of a pivot, see technicals.levels
+PIVOT_DTYPE = np.dtype([('index', np.int64), ('price', np.float64)])
+
+
+def rolling_min(x, window):
+    """
+        Minimum of every full window `x[i:i+window]`, ignoring NaNs.
+
+        Uses the van Herk/Gil-Werman block trick (block prefix and suffix
+        minimums), so the cost is O(n) regardless of the window length.
+        Returns an array of length `len(x) - window + 1`.
+    """
+    return _rolling_extreme(np.asarray(x, dtype=float), window, np.fmin, np.inf)
+
+
+def rolling_max(x, window):
+    """
+        Maximum of every full window `x[i:i+window]`, ignoring NaNs.
+        See `rolling_min`.
+    """
+    return _rolling_extreme(np.asarray(x, dtype=float), window, np.fmax, -np.inf)
+
+
+def _rolling_extreme(x, window, op, fill):
+    n = len(x)
+    if window < 1:
+        raise ValueError('window must be at least 1, got {}'.format(window))
+    if n < window:
+        return np.empty(0, dtype=float)
+    if window == 1:
+        return x.copy()
+
+    blocks = -(-n // window)
+    padded = np.full(blocks * window, fill)
+    padded[:n] = x
+    padded = padded.reshape(blocks, window)
+
+    prefix = op.accumulate(padded, axis=1).ravel()
+    suffix = op.accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+
+    start = np.arange(n - window + 1)
+    out = op(suffix[start], prefix[start + window - 1])
+    # a window made only of NaNs has no extreme at all
+    out[np.isinf(out) & (out == fill)] = np.nan
+    return out
+
+
+def pivot_ids(high, low, num_before, num_after):
+    """
+        Pivot code (0/1/2/3) of every candle, computed in one pass.
+        Drop-in replacement for calling `pivotId` on each candle.
+    """
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    n = len(high)
+    ids = np.zeros(n, dtype=np.int8)
+
+    first = num_before
+    last = n - num_after - 1
+    if last < first:
+        return ids
+
+    candles = slice(first, last + 1)
+    window = num_before + num_after
+    if window < 1:
+        # empty window: nothing can disqualify a candle
+        ids[candles] = PIVOT_BOTH
+        return ids
+
+    count = last - first + 1
+    window_low = rolling_min(low, window)[:count]
+    window_high = rolling_max(high, window)[:count]
+
+    # written as "no bar in the window beats the candle" so that NaNs
+    # behave the way they did in the scalar loop
+    is_low = ~(low[candles] > window_low)
+    is_high = ~(high[candles] < window_high)
+
+    ids[candles] = is_low * PIVOT_LOW + is_high * PIVOT_HIGH
+    return ids
+
+
+def pivot_points(high, low, num_before, num_after, start=0, stop=None,
+                 codes=(PIVOT_LOW, PIVOT_HIGH)):
+    """
+        Candle indices in `[start, stop)` whose pivot code is in `codes`,
+        together with the code array itself.
+    """
+    ids = pivot_ids(high, low, num_before, num_after)
+    stop = len(ids) if stop is None else stop
+    if stop < 0:
+        stop = max(len(ids) + stop, 0)
+    idx = np.flatnonzero(np.isin(ids[start:stop], codes)) + start
+    return idx, ids
+
+
+class PivotTracker(object):
+    """
+        Streaming pivot detection for one security.
+
+        Feed it the same rolling window you get from `data.history` on every
+        call. Only the bars that arrived since the previous call are looked
+        at: a candle is confirmed once `margin` bars (at least the pivot
+        window) have closed after it, is checked exactly once (so pivots
+        are never duplicated) and is dropped again once it is older than
+        `lookback` bars.
+
+        Pivots are keyed by an absolute bar number that keeps counting up
+        across calls, so their order (and hence "which pivot is more recent")
+        is stable even though the window itself slides.
+    """
+
+    def __init__(self, num_before, num_after, lookback, margin=None,
+                 codes=(PIVOT_LOW, PIVOT_HIGH)):
+        self.num_before = num_before
+        self.num_after = num_after
+        self.lookback = lookback
+        # a candle needs its whole window on screen before it can be judged
+        self.margin = max(num_before, num_after, margin or 0)
+        self.codes = codes
+        self.bars_seen = 0
+        self.last_timestamp = None
+        # the very first window also keeps `margin` bars clear at its start
+        self._next_candle = self.margin
+        self._index = deque()
+        self._price = deque()
+
+    def __len__(self):
+        return len(self._index)
+
+    def update(self, timestamps, high, low):
+        """
+            Consume a window of bars (oldest first) and return the number of
+            new pivots confirmed by it.
+        """
+        high = np.asarray(high, dtype=float)
+        low = np.asarray(low, dtype=float)
+        n = len(high)
+        if n == 0:
+            return 0
+
+        timestamps = np.asarray(timestamps)
+        if self.last_timestamp is None:
+            new_bars = n
+        else:
+            new_bars = n - np.searchsorted(timestamps, self.last_timestamp,
+                                           side='right')
+        if new_bars <= 0:
+            return 0
+
+        self.bars_seen += int(new_bars)
+        self.last_timestamp = timestamps[-1]
+        window_start = self.bars_seen - n
+
+        first = max(self._next_candle, window_start + self.num_before)
+        last = self.bars_seen - 1 - self.margin
+        added = 0
+        if last >= first:
+            lo = first - window_start - self.num_before
+            hi = last - window_start + self.num_after + 1
+            ids = pivot_ids(high[lo:hi], low[lo:hi], self.num_before,
+                            self.num_after)
+            offset = first - window_start - lo
+            found = np.flatnonzero(np.isin(ids[offset:offset + last - first + 1],
+                                           self.codes))
+            for k in found:
+                j = first - window_start + k
+                self._index.append(first + int(k))
+                self._price.append(low[j] if ids[offset + k] == PIVOT_LOW else high[j])
+            added = len(found)
+            self._next_candle = last + 1
+
+        self._evict()
+        return added
+
+    def _evict(self):
+        oldest = self.bars_seen - self.lookback
+        while self._index and self._index[0] < oldest:
+            self._index.popleft()
+            self._price.popleft()
+
+    def pivots(self):
+        """
+            Live pivots as a list of (bar number, price), oldest first.
+        """
+        return list(zip(self._index, self._price))
+
+    def as_array(self, last=None):
+        """
+            Live pivots (the `last` ones only, if given) as a `PIVOT_DTYPE`
+            array, oldest first.
+        """
+        if last is None:
+            index, price = self._index, self._price
+        else:
+            last = min(int(last), len(self._index))
+            index = list(itertools.islice(reversed(self._index), last))[::-1]
+            price = list(itertools.islice(reversed(self._price), last))[::-1]
+        out = np.empty(len(index), dtype=PIVOT_DTYPE)
+        out['index'] = index
+        out['price'] = price
+        return out
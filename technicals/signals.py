@@ -0,0 +1,111 @@
+"""
+    Strategy signals for a whole universe at once.
+
+    The functions take prices as one (security x time x field) array, e.g.
+    `HistoryWindow.tensor()` or `price_tensor(...)` from
+    `technicals.history`, with `fields` naming the last axis, and return one
+    value per security. They give the same answers as the per-security
+    `signal_function` of the strategy they come from, without a Python loop
+    over the securities.
+"""
+import numpy as np
+
+from technicals.candles import candle_patterns, BULLISH_MARUBOZU, BEARISH_MARUBOZU
+
+OHLC = ('open', 'high', 'low', 'close')
+
+
+def _field(prices, fields, name):
+    return np.asarray(prices, dtype=float)[..., list(fields).index(name)]
+
+
+def cup_handle_signals(prices, fields=OHLC, base_lag=60):
+    """
+        1 where the cup-and-handle rule of CupHandle.py holds on the latest
+        bar, 0 elsewhere.
+
+        The cup bottom is the lowest close of the window, the handle top
+        the highest close after it and the handle bottom the lowest close
+        after that. The pattern needs the handle top within 10% of the
+        close `base_lag` bars ago, the last close above the handle bottom
+        and a cup at least three times as deep as the handle.
+    """
+    close = _field(prices, fields, 'close')
+    n, length = close.shape
+    rows = np.arange(n)
+    pos = np.arange(length)
+
+    base = close[:, -base_lag]
+    cup_index = close.argmin(axis=1)
+    cup = close[rows, cup_index]
+    after_cup = np.where(pos >= cup_index[:, None], close, -np.inf)
+    top_index = after_cup.argmax(axis=1)
+    top = close[rows, top_index]
+    handle = np.where(pos >= top_index[:, None], close, np.inf).min(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = top / base
+        depth = (top - cup) / (top - handle)
+    return ((ratio > 0.9) & (close[:, -1] > handle) & (depth > 3)).astype(int)
+
+
+def marubozu_signals(prices, fields=OHLC):
+    """
+        1 for a bullish and -1 for a bearish marubozu on the latest bar,
+        0 otherwise (the rule of Marubozu.py).
+    """
+    signals = np.zeros(len(prices), dtype=int)
+    if np.shape(prices)[1] == 0:
+        return signals
+    bits = candle_patterns(_field(prices, fields, 'open'),
+                           _field(prices, fields, 'high'),
+                           _field(prices, fields, 'low'),
+                           _field(prices, fields, 'close'), tail=1,
+                           patterns=BULLISH_MARUBOZU | BEARISH_MARUBOZU)[:, -1]
+    signals[(bits & BULLISH_MARUBOZU) != 0] = 1
+    signals[(bits & BEARISH_MARUBOZU) != 0] = -1
+    return signals
+
+
+def reversal_scores(prices, fields=('open',), field='open'):
+    """
+        Fall of the latest `field` value from its high over the window, as
+        a fraction of that high (the ranking of Short_term_reversal.py).
+        NaN for securities without data.
+    """
+    values = _field(prices, fields, field)
+    if values.shape[1] == 0:
+        return np.full(len(values), np.nan)
+    high = np.fmax.reduce(values, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (high - values[:, -1]) / high
+
+
+def top_k(scores, k):
+    """
+        Indices of the `k` highest scores, highest first, ties in index
+        order and NaNs last: the first `k` of a stable sort of -scores,
+        found with a partition in O(n) instead of a full sort.
+    """
+    scores = np.asarray(scores, dtype=float)
+    key = np.where(np.isnan(scores), np.inf, -scores)
+    k = max(min(int(k), len(key)), 0)
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    kth = np.partition(key, k - 1)[k - 1]
+    chosen = np.flatnonzero(key < kth)
+    # equal keys at the boundary go by index, like in the stable sort
+    ties = np.flatnonzero(key == kth)[:k - len(chosen)]
+    chosen = np.concatenate([chosen, ties])
+    return chosen[np.argsort(key[chosen], kind='stable')]
+
+
+def basket_changes(current, selected):
+    """
+        Members of `current` that are not in `selected` (to sell) and
+        members of `selected` that are not in `current` (to buy), each in
+        its original order.
+    """
+    current_set, selected_set = set(current), set(selected)
+    return ([s for s in current if s not in selected_set],
+            [s for s in selected if s not in current_set])
@@ -0,0 +1,120 @@
+"""
+    Causal Savitzky-Golay smoothing.
+
+    `scipy.signal.savgol_filter` fits each polynomial around the bar it
+    smooths, so the last bars of a window are smoothed with a fit to the
+    window edge and change as new bars come in: a backtest smoothing the
+    whole window every tick sees values that live trading never had.
+
+    Here every output is the value at its own bar of the least squares
+    polynomial fitted to the `window` bars ending there, i.e. one dot
+    product with a fixed coefficient vector. Outputs never change once
+    made, and a stream pays one dot product per new bar. The first
+    window-1 bars are fitted to the bars available so far (with the order
+    capped below their number, so the very first ones come out unchanged).
+"""
+import functools
+
+import numpy as np
+from scipy.signal import savgol_coeffs
+
+from technicals.indicators import StreamingIndicator
+
+
+@functools.lru_cache(maxsize=None)
+def causal_coeffs(window, polyorder):
+    """
+        Read-only weights of the last `window` values (oldest first) giving
+        the fitted value at the last of them.
+    """
+    window = int(window)
+    polyorder = min(int(polyorder), window - 1)
+    if window < 1 or polyorder < 0:
+        raise ValueError('window must be at least 1, got {}'.format(window))
+    coeffs = savgol_coeffs(window, polyorder, pos=window - 1, use='dot')
+    coeffs.flags.writeable = False
+    return coeffs
+
+
+def causal_savgol(x, window, polyorder):
+    """
+        Causal Savitzky-Golay smoothing of the whole series `x`.
+    """
+    x = np.asarray(x, dtype=float)
+    window = int(window)
+    out = np.empty(len(x))
+    warm_up = min(window - 1, len(x))
+    for i in range(warm_up):
+        out[i] = causal_coeffs(i + 1, polyorder) @ x[:i + 1]
+    if len(x) >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(x, window)
+        out[window - 1:] = windows @ causal_coeffs(window, polyorder)
+    return out
+
+
+class CausalSavgol(StreamingIndicator):
+    """
+        Running `causal_savgol`. `values` holds the last `keep` outputs
+        (oldest first), aligned with the last `keep` bars pushed; the last
+        one follows the forming bar until the next bar opens.
+    """
+
+    def __init__(self, window, polyorder, keep=1):
+        self.window = int(window)
+        self.polyorder = int(polyorder)
+        self.keep = max(int(keep), 1)
+        causal_coeffs(self.window, self.polyorder)
+        StreamingIndicator.__init__(self)
+
+    def reset(self):
+        StreamingIndicator.reset(self)
+        # twice the size needed, compacted when full, so that the last
+        # inputs and outputs are always contiguous
+        self._inputs = np.empty(2 * self.window)
+        self._outputs = np.empty(2 * self.keep)
+        self._input_end = 0
+        self._output_end = 0
+
+    @staticmethod
+    def _compact(buffer, end, size):
+        if end == len(buffer):
+            buffer[:size - 1] = buffer[end - size + 1:end]
+            end = size - 1
+        return end
+
+    @classmethod
+    def _append(cls, buffer, end, size, value):
+        end = cls._compact(buffer, end, size)
+        buffer[end] = value
+        return end + 1
+
+    def _state(self):
+        # make room now, so that the next push only writes past the ends
+        # and restoring them takes it back
+        self._input_end = self._compact(self._inputs, self._input_end, self.window)
+        self._output_end = self._compact(self._outputs, self._output_end, self.keep)
+        return StreamingIndicator._state(self)
+
+    def push(self, x):
+        self.bars_seen += 1
+        self._input_end = self._append(self._inputs, self._input_end, self.window, x)
+        n = min(self.bars_seen, self.window)
+        value = causal_coeffs(n, self.polyorder) @ self._inputs[self._input_end - n:self._input_end]
+        self._output_end = self._append(self._outputs, self._output_end, self.keep, value)
+        return value
+
+    @property
+    def value(self):
+        if self._output_end == 0:
+            return np.nan
+        return self._outputs[self._output_end - 1]
+
+    @property
+    def values(self):
+        """
+            Read-only view of the last `keep` outputs.
+        """
+        n = min(self.bars_seen, self.keep)
+        view = self._outputs[self._output_end - n:self._output_end]
+        view.flags.writeable = False
+        return view
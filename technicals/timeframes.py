@@ -0,0 +1,315 @@
+"""
+    Higher timeframe bars built from the minute stream.
+
+    `BarAggregator` keeps, per timeframe (1m, 5m, 15m, 30m, 1h, 1d), the
+    last closed bars of every security plus the bar still forming. Each
+    `update(data)` asks the data layer only for the minutes since the
+    previous call and folds them into every timeframe at once: the open
+    bar takes the new high, low, close and volume, and is closed when its
+    last minute arrives (or a minute of a later bar does). Any `(bar_count,
+    frequency)` window up to the declared lookback is then served from
+    memory, as a `HistoryWindow` whose arrays are views of the aggregate.
+
+    Intraday bars start at the session open (09:15, 09:20, ... for 5m;
+    09:15, 10:15, ..., 15:15 for 1h, whose last bar is 15 minutes long)
+    and are labelled with their first minute, like the minute bars; daily
+    bars are labelled with the session date. The first update fills the
+    intraday timeframes from one minute fetch and the daily one from one
+    daily fetch; after that only minutes are read.
+"""
+import numpy as np
+import pandas as pd
+
+from technicals.history import HistoryWindow, _window_arrays
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+DAILY = None
+TIMEFRAMES = {'1m': 1, '5m': 5, '15m': 15, '30m': 30, '1h': 60, '60m': 60, '1d': DAILY}
+
+SESSION_OPEN = '09:15'
+SESSION_CLOSE = '15:30'
+
+_MINUTE = np.timedelta64(1, 'm')
+
+
+def parse_timeframe(frequency):
+    """
+        Minutes per bar of a frequency string, DAILY (None) for daily bars.
+    """
+    freq = str(frequency).strip().lower()
+    freq = {'m': '1m', 'minute': '1m', '1min': '1m', 'day': '1d', 'daily': '1d', 'd': '1d'}.get(freq, freq)
+    if freq not in TIMEFRAMES:
+        raise ValueError('unsupported frequency {!r}'.format(frequency))
+    return TIMEFRAMES[freq]
+
+
+def _clock(text):
+    hours, minutes = str(text).split(':')
+    return np.timedelta64(int(hours) * 60 + int(minutes), 'm')
+
+
+def reduce_segments(values, starts, field):
+    """
+        Aggregate the columns of `values` (rows x minutes) into one bar per
+        segment beginning at each entry of `starts`, OHLCV style and
+        ignoring NaNs.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.shape[1] == 0 or len(starts) == 0:
+        return np.empty((values.shape[0], 0))
+    if field == 'high':
+        return np.fmax.reduceat(values, starts, axis=1)
+    if field == 'low':
+        return np.fmin.reduceat(values, starts, axis=1)
+    if field == 'volume':
+        return np.add.reduceat(np.nan_to_num(values), starts, axis=1)
+
+    valid = ~np.isnan(values)
+    pos = np.arange(values.shape[1])
+    if field == 'open':
+        # first traded minute of each segment
+        at = np.minimum.reduceat(np.where(valid, pos, values.shape[1]), starts, axis=1)
+        missing = at == values.shape[1]
+    else:
+        # close and anything else: last traded minute
+        at = np.maximum.reduceat(np.where(valid, pos, -1), starts, axis=1)
+        missing = at < 0
+    out = np.take_along_axis(values, np.clip(at, 0, values.shape[1] - 1), axis=1)
+    out[missing] = np.nan
+    return out
+
+
+def bucket_bounds(stamps, minutes, session_open=SESSION_OPEN, session_close=SESSION_CLOSE):
+    """
+        (label, end) of the bar each minute belongs to: its first minute
+        (the session date for daily bars) and the time it closes.
+    """
+    stamps = np.asarray(stamps, dtype='datetime64[ns]')
+    day = stamps.astype('datetime64[D]').astype('datetime64[ns]')
+    close = day + _clock(session_close)
+    if minutes is DAILY:
+        return day, close
+    start = day + _clock(session_open)
+    width = np.timedelta64(int(minutes), 'm')
+    label = start + (stamps - start) // width * width
+    return label, np.minimum(label + width, close)
+
+
+class _Bars(object):
+    """
+        Closed bars of one timeframe followed by the open one, in one
+        (asset x time x field) buffer twice the lookback long.
+    """
+
+    def __init__(self, minutes, lookback, assets, fields):
+        self.minutes = minutes
+        self.lookback = int(lookback)
+        size = 2 * (self.lookback + 1)
+        self.values = np.full((assets, size, fields), np.nan)
+        self.labels = np.empty(size, dtype='datetime64[ns]')
+        # slots [end - count, end) are closed bars, slot end the open one
+        self.end = 0
+        self.count = 0
+        self.open = False
+        # (key, DatetimeIndex) of the last window handed out
+        self.index = None
+
+    def _room(self, slots):
+        if self.end + slots < len(self.labels):
+            return
+        keep = min(self.count, self.lookback)
+        lo = self.end - keep
+        moved = keep + (1 if self.open else 0)
+        self.values[:, :moved] = self.values[:, lo:lo + moved]
+        self.labels[:moved] = self.labels[lo:lo + moved]
+        self.end = keep
+        self.count = keep
+
+    def add(self, labels, values, complete):
+        """
+            Append bars (labels, asset x bar x field values); the first one
+            replaces the open bar if it has the same label. The last bar
+            stays open unless `complete`.
+        """
+        n = len(labels)
+        if n == 0:
+            return 0
+        if n > self.lookback + 1:
+            labels, values = labels[-(self.lookback + 1):], values[:, -(self.lookback + 1):]
+            n = len(labels)
+            self.end = self.count = 0
+            self.open = False
+        self._room(n)
+        end = self.end + n
+        self.labels[self.end:end] = labels
+        self.values[:, self.end:end] = values
+        closed = n if complete else n - 1
+        self.end += closed
+        self.count = min(self.count + closed, self.lookback)
+        self.open = not complete
+        return closed
+
+    def open_bar(self):
+        """
+            (label, asset x field values) of the open bar, None if there is
+            none.
+        """
+        if not self.open:
+            return None
+        return self.labels[self.end], self.values[:, self.end]
+
+    def window(self, bar_count):
+        stop = self.end + (1 if self.open else 0)
+        available = self.count + (1 if self.open else 0)
+        lo = stop - min(int(bar_count), available)
+        return self.labels[lo:stop], self.values[:, lo:stop]
+
+
+class BarAggregator(object):
+    """
+        Bars of `assets` at every frequency of `lookbacks` ({frequency:
+        largest bar count asked for}) from one minute feed.
+
+        `fetches` and `minutes_fetched` count the data-layer traffic;
+        after each update `closed` maps every frequency to the number of
+        bars that closed with it.
+    """
+
+    def __init__(self, assets, lookbacks, fields=FIELDS, session_open=SESSION_OPEN,
+                 session_close=SESSION_CLOSE):
+        self.assets = list(assets)
+        self.fields = list(fields)
+        self.session_open = session_open
+        self.session_close = session_close
+        self._bars = {}
+        for frequency, lookback in lookbacks.items():
+            minutes = parse_timeframe(frequency)
+            self._bars[minutes] = _Bars(minutes, max(int(lookback), 1), len(self.assets),
+                                        len(self.fields))
+        self.closed = dict((minutes, 0) for minutes in self._bars)
+        self.last_minute = None
+        self._step = 2
+        self.fetches = 0
+        self.minutes_fetched = 0
+
+    def _fetch(self, data, count, frequency='1m'):
+        window = data.history(self.assets, self.fields, count, frequency)
+        self.fetches += 1
+        stamps, rows = _window_arrays(window, self.assets, self.fields)
+        if frequency == '1m':
+            self.minutes_fetched += len(stamps)
+        values = np.empty((len(self.assets), len(stamps), len(self.fields)))
+        for k, field in enumerate(self.fields):
+            values[:, :, k] = np.reshape(np.asarray(rows[field], dtype=float),
+                                         values.shape[:2])
+        return stamps, values
+
+    def _warm_up(self, data):
+        intraday = [b for b in self._bars.values() if b.minutes is not DAILY]
+        # one bar more than the lookback: the first one may start mid-bar
+        count = max([(b.lookback + 1) * b.minutes for b in intraday] or [1])
+        stamps, values = self._fetch(data, count)
+        self._push(stamps, values, intraday)
+        daily = self._bars.get(DAILY)
+        if daily is not None:
+            days, rows = self._fetch(data, daily.lookback, '1d')
+            complete = (len(stamps) > 0 and stamps[-1] + _MINUTE
+                        >= bucket_bounds(stamps[-1:], DAILY, self.session_open,
+                                         self.session_close)[1][0])
+            daily.add(days.astype('datetime64[ns]'), rows, complete)
+            self.closed[DAILY] = daily.count
+        if len(stamps):
+            self.last_minute = stamps[-1]
+
+    def _new_minutes(self, data):
+        """
+            The minutes after `last_minute`, asking for more until the
+            answer reaches back to it.
+        """
+        step = self._step
+        while True:
+            stamps, values = self._fetch(data, step)
+            if len(stamps) == 0 or stamps[0] <= self.last_minute or len(stamps) < step:
+                break
+            step *= 2
+        first = int(np.searchsorted(stamps, self.last_minute, side='right'))
+        new = len(stamps) - first
+        self._step = max(new + 1, 2)
+        return stamps[first:], values[:, first:]
+
+    def _push(self, stamps, values, bars):
+        for b in bars:
+            labels, ends = bucket_bounds(stamps, b.minutes, self.session_open,
+                                         self.session_close)
+            if len(stamps) == 0:
+                continue
+            complete = stamps[-1] + _MINUTE >= ends[-1]
+            current = b.open_bar()
+            if current is not None:
+                # the open bar goes first, as if it were one more minute
+                labels = np.concatenate([[current[0]], labels])
+                values_b = np.concatenate([current[1][:, None], values], axis=1)
+            else:
+                values_b = values
+            starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+            if b.minutes == 1:
+                # one minute per bar, nothing to reduce
+                reduced = values_b
+            else:
+                reduced = np.stack([reduce_segments(values_b[:, :, k], starts, field)
+                                    for k, field in enumerate(self.fields)], axis=-1)
+            self.closed[b.minutes] += b.add(labels[starts], reduced, complete)
+
+    def push(self, stamps, values):
+        """
+            Fold minute bars (stamps, asset x minute x field values, fields
+            in the order of `fields`) later than the last one seen into
+            every timeframe.
+        """
+        stamps = np.asarray(stamps, dtype='datetime64[ns]')
+        values = np.asarray(values, dtype=float)
+        if self.last_minute is not None:
+            first = int(np.searchsorted(stamps, self.last_minute, side='right'))
+            stamps, values = stamps[first:], values[:, first:]
+        self.closed = dict((minutes, 0) for minutes in self._bars)
+        self._push(stamps, values, list(self._bars.values()))
+        if len(stamps):
+            self.last_minute = stamps[-1]
+        return self
+
+    def update(self, data):
+        """
+            Bring every timeframe up to date with `data`.
+        """
+        self.closed = dict((minutes, 0) for minutes in self._bars)
+        if self.last_minute is None:
+            self._warm_up(data)
+            return self
+        stamps, values = self._new_minutes(data)
+        self._push(stamps, values, list(self._bars.values()))
+        if len(stamps):
+            self.last_minute = stamps[-1]
+        return self
+
+    def window(self, bar_count, frequency):
+        """
+            The last `bar_count` bars at `frequency`, the open one last, as
+            a `HistoryWindow` of read-only views valid until the next
+            update.
+        """
+        minutes = parse_timeframe(frequency)
+        bars = self._bars.get(minutes)
+        if bars is None:
+            raise KeyError('no lookback declared for frequency {!r}'.format(frequency))
+        if bar_count > bars.lookback:
+            raise ValueError('{} bars of {!r} asked for, the lookback is {}'.format(
+                bar_count, frequency, bars.lookback))
+        labels, tensor = bars.window(bar_count)
+        tensor.flags.writeable = False
+        key = (len(labels), labels[0], labels[-1]) if len(labels) else None
+        if bars.index is None or bars.index[0] != key:
+            # the labels only change when a bar opens
+            bars.index = (key, pd.DatetimeIndex(labels.copy(), copy=False))
+        index = bars.index[1]
+        rows = dict((f, list(tensor[:, :, k])) for k, f in enumerate(self.fields))
+        return HistoryWindow(self.assets, self.fields, index, rows, tensor)
@@ -0,0 +1,160 @@
+"""
+    Triangle trendlines from pivot arrays.
+
+    A triangle is an upper trendline through pivot highs and a lower one
+    through pivot lows. `scan_triangles` fits both lines by least squares
+    for every (end bar, window length) pair at once: prefix sums of the
+    pivots (count, x, y, x^2, xy, y^2) give the sums over any window by
+    subtraction, and the slope, intercept and r^2 of a line follow in
+    closed form from those six numbers. A scan over years of pivots and
+    many window lengths is a handful of array operations.
+
+    Bar indices (x) are summed as integers, so the x moments are exact;
+    prices are summed relative to the first pivot price. Over long scans
+    the price sums lose a few digits to the subtraction, which only shows
+    in the r^2 of nearly flat lines.
+"""
+import numpy as np
+
+from technicals.pivots import PIVOT_DTYPE, PIVOT_HIGH, PIVOT_LOW, pivot_ids
+
+# one candidate window: the pivots in bars (end - window, end]
+TRIANGLE_DTYPE = np.dtype([('end', np.int64), ('window', np.int64),
+                           ('upper_points', np.int64), ('upper_slope', np.float64),
+                           ('upper_intercept', np.float64), ('upper_r2', np.float64),
+                           ('lower_points', np.int64), ('lower_slope', np.float64),
+                           ('lower_intercept', np.float64), ('lower_r2', np.float64),
+                           ('apex', np.float64)])
+
+
+def pivot_arrays(high, low, num_before, num_after):
+    """
+        Pivot highs and pivot lows of a series as two `PIVOT_DTYPE` arrays.
+        A candle that is both is left out, like in `Triangle.py`.
+    """
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    ids = pivot_ids(high, low, num_before, num_after)
+    out = []
+    for code, price in ((PIVOT_HIGH, high), (PIVOT_LOW, low)):
+        index = np.flatnonzero(ids == code)
+        pivots = np.empty(len(index), dtype=PIVOT_DTYPE)
+        pivots['index'] = index
+        pivots['price'] = price[index]
+        out.append(pivots)
+    return tuple(out)
+
+
+def _line(n, sx, sy, sxx, sxy, syy):
+    """
+        Slope, intercept (at sx, sy measured from 0) and r^2 of the least
+        squares line through points with the given sums; NaN where the
+        line is not defined.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var_x = n * sxx - sx * sx
+        cov = n * sxy - sx * sy
+        var_y = n * syy - sy * sy
+        # var_x is exact for bar indices: zero for fewer than two bars
+        slope = np.where(var_x > 0, cov / var_x, np.nan)
+        intercept = (sy - slope * sx) / n
+        # linregress reports r = 0 for points on a horizontal line
+        r2 = np.where(var_y > 0, cov * cov / (var_x * var_y), 0.0)
+    r2 = np.where(np.isfinite(slope), r2, np.nan)
+    return slope, intercept, r2
+
+
+def fit_line(x, y):
+    """
+        Least squares line through (x, y): (slope, intercept, r^2), the
+        same numbers as `scipy.stats.linregress`.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    x0 = x[0] if len(x) else 0.0
+    y0 = y[0] if len(y) else 0.0
+    dx, dy = x - x0, y - y0
+    slope, intercept, r2 = _line(len(x), dx.sum(), dy.sum(), dx.dot(dx), dx.dot(dy),
+                                 dy.dot(dy))
+    return float(slope), float(intercept + y0 - slope * x0), float(r2)
+
+
+def _window_lines(pivots, first, last):
+    """
+        Trendline of the pivots with index in [first, last] for every
+        entry of the arrays `first` and `last`.
+    """
+    x = pivots['index'].astype(np.int64)
+    y0 = pivots['price'][0] if len(pivots) else 0.0
+    y = pivots['price'] - y0
+    zero = np.zeros(1)
+    count = np.arange(len(x) + 1)
+    sums_x = np.concatenate([[0], np.cumsum(x)])
+    sums_xx = np.concatenate([[0], np.cumsum(x * x)])
+    sums_y = np.concatenate([zero, np.cumsum(y)])
+    sums_xy = np.concatenate([zero, np.cumsum(x * y)])
+    sums_yy = np.concatenate([zero, np.cumsum(y * y)])
+
+    lo = np.searchsorted(x, first, side='left')
+    hi = np.searchsorted(x, last, side='right')
+    n = count[hi] - count[lo]
+    # measure x from the start of each window so that the sums stay small
+    # and exact: sum (x - c) = sx - n c, sum (x - c)^2 = sxx - 2 c sx + n c^2
+    c = np.asarray(first, dtype=np.int64)
+    sx = sums_x[hi] - sums_x[lo]
+    sxx = sums_xx[hi] - sums_xx[lo] - 2 * c * sx + n * c * c
+    sx = sx - n * c
+    sy = sums_y[hi] - sums_y[lo]
+    sxy = sums_xy[hi] - sums_xy[lo] - c * sy
+    syy = sums_yy[hi] - sums_yy[lo]
+    slope, intercept, r2 = _line(n, sx, sy, sxx, sxy, syy)
+    # back to bar 0 and to absolute prices
+    intercept = intercept + y0 - slope * c
+    return n, slope, intercept, r2
+
+
+def scan_triangles(highs, lows, windows, ends=None):
+    """
+        Upper (through `highs`) and lower (through `lows`) trendlines of the
+        pivots in bars (end - window, end] for every end bar in `ends` and
+        window length in `windows`, as a `TRIANGLE_DTYPE` array ordered by
+        end then window.
+
+        `highs` and `lows` are `PIVOT_DTYPE` arrays sorted by index, e.g.
+        from `pivot_arrays`. `ends` defaults to every bar up to the last
+        pivot. Lines through fewer than two distinct bars are NaN, and so
+        is the apex (the bar where the two lines meet) of parallel lines.
+    """
+    windows = np.atleast_1d(np.asarray(windows, dtype=np.int64))
+    if ends is None:
+        last = max([int(p['index'][-1]) for p in (highs, lows) if len(p)] or [-1])
+        ends = np.arange(last + 1)
+    ends = np.atleast_1d(np.asarray(ends, dtype=np.int64))
+
+    out = np.empty(len(ends) * len(windows), dtype=TRIANGLE_DTYPE)
+    out['end'] = np.repeat(ends, len(windows))
+    out['window'] = np.tile(windows, len(ends))
+    first = out['end'] - out['window'] + 1
+    for side, pivots in (('upper', highs), ('lower', lows)):
+        n, slope, intercept, r2 = _window_lines(pivots, first, out['end'])
+        out[side + '_points'] = n
+        out[side + '_slope'] = slope
+        out[side + '_intercept'] = intercept
+        out[side + '_r2'] = r2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out['apex'] = ((out['lower_intercept'] - out['upper_intercept'])
+                       / (out['upper_slope'] - out['lower_slope']))
+    out['apex'][~np.isfinite(out['apex'])] = np.nan
+    return out
+
+
+def converging(triangles):
+    """
+        Mask of the candidates whose lines meet after the end of their
+        window: a falling or flat upper line above a rising or flat lower
+        line, with at least two pivots on each.
+    """
+    return ((triangles['upper_points'] >= 2) & (triangles['lower_points'] >= 2)
+            & (triangles['upper_slope'] <= 0) & (triangles['lower_slope'] >= 0)
+            & (triangles['upper_slope'] < triangles['lower_slope'])
+            & (triangles['apex'] > triangles['end']))
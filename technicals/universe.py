@@ -0,0 +1,194 @@
+"""
+    Named universes from `sets in format.xlsx`, with dense integer ids.
+
+    The workbook lists each universe as a name cell followed by a cell
+    with the pasted `[symbol('A'),symbol('B'),...]` list, all in column A.
+    `load_registry` parses it once (with the standard library, no Excel
+    reader needed) and keeps the result in a binary cache next to it,
+    rebuilt whenever the workbook changes; later calls in the same
+    process return the same object.
+
+    Every ticker found in any universe gets an id: its position in the
+    sorted array of all tickers. Universes are stored as arrays of ids,
+    which keeps the cache to a few flat arrays, and `ids` is a binary
+    search. `positions` maps ids to the rows of data in another ticker
+    order (e.g. the symbols of a bar store); the strategies themselves only
+    take ticker lists, through `universe_tickers`.
+"""
+import os
+import re
+import zipfile
+from xml.etree import ElementTree
+
+import numpy as np
+
+WORKBOOK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        'sets in format.xlsx')
+
+_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+# the pasted names may contain quotes (Divi's Laboratories)
+_SYMBOL = re.compile(r"symbol\('(.*?)'\)(?=\s*[,\]])")
+# a header row pasted along with a table of company names
+_HEADERS = {'Company'}
+_registries = {}
+
+
+class UniverseRegistry(object):
+    """
+        Universes of the workbook as arrays of ticker ids.
+    """
+
+    def __init__(self, symbols, names, offsets, members):
+        self.symbols = symbols
+        self.names = list(names)
+        self._offsets = offsets
+        self._members = members
+        self._by_name = dict((name, k) for k, name in enumerate(self.names))
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def __repr__(self):
+        return 'UniverseRegistry({} universes, {} symbols)'.format(len(self.names),
+                                                                  len(self.symbols))
+
+    def universe(self, name):
+        """
+            Ids of the members of universe `name`, in workbook order.
+        """
+        k = self._by_name[name]
+        return self._members[self._offsets[k]:self._offsets[k + 1]]
+
+    def tickers(self, name):
+        """
+            Tickers of universe `name`, in workbook order.
+        """
+        return self.symbols[self.universe(name)].tolist()
+
+    def ids(self, tickers):
+        """
+            Ids of `tickers`, -1 for those in no universe.
+        """
+        tickers = np.asarray(tickers, dtype=self.symbols.dtype)
+        pos = np.searchsorted(self.symbols, tickers)
+        pos = np.minimum(pos, max(len(self.symbols) - 1, 0))
+        found = (self.symbols[pos] == tickers) if len(self.symbols) else \
+            np.zeros(tickers.shape, dtype=bool)
+        return np.where(found, pos, -1)
+
+    def positions(self, tickers):
+        """
+            Position in `tickers` (e.g. the symbols of a bar store) of every
+            id, -1 where missing: `data[positions[ids]]` picks the rows of
+            a universe out of data laid out in `tickers` order.
+        """
+        out = np.full(len(self.symbols), -1, dtype=np.int64)
+        ids = self.ids(list(tickers))
+        out[ids[ids >= 0]] = np.flatnonzero(ids >= 0)
+        return out
+
+
+def parse_workbook(path=WORKBOOK):
+    """
+        {universe name: [ticker, ...]} from the workbook, in sheet order.
+    """
+    with zipfile.ZipFile(path) as book:
+        strings = []
+        if 'xl/sharedStrings.xml' in book.namelist():
+            root = ElementTree.fromstring(book.read('xl/sharedStrings.xml'))
+            for item in root.iter(_MAIN + 'si'):
+                strings.append(''.join(t.text or '' for t in item.iter(_MAIN + 't')))
+        root = ElementTree.fromstring(book.read('xl/worksheets/sheet1.xml'))
+
+    cells = []
+    for cell in root.iter(_MAIN + 'c'):
+        if not cell.get('r', '').startswith('A'):
+            continue
+        value = cell.find(_MAIN + 'v')
+        if value is None:
+            inline = cell.find(_MAIN + 'is')
+            text = '' if inline is None else ''.join(
+                t.text or '' for t in inline.iter(_MAIN + 't'))
+        elif cell.get('t') == 's':
+            text = strings[int(value.text)]
+        else:
+            text = value.text or ''
+        cells.append(text.strip())
+
+    universes = {}
+    name = None
+    for text in cells:
+        tickers = [t for t in _SYMBOL.findall(text) if t not in _HEADERS]
+        if tickers and name is not None:
+            universes[name] = tickers
+            name = None
+        elif text:
+            name = text
+    return universes
+
+
+def build_registry(universes):
+    """
+        `UniverseRegistry` of a {name: [ticker, ...]} mapping.
+    """
+    names = list(universes)
+    symbols = np.array(sorted(set(t for n in names for t in universes[n])), dtype=str)
+    registry = UniverseRegistry(symbols, names, None, None)
+    members = [registry.ids(universes[n]) for n in names]
+    registry._offsets = np.concatenate([[0], np.cumsum([len(m) for m in members])]
+                                       ).astype(np.int64)
+    registry._members = (np.concatenate(members) if members
+                         else np.empty(0, dtype=np.int64)).astype(np.int32)
+    return registry
+
+
+def cache_path(path=WORKBOOK):
+    return os.path.splitext(path)[0] + '.universes.npz'
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def load_registry(path=WORKBOOK, cache=None):
+    """
+        The registry of the workbook at `path`, from the binary cache
+        `cache` (next to the workbook by default) when it is up to date.
+    """
+    path = os.path.abspath(path)
+    stamp = _stamp(path)
+    registry = _registries.get(path)
+    if registry is not None and np.array_equal(registry._stamp, stamp):
+        return registry
+
+    cache = cache or cache_path(path)
+    registry = None
+    if os.path.exists(cache):
+        with np.load(cache) as saved:
+            if np.array_equal(saved['stamp'], stamp):
+                registry = UniverseRegistry(saved['symbols'], saved['names'].tolist(),
+                                            saved['offsets'], saved['members'])
+    if registry is None:
+        registry = build_registry(parse_workbook(path))
+        try:
+            np.savez(cache, stamp=stamp, symbols=registry.symbols,
+                     names=np.array(registry.names, dtype=str),
+                     offsets=registry._offsets, members=registry._members)
+        except OSError:
+            # a read-only checkout still works, it just parses every time
+            pass
+    registry._stamp = stamp
+    _registries[path] = registry
+    return registry
+
+
+def universe_tickers(name, path=WORKBOOK):
+    """
+        Tickers of universe `name` of the workbook, e.g. for
+        `[symbol(t) for t in universe_tickers('NIFTY ENERGY')]`.
+    """
+    return load_registry(path).tickers(name)
@@ -0,0 +1,39 @@
+"""
+    Synthetic minute bars for the tests.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest.assets import Asset
+from backtest.data import DataPortal, MinuteBars
+from benchmarks import synthetic_ohlc
+
+SESSION_MINUTES = 375
+
+
+def make_bars(sessions=3, symbols=('AAA', 'BBB'), seed=0):
+    """
+        `MinuteBars` of `symbols` over `sessions` weekdays from
+        2022-01-03, 375 minutes a day from 09:15, random-walk prices.
+    """
+    days = pd.bdate_range('2022-01-03', periods=sessions)
+    minutes = pd.timedelta_range('09:15:00', periods=SESSION_MINUTES, freq='min')
+    stamps = np.concatenate([(day + minutes).values for day in days])
+    ohlc = synthetic_ohlc(len(stamps), len(symbols), seed)
+    fields = dict((f, ohlc[:, :, k]) for k, f in enumerate(('open', 'high', 'low', 'close')))
+    fields['volume'] = np.full((len(symbols), len(stamps)), 100.0)
+    return MinuteBars(stamps, list(symbols), fields)
+
+
+def portal(bars):
+    """
+        (DataPortal, assets) over `bars`, the clock before the first bar.
+    """
+    assets = [Asset(s, i) for i, s in enumerate(bars.symbols)]
+    return DataPortal(bars, assets), assets
+
+
+@pytest.fixture
+def bars():
+    return make_bars()
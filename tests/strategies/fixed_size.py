@@ -0,0 +1,16 @@
+"""
+    Holds 100 shares of every security trading above its 30 minute mean
+    close, nothing otherwise: each name is sized on its own.
+"""
+from blueshift.api import date_rules, order_target, schedule_function, symbol, time_rules
+
+
+def initialize(context):
+    context.securities = [symbol('AAA'), symbol('BBB'), symbol('CCC')]
+    schedule_function(rebalance, date_rules.every_day(), time_rules.every_nth_minute(30))
+
+
+def rebalance(context, data):
+    for security in context.securities:
+        mean = data.history(security, 'close', 30, '1m').mean()
+        order_target(security, 100 if data.current(security, 'close') > mean else 0)
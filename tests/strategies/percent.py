@@ -0,0 +1,14 @@
+"""
+    Equal weights of the whole portfolio: sized by the book, not per name.
+"""
+from blueshift.api import date_rules, order_target_percent, schedule_function, symbol, time_rules
+
+
+def initialize(context):
+    context.securities = [symbol('AAA'), symbol('BBB'), symbol('CCC')]
+    schedule_function(rebalance, date_rules.every_day(), time_rules.market_open(minutes=30))
+
+
+def rebalance(context, data):
+    for security in context.securities:
+        order_target_percent(security, 1.0 / len(context.securities))
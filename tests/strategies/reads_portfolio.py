@@ -0,0 +1,15 @@
+"""
+    Buys a fixed value of every security with the cash it has left: its
+    orders depend on the fills so far.
+"""
+from blueshift.api import date_rules, order_value, schedule_function, symbol, time_rules
+
+
+def initialize(context):
+    context.securities = [symbol('AAA'), symbol('BBB'), symbol('CCC')]
+    schedule_function(rebalance, date_rules.every_day(), time_rules.market_open(minutes=30))
+
+
+def rebalance(context, data):
+    for security in context.securities:
+        order_value(security, context.portfolio.cash / 10)
@@ -0,0 +1,22 @@
+"""
+    Holds 100 shares of every security trading above the mean of the
+    closes it saw at its last 40 rebalances: the state of the strategy
+    builds up over the bars it ran on, not over the data it reads.
+"""
+from collections import deque
+
+from blueshift.api import date_rules, order_target, schedule_function, symbol, time_rules
+
+
+def initialize(context):
+    context.securities = [symbol('AAA'), symbol('BBB')]
+    context.closes = dict((security, deque(maxlen=40)) for security in context.securities)
+    schedule_function(rebalance, date_rules.every_day(), time_rules.every_nth_minute(5))
+
+
+def rebalance(context, data):
+    for security in context.securities:
+        close = data.current(security, 'close')
+        closes = context.closes[security]
+        closes.append(close)
+        order_target(security, 100 if close > sum(closes) / len(closes) else 0)
@@ -0,0 +1,79 @@
+import copy
+import os
+
+import pytest
+
+from backtest.engine import load_strategy, run_algorithm
+from backtest.parallel import initialized_context
+from technicals import features
+
+from conftest import make_bars
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STRATEGY = os.path.join(ROOT, 'combined_5.py')
+
+
+@pytest.fixture(scope='module')
+def daily_bars():
+    # enough sessions for the daily pivots to give some signals
+    return make_bars(sessions=25, symbols=('RELIANCE', 'WIPRO'), seed=4)
+
+
+def signals_of_run(bars):
+    """
+        The signals of every security at every rebalance of one run.
+    """
+    module = load_strategy(STRATEGY)
+    target_position = module.generate_target_position
+    signals = []
+
+    def recorded(context, data, securities):
+        signals.append(dict((s.symbol, context.signals[s]) for s in securities))
+        return target_position(context, data, securities)
+
+    module.generate_target_position = recorded
+    run_algorithm(module, bars)
+    return signals
+
+
+@pytest.fixture(scope='module')
+def reference(daily_bars):
+    return signals_of_run(daily_bars)
+
+
+def test_shared_signals_follow_the_forming_bar(daily_bars, reference):
+    assert any(any(row.values()) for row in reference)
+    features.share()
+    try:
+        first = signals_of_run(daily_bars)
+        # the second combination of a sweep reads everything from the first
+        second = signals_of_run(daily_bars)
+    finally:
+        features.unshare()
+    assert first == reference
+    assert second == reference
+
+
+def test_memoized_signals_equal_a_fresh_computation(daily_bars, reference):
+    module = load_strategy(STRATEGY)
+    # the state signal_function builds up, as after initialize
+    initial = initialized_context(STRATEGY, daily_bars)
+    generate_signals = module.generate_signals
+    checked = []
+
+    def compared(context, data, securities):
+        generate_signals(context, data, securities)
+        window = context.history.window(context.params['indicator_lookback'],
+                                        context.params['indicator_freq'])
+        for security in securities:
+            fresh = module.signal_function(copy.deepcopy(initial), window.xs(security),
+                                           context.params, security)
+            checked.append((context.signals[security], fresh))
+
+    module.generate_signals = compared
+    result = run_algorithm(module, daily_bars)
+    memo = result.context.memo
+    # the forming bar moved during the day and was recomputed
+    assert memo.misses > 25 * len(result.context.securities)
+    assert [memoized for memoized, _ in checked] == [fresh for _, fresh in checked]
+    assert sum(fresh for _, fresh in checked) == sum(sum(row.values()) for row in reference)
@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+
+from backtest.engine import load_strategy, run_algorithm
+from technicals.cup_handle import CupHandleDetector
+
+from conftest import make_bars
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def full_rule(close):
+    """
+        The cup-and-handle rule as the strategies computed it on every
+        window before the detector.
+    """
+    cbb = close[-60]
+    cb = close.min()
+    close_1 = close[close.argmin():]
+    hs = close_1.max()
+    hb = close_1[close_1.argmax():].min()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return int(hs / cbb > 0.9 and close[-1] > hb and (hs - cb) / (hs - hb) > 3)
+
+
+def test_detector_matches_the_full_rule():
+    rng = np.random.default_rng(3)
+    close = 100 + np.cumsum(rng.normal(0, 1, 5000))
+    stamps = np.arange(len(close))
+    detector = CupHandleDetector(60)
+    end = 60
+    while end <= len(close):
+        signal = detector.update(stamps[end - 60:end], close[end - 60:end])
+        assert signal == full_rule(close[end - 60:end]), end
+        end += int(rng.choice([1, 1, 5, 30]))
+
+
+def test_five_candles_signals_match_the_full_rule():
+    module = load_strategy(os.path.join(ROOT, 'Five_Candles.py'))
+    detector_signal = module.signal_function
+    calls = []
+
+    def checked(context, px, params, security):
+        signal = detector_signal(context, px, params, security)
+        close = px.close.values
+        # the full rule needs the whole window, the detector waits for it
+        calls.append((signal, full_rule(close) if len(close) >= 60 else 0))
+        return signal
+
+    module.signal_function = checked
+    run_algorithm(module, make_bars(sessions=3, symbols=('ASIANPAINT', 'TATAMOTORS')))
+    assert calls
+    assert [s for s, _ in calls] == [r for _, r in calls]
@@ -0,0 +1,71 @@
+import os
+import warnings
+
+import numpy as np
+
+from backtest.engine import load_strategy, run_algorithm
+from technicals.double_bottom import bottom_entry_signal, double_bottom_signal, smooth_lows
+
+from conftest import make_bars
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def original_signal(low, close):
+    """
+        `signal_function` of double_bottom_raj.py before the detector.
+    """
+    if len(low) < 2:
+        return 0
+    x = np.linspace(1, len(low), len(low))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        data = np.polyval(np.polyfit(x, low, 17), x)
+    l_min = (np.diff(np.sign(np.diff(data))) > 0).nonzero()[0] + 1
+    delta = 10
+    threshold = min(low) * 1.15
+    price_min = {}
+    for element in l_min:
+        price_min[element] = min(low[x] for x in range(element - delta, element + delta + 1)
+                                 if 0 < x < len(low))
+    suspected_bottoms = [i for i in price_min for j in price_min
+                         if i != j and price_min[i] < threshold]
+    return int(any(close[-1] == bot for bot in suspected_bottoms))
+
+
+def test_entry_signal_matches_the_original_rule():
+    rng = np.random.default_rng(7)
+    fired = 0
+    for _ in range(200):
+        n = int(rng.choice([20, 60, 375]))
+        low = np.round(rng.choice([100, 1000]) + np.cumsum(rng.normal(0, 1, n)), 2)
+        minima = (np.diff(np.sign(np.diff(smooth_lows(low)))) > 0).nonzero()[0] + 1
+        # the rule compares the last close with bar positions
+        for last in list(minima) + [0.5, float(n - 1), 101.25]:
+            close = np.append(low[1:], last)
+            expected = original_signal(low, close)
+            assert bottom_entry_signal(low, close[-1]) == expected
+            fired += expected
+    assert fired
+
+
+def test_strategy_keeps_the_original_entry_by_default():
+    module = load_strategy(os.path.join(ROOT, 'double_bottom_raj.py'))
+    signal_function = module.signal_function
+    calls = []
+
+    def checked(context, px, params, security):
+        signal = signal_function(context, px, params, security)
+        low, close = px.low.values, px.close.values
+        calls.append((signal, original_signal(low, close)))
+        module.PAIR_ENTRY = True
+        try:
+            assert signal_function(context, px, params, security) == double_bottom_signal(low)
+        finally:
+            module.PAIR_ENTRY = False
+        return signal
+
+    module.signal_function = checked
+    run_algorithm(module, make_bars(sessions=2, symbols=('TCS', 'WIPRO')))
+    assert calls
+    assert [s for s, _ in calls] == [o for _, o in calls]
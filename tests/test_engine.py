@@ -0,0 +1,37 @@
+import types
+
+import numpy as np
+import pandas as pd
+
+from backtest import api
+from backtest.data import MinuteBars
+from backtest.engine import run_algorithm
+
+from conftest import make_bars
+
+
+def test_bar_close_events_stay_on_the_session_grid():
+    full = make_bars(sessions=1, symbols=('AAA', 'BBB'))
+    # 09:17 is missing for everyone, BBB does not trade from 09:20 to 09:24
+    keep = np.arange(len(full)) != 2
+    fields = dict((f, v[:, keep]) for f, v in full.fields.items())
+    fields['close'][1, 4:9] = np.nan
+    bars = MinuteBars(full.timestamps[keep], full.symbols, fields)
+    events = []
+
+    def initialize(context):
+        context.securities = [api.symbol('AAA'), api.symbol('BBB')]
+        api.on_bar_close(closed, context.securities, '5m')
+
+    def closed(context, data, assets):
+        events.append((api.get_datetime(), [a.symbol for a in assets]))
+
+    strategy = types.ModuleType('bar_close')
+    strategy.initialize = initialize
+    run_algorithm(strategy, bars)
+
+    labels = pd.date_range('2022-01-03 09:15', '2022-01-03 15:25', freq='5min')
+    assert [time for time, _ in events] == list(labels + pd.Timedelta(minutes=4))
+    assert events[0][1] == ['AAA', 'BBB']
+    assert events[1][1] == ['AAA']
+    assert all(assets == ['AAA', 'BBB'] for _, assets in events[2:])
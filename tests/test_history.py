@@ -0,0 +1,27 @@
+import numpy as np
+
+from technicals.history import HistoryCache
+
+from conftest import portal
+
+
+def test_updates_after_the_first_fetch_only_ask_for_new_bars(bars):
+    data, assets = portal(bars)
+    cache = HistoryCache(assets, ['open', 'close'], 100, '1m')
+
+    data.now = 500
+    cache.update(data)
+    assert cache.bars_fetched == 100
+
+    data.now = 501
+    cache.update(data)
+    # the new bar plus the last cached one
+    assert cache.bars_fetched == 102
+
+    data.now = 502
+    window = cache.update(data)
+    assert cache.bars_fetched == 104
+    expected = data.history(assets, ['open', 'close'], 100, '1m')
+    for asset in assets:
+        np.testing.assert_array_equal(window.xs(asset).values,
+                                      expected.xs(asset).values)
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from technicals.indicators import (ADX, EMA, RSI, BollingerBands, adx_series, bbands_series,
+                                   ema_series, rsi_series, sma_series)
+
+talib = pytest.importorskip('talib')
+
+
+def ohlc(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(size=n))
+    high = close + np.abs(rng.normal(size=n))
+    low = close - np.abs(rng.normal(size=n))
+    return high, low, close
+
+
+@pytest.mark.parametrize('leading', [0, 7])
+@pytest.mark.parametrize('period', [2, 5, 14, 30])
+def test_series_match_talib(period, leading):
+    high, low, close = ohlc(300, seed=period)
+    # the TA-Lib wrapper starts after leading NaNs
+    high[:leading] = low[:leading] = close[:leading] = np.nan
+    close_only = dict(equal_nan=True, rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(sma_series(close, period), talib.SMA(close, period), **close_only)
+    np.testing.assert_allclose(ema_series(close, period), talib.EMA(close, period), **close_only)
+    np.testing.assert_allclose(rsi_series(close, period), talib.RSI(close, period), **close_only)
+    for ours, theirs in zip(bbands_series(close, period), talib.BBANDS(close, period, 2.0, 2.0)):
+        np.testing.assert_allclose(ours, theirs, **close_only)
+    np.testing.assert_allclose(adx_series(high, low, close, period),
+                               talib.ADX(high, low, close, period), **close_only)
+
+
+def test_flat_prices_match_talib():
+    close = np.r_[np.full(40, 100.0), np.linspace(100, 101, 20)]
+    high = low = close
+    np.testing.assert_allclose(rsi_series(close, 14), talib.RSI(close, 14), equal_nan=True)
+    for ours, theirs in zip(bbands_series(close, 10), talib.BBANDS(close, 10, 2.0, 2.0)):
+        np.testing.assert_allclose(ours, theirs, equal_nan=True, atol=1e-9)
+    np.testing.assert_allclose(adx_series(high, low, close, 5), talib.ADX(high, low, close, 5),
+                               equal_nan=True)
+
+
+STREAMING = [
+    (lambda: EMA(10), lambda h, l, c: ema_series(c, 10)),
+    (lambda: RSI(14), lambda h, l, c: rsi_series(c, 14)),
+    (lambda: BollingerBands(20), lambda h, l, c: np.stack(bbands_series(c, 20), axis=1)),
+    (lambda: ADX(14), lambda h, l, c: adx_series(h, l, c, 14)),
+]
+
+
+def _columns(indicator, high, low, close):
+    named = dict(high=high, low=low, close=close)
+    return [named[name] for name in indicator.inputs]
+
+
+@pytest.mark.parametrize('make, series', STREAMING)
+def test_pushes_follow_the_series(make, series):
+    high, low, close = ohlc(200, seed=3)
+    indicator = make()
+    expected = series(high, low, close)
+    rows = list(zip(*_columns(indicator, high, low, close)))
+    values = [indicator.push(*row) for row in rows]
+    np.testing.assert_allclose(np.array(values, dtype=float), expected,
+                               equal_nan=True, rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize('make, series', STREAMING)
+def test_forming_bars_follow_the_series(make, series):
+    rng = np.random.default_rng(4)
+    high, low, close = ohlc(120, seed=4)
+    stamps = pd.date_range('2024-01-01', periods=len(close)).values
+    indicator = make()
+    indicator.update(stamps[:60], *_columns(indicator, high[:60], low[:60], close[:60]))
+    for day in range(60, len(close)):
+        # the forming bar moves a few times before the next day opens
+        for tick in range(3):
+            move = rng.normal()
+            h, l, c = high[:day + 1].copy(), low[:day + 1].copy(), close[:day + 1].copy()
+            c[-1] += move
+            h[-1] = max(h[-1], c[-1])
+            l[-1] = min(l[-1], c[-1])
+            window = slice(day - 49, day + 1)
+            value = indicator.update(stamps[window],
+                                     *_columns(indicator, h[window], l[window], c[window]))
+            np.testing.assert_allclose(np.array(value, dtype=float), series(h, l, c)[-1],
+                                       equal_nan=True, rtol=1e-9, atol=1e-9)
+        high[day], low[day], close[day] = h[-1], l[-1], c[-1]
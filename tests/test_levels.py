@@ -0,0 +1,119 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+from technicals.levels import LevelIndex, cluster_levels
+
+
+def assign_strength_remove_noise(lis, s):
+    """
+        The nested loop of the support and resistance notebook.
+    """
+    updatedLis = []
+    lisSorted = copy.deepcopy(lis)
+    lisSorted.sort(key=lambda a: a[1])
+    len2 = len(lisSorted)
+    blacklisted = [0]
+    for i in range(len2):
+        if not (lisSorted[i][0] in blacklisted):
+            for cnt in range(0, len2 - i):
+                if abs(lisSorted[i][1] - lisSorted[i + cnt][1]) > s:
+                    break
+            mx = i
+            if cnt > 1:
+                for j in range(1, cnt):
+                    if lisSorted[i + j][0] >= lisSorted[mx][0]:
+                        blacklisted.append(lisSorted[mx][0])
+                        mx = i + j
+            updatedLis.append((lisSorted[mx][0], lisSorted[mx][1], cnt))
+    updatedLis.sort(key=lambda a: a[0])
+    return updatedLis
+
+
+def test_cluster_levels_match_the_nested_loop():
+    rng = np.random.default_rng(3)
+    for _ in range(500):
+        n = int(rng.integers(0, 40))
+        # bars from 0, in any order, and few distinct prices so that
+        # clusters overlap and prices tie
+        bars = rng.permutation(n).tolist()
+        pivots = [(bar, float(rng.integers(0, 30)) / 4) for bar in bars]
+        s = float(rng.choice([0.0, 0.25, 0.5, 1.0, 3.0]))
+        assert cluster_levels(pivots, s).tolist() == assign_strength_remove_noise(pivots, s)
+
+
+def test_a_cluster_running_to_the_last_pivot_is_one_short():
+    pivots = [(1, 10.0), (2, 10.1), (3, 10.2)]
+    # the loop never breaks: the first cluster counts 2 of its 3 pivots
+    # and its representative stops at the second one
+    expected = [(2, 10.1, 2), (2, 10.1, 1), (3, 10.2, 0)]
+    assert assign_strength_remove_noise(pivots, 1.0) == expected
+    assert cluster_levels(pivots, 1.0).tolist() == expected
+    # a pivot more than `s` above ends the cluster before the last one
+    pivots.append((4, 20.0))
+    expected = [(3, 10.2, 3), (3, 10.2, 1), (4, 20.0, 0)]
+    assert assign_strength_remove_noise(pivots, 1.0) == expected
+    assert cluster_levels(pivots, 1.0).tolist() == expected
+
+
+def test_level_index_matches_a_sorted_list():
+    rng = np.random.default_rng(5)
+    index = LevelIndex()
+    # small blocks, so that inserts and expiries split and merge them
+    index.LOAD = 4
+    levels = []
+    for bar in range(3000):
+        if rng.random() < 0.6:
+            price = float(rng.integers(0, 200)) / 4
+            strength = int(rng.integers(0, 4))
+            index.add(bar, price, strength)
+            levels.append((bar, price, strength))
+        if bar % 50 == 0:
+            before = bar - int(rng.integers(100, 400))
+            assert index.expire(before) == sum(1 for level in levels if level[0] < before)
+            levels = [level for level in levels if level[0] >= before]
+        expected = sorted(levels, key=lambda level: level[1])
+        assert len(index) == len(expected)
+        if bar % 10:
+            continue
+        assert index.as_array().tolist() == expected
+        price, tol = rng.random() * 50, rng.choice([0.1, 0.25, 1.0, 3.0])
+        for min_strength in (0, 1, 2):
+            near = [level for level in expected
+                    if abs(price - level[1]) < tol and level[2] >= min_strength]
+            assert index.within(price, tol, min_strength).tolist() == near
+        assert index.is_far(price, tol) == (not any(abs(price - level[1]) < tol
+                                                    for level in expected))
+        if expected:
+            nearest = index.nearest(price)
+            assert abs(nearest['price'] - price) == min(abs(level[1] - price)
+                                                        for level in expected)
+
+
+def test_within_drops_strength_zero_levels():
+    index = LevelIndex()
+    index.add(3, 10.0, 0)
+    index.add(4, 10.5, 1)
+    assert index.within(10.2, 1.0).tolist() == [(4, 10.5, 1)]
+
+
+def test_cluster_equals_cluster_levels_of_the_pivots():
+    rng = np.random.default_rng(6)
+    for _ in range(200):
+        n = int(rng.integers(0, 60))
+        pivots = [(bar, float(rng.integers(0, 40)) / 4) for bar in range(n)]
+        s = float(rng.choice([0.1, 0.5, 1.0, 3.0]))
+        index = LevelIndex(pivots)
+        clustered = index.cluster(s)
+        expected = cluster_levels(pivots, s)
+        assert sorted(clustered.tolist()) == sorted(expected.tolist())
+
+
+def test_labels_other_than_bar_numbers():
+    days = pd.date_range('2024-01-01', periods=4)
+    index = LevelIndex()
+    for day, price in zip(days, [3.0, 1.0, 2.0, 1.5]):
+        index.add(day, price)
+    assert index.expire(days[2]) == 2
+    assert list(index.as_array()['index']) == [days[3], days[2]]
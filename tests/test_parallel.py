@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+import pytest
+
+from backtest.engine import ShardingError, run_algorithm
+from backtest.parallel import DATES, SECURITIES, run_sharded
+
+from conftest import make_bars
+
+STRATEGIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'strategies')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _fills(result):
+    return sorted((str(time), symbol, quantity, price)
+                  for time, symbol, quantity, price, _ in result.fills)
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_securities_shards_add_up_to_one_run(processes):
+    bars = make_bars(sessions=4, symbols=('AAA', 'BBB', 'CCC'))
+    strategy = os.path.join(STRATEGIES, 'fixed_size.py')
+    single = run_algorithm(strategy, bars)
+    merged = run_sharded(strategy, bars, shards=2, by=SECURITIES, processes=processes)
+
+    assert _fills(merged) == _fills(single)
+    assert [d for d, _ in merged.equity_values] == [d for d, _ in single.equity_values]
+    np.testing.assert_allclose([v for _, v in merged.equity_values],
+                               [v for _, v in single.equity_values], rtol=1e-12)
+
+
+def test_percent_orders_are_sized_by_the_whole_book():
+    bars = make_bars(sessions=2, symbols=('AAA', 'BBB', 'CCC'))
+    strategy = os.path.join(STRATEGIES, 'percent.py')
+    single = run_algorithm(strategy, bars)
+    merged = run_sharded(strategy, bars, shards=2, by=SECURITIES, processes=1)
+    assert _fills(merged) == _fills(single)
+    assert merged.equity_values == single.equity_values
+
+
+def _with_marubozu(bars, every=7):
+    """
+        `bars` with the wicks of every `every`-th minute cut off, so that
+        Marubozu.py finds candles to trade.
+    """
+    fields = bars.fields
+    body = np.arange(len(bars)) % every == 0
+    fields['high'][:, body] = np.maximum(fields['open'], fields['close'])[:, body]
+    fields['low'][:, body] = np.minimum(fields['open'], fields['close'])[:, body]
+    return bars
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_marubozu_shards_match_one_run(processes):
+    bars = _with_marubozu(make_bars(sessions=3, symbols=('ASIANPAINT', 'TATAMOTORS'), seed=2))
+    strategy = os.path.join(ROOT, 'Marubozu.py')
+    single = run_algorithm(strategy, bars)
+    merged = run_sharded(strategy, bars, shards=2, by=SECURITIES, processes=processes)
+    assert single.fills
+    assert merged.fills == single.fills
+    assert merged.equity_values == single.equity_values
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_date_blocks_carry_their_positions(processes):
+    bars = make_bars(sessions=5, symbols=('AAA', 'BBB', 'CCC'))
+    strategy = os.path.join(STRATEGIES, 'fixed_size.py')
+    single = run_algorithm(strategy, bars)
+    merged = run_sharded(strategy, bars, shards=3, by=DATES, processes=processes)
+    assert merged.fills == single.fills
+    assert merged.equity_values == single.equity_values
+
+
+def test_date_blocks_warm_up_on_the_sessions_before_them():
+    bars = make_bars(sessions=5, symbols=('AAA', 'BBB'), seed=3)
+    strategy = os.path.join(STRATEGIES, 'rolling_mean.py')
+    single = run_algorithm(strategy, bars, start='2022-01-04')
+    cold = run_sharded(strategy, bars, shards=2, by=DATES, start='2022-01-04',
+                       processes=1, warmup=0)
+    merged = run_sharded(strategy, bars, shards=2, by=DATES, start='2022-01-04',
+                         processes=1)
+    # without the session before it, the second block starts on a short mean
+    assert cold.fills != single.fills
+    assert merged.fills == single.fills
+    assert merged.equity_values == single.equity_values
+
+
+def test_shards_cannot_read_the_portfolio():
+    bars = make_bars(sessions=1, symbols=('AAA', 'BBB', 'CCC'))
+    strategy = os.path.join(STRATEGIES, 'reads_portfolio.py')
+    with pytest.raises(ShardingError):
+        run_sharded(strategy, bars, shards=2, by=SECURITIES, processes=1)
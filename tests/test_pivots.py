@@ -0,0 +1,41 @@
+import numpy as np
+
+from technicals.pivots import pivot_ids
+
+
+def pivotId(high, low, candle, num_before, num_after):
+    """
+        The per-candle helper of the pivot notebooks and strategies.
+    """
+    if candle - num_before < 0 or candle + num_after >= len(high):
+        return 0
+    pividlow = 1
+    pividhigh = 1
+    for i in range(candle - num_before, candle + num_after):
+        if low[candle] > low[i]:
+            pividlow = 0
+        if high[candle] < high[i]:
+            pividhigh = 0
+    if pividlow and pividhigh:
+        return 3
+    elif pividlow:
+        return 1
+    elif pividhigh:
+        return 2
+    else:
+        return 0
+
+
+def test_pivot_ids_match_the_candle_loop():
+    rng = np.random.default_rng(1)
+    for _ in range(500):
+        n = int(rng.integers(0, 60))
+        num_before, num_after = int(rng.integers(0, 5)), int(rng.integers(0, 5))
+        # few distinct prices, so that ties are common
+        high = rng.integers(0, 8, n).astype(float)
+        low = high - rng.integers(0, 3, n)
+        if rng.random() < 0.3 and n:
+            high[rng.integers(0, n, 2)] = np.nan
+            low[rng.integers(0, n, 2)] = np.nan
+        expected = [pivotId(high, low, candle, num_before, num_after) for candle in range(n)]
+        assert pivot_ids(high, low, num_before, num_after).tolist() == expected
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from technicals.indicators import EMA, RSI, ema_series, rsi_series
+from technicals.smoothing import CausalSavgol, causal_savgol
+
+
+def test_a_resent_forming_bar_replaces_the_last_output():
+    stamps = pd.date_range('2024-03-01', periods=3).values
+    smoother = CausalSavgol(3, 1, keep=3)
+    smoother.update(stamps, [1.0, 2.0, 3.0])
+    # the same day again, its bar has moved
+    smoother.update(stamps, [1.0, 2.0, 30.0])
+    np.testing.assert_allclose(smoother.values, causal_savgol([1.0, 2.0, 30.0], 3, 1))
+
+
+@pytest.mark.parametrize('make, series', [
+    (lambda: CausalSavgol(15, 3, keep=40), lambda x: causal_savgol(x, 15, 3)),
+    (lambda: EMA(10), lambda x: ema_series(x, 10)),
+    (lambda: RSI(14), lambda x: rsi_series(x, 14)),
+])
+def test_a_forming_bar_updated_intraday_matches_the_full_series(make, series):
+    rng = np.random.default_rng(0)
+    days = 40
+    closes = 100 + np.cumsum(rng.normal(size=days))
+    stamps = pd.date_range('2024-01-01', periods=days).values
+    indicator = make()
+    indicator.update(stamps[:20], closes[:20])
+    for day in range(20, days):
+        # several ticks of the forming bar, then the next day opens
+        for tick in range(4):
+            window = closes[:day + 1].copy()
+            window[-1] += rng.normal()
+            value = indicator.update(stamps[day - 19:day + 1], window[-20:])
+            expected = series(window)
+            np.testing.assert_allclose(value, expected[-1])
+            if hasattr(indicator, 'values'):
+                np.testing.assert_allclose(indicator.values[-20:], expected[-20:])
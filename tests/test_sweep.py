@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from backtest import parallel
+from backtest.parallel import Job, run_jobs
+from backtest.sweep import param_grid, run_sweep, sweep_jobs
+from technicals import features
+from technicals.cup_handle import CupHandleDetector
+
+from conftest import make_bars
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STRATEGY = os.path.join(ROOT, 'CupHandle.py')
+# two feature scopes (trade_freq), two combinations in each
+GRID = {'trade_freq': [5, 10], 'leverage': [1, 2]}
+
+
+@pytest.fixture(scope='module')
+def bars():
+    return make_bars(sessions=3, symbols=('WIPRO', 'TCS'), seed=1)
+
+
+@pytest.fixture
+def updates(monkeypatch):
+    """
+        Count of the bars fed to the cup-and-handle detectors.
+    """
+    count = [0]
+    update = CupHandleDetector.update
+
+    def counted(self, *args):
+        count[0] += 1
+        return update(self, *args)
+
+    monkeypatch.setattr(CupHandleDetector, 'update', counted)
+    return count
+
+
+def test_sweep_equals_independent_runs(bars):
+    combos = param_grid(GRID)
+    results = run_sweep(STRATEGY, bars, combos, processes=1)
+    single = run_jobs([Job(STRATEGY, params=combo) for combo in combos], bars, 1)
+    assert any(result.fills for result in single)
+    for result, expected in zip(results, single):
+        assert result.fills == expected.fills
+        assert result.equity_values == expected.equity_values
+
+
+def test_every_scope_computes_its_features_once(bars, updates):
+    once = {}
+    for freq in GRID['trade_freq']:
+        updates[0] = 0
+        run_jobs([Job(STRATEGY, params={'trade_freq': freq})], bars, 1)
+        once[freq] = updates[0]
+    updates[0] = 0
+    run_sweep(STRATEGY, bars, param_grid(GRID), processes=1)
+    assert updates[0] == sum(once.values())
+
+
+def test_the_second_combination_reads_every_feature(bars):
+    first, second = sweep_jobs(STRATEGY, bars, param_grid({'leverage': [1, 2]}))
+    parallel._init_worker(bars)
+    cache = features.share()
+    try:
+        parallel._run_job(first)
+        computed = cache.misses
+        parallel._run_job(second)
+    finally:
+        features.unshare()
+    assert computed
+    assert cache.misses == computed
+    assert cache.hits == computed
+
+
+def test_a_sweep_cache_keeps_every_feature():
+    cache = features.share()
+    try:
+        for minute in range(150000):
+            features.shared(minute, lambda: minute)
+        assert len(cache) == 150000
+    finally:
+        features.unshare()